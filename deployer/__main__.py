@@ -2,9 +2,8 @@ import os
 from deployer.utils import parse_arguments
 
 def main():
-    from deployer import deploy
-
     arguments = parse_arguments()
+    from deployer import deploy
 
     if arguments.proxy == 'false':
         # below settings are only overridden for this session
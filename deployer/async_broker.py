@@ -0,0 +1,458 @@
+from deployer.errors import *
+from deployer.broker import Broker, BrokerResponse, DEFAULT_PAGE_SIZE, RESPONSE_TOO_LARGE, ALREADY_EXISTS, NOT_FOUND, semp_error_code, page_cursor
+from deployer.session import DEFAULT_POOL_SIZE, DEFAULT_RETRIES, DEFAULT_BACKOFF_FACTOR
+from deployer.async_session import create_async_session, request, require_aiohttp, aiohttp
+from deployer.plan import diff, readable
+from deployer.rate_limit import get_rate_limiter
+from deployer.metrics import observe
+from urllib.parse import quote
+
+import asyncio
+import logging
+import time
+
+# asyncio counterpart of Broker with the same methods as coroutines, so a single event loop can drive the requests of
+# many message VPNs without a thread per request. Use it as an async context manager, the session is opened on enter.
+# There is no VPN snapshot: with cheap concurrency the existence checks are plain GETs.
+class AsyncBroker:
+    def __init__(self, name, url, user, password, msg_vpn_name, headers=None, pool_size=DEFAULT_POOL_SIZE,
+                 timeout=None, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, max_in_flight=None, rate_limit=None):
+        require_aiohttp()
+        if user is None and password is None or url is None:
+            raise BrokerException(20, 'You must define the url, username and password')
+        self.name = name
+        self.url = url
+        self.auth = aiohttp.BasicAuth(user, password) if user and password else None
+        self.msg_vpn_name = msg_vpn_name
+        self.headers = headers
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = get_rate_limiter(url, rate_limit)
+        self.max_in_flight = max_in_flight if max_in_flight else pool_size
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        self.session = None
+        self.plan = None
+        self.dry_run = False
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            self.session = create_async_session(self.pool_size, self.timeout, self.headers, self.auth, verify=False)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    planned = Broker.planned
+    check_response = Broker.check_response
+    check_semp_message = Broker.check_semp_message
+
+    async def get_collection(self, endpoint, select=None, count=DEFAULT_PAGE_SIZE):
+        params = {"count": count}
+        if select:
+            params["select"] = select
+        pages = 0
+        while True:
+            resp = await self.api("GET", endpoint, params=params)
+            if resp.status_code != 200:
+                if semp_error_code(resp.message) == RESPONSE_TOO_LARGE and params["count"] > 1:
+                    params["count"] = params["count"] // 2
+                    continue
+                # only a missing parent object means an empty collection, any other error would truncate it
+                if pages == 0 and semp_error_code(resp.message) == NOT_FOUND:
+                    return
+                raise BrokerException(23, "BROKER::PagingError", f"GET { endpoint } failed after { pages } pages with status_code { resp.status_code }: { resp.message.get('meta', {}).get('error') }")
+            pages += 1
+            for item in resp.message.get("data", []):
+                yield item
+            cursor = page_cursor(resp.message)
+            if not cursor:
+                return
+            params["cursor"] = cursor
+
+    async def get_current(self, url, name, fields=None):
+        params = {"select": ",".join(sorted(fields))} if fields else None
+        response = await self.api("GET", f"{url}/{name}", params=params)
+        return response.message.get("data") if response.status_code == 200 else None
+
+    # Creates the object when it does not exist and only patches the attributes that differ from the broker
+    async def upsert(self, object_type, url, name, payload):
+        fields = readable(payload.keys())
+        current = await self.get_current(url, name, fields)
+        if current is None:
+            logging.debug(f"POST { url } payload { payload }")
+            resp = await self.api("POST", url, json=payload)
+            if semp_error_code(resp.message) != ALREADY_EXISTS:
+                self.check_response(resp, object_type, name)
+                return
+            # created concurrently, it is compared with the broker and patched like any existing object
+            logging.info(f"{object_type} {name} already exists on the broker, reading it to apply the requested attributes")
+            current = await self.get_current(url, name, fields)
+            if current is None:
+                raise BrokerException(24, "BROKER::WriteFailed", f"{object_type} {name} already exists but can not be read")
+        changes = diff(current, payload)
+        if not changes:
+            logging.info(f"{object_type} {name} is unchanged")
+            if self.plan is not None:
+                self.plan.unchanged(f"{url}/{name}")
+            return
+        logging.debug(f"PATCH {url}/{name} payload { changes }")
+        resp = await self.api("PATCH", f"{url}/{name}", json=changes)
+        self.check_response(resp, object_type, name)
+
+    async def remove(self, object_type, url, name):
+        resp = await self.api("DELETE", f"{url}/{name}")
+        self.check_response(resp, object_type, name)
+
+    # Set based reconciliation of a list of child objects (topic exceptions, subscriptions), the writes run concurrently
+    async def reconcile(self, object_type, owner, current, requested, create, delete):
+        current = set(current or [])
+        requested = list(dict.fromkeys(requested or []))
+        added = [item for item in requested if item not in current]
+        wanted = set(requested)
+        removed = [item for item in current if item not in wanted]
+        writes = [(create, item) for item in added] + [(delete, item) for item in removed]
+        results = await asyncio.gather(*[write(item) for write, item in writes], return_exceptions=True)
+        failed = [(item, result) for (_, item), result in zip(writes, results) if isinstance(result, Exception)]
+        logging.info(f"{object_type} of {owner}: {len(added)} added, {len(removed)} removed, {len(requested) - len(added)} unchanged, {len(failed)} failed")
+        if failed:
+            raise BrokerException(24, "BROKER::WriteFailed", f"{len(failed)} {object_type} of {owner} failed: {[item for item, _ in failed[:10]]}")
+        return {"added": len(added), "removed": len(removed), "unchanged": len(requested) - len(added)}
+
+    async def exists(self, url):
+        response = await self.api("GET", url)
+        return response.status_code == 200
+
+    async def client_profile_exists(self, profile_name):
+        return await self.exists(f"msgVpns/{ self.msg_vpn_name }/clientProfiles/{profile_name}")
+
+    async def get_client_profile_names(self):
+        logging.info("Get Client Profiles")
+        url = f"msgVpns/{ self.msg_vpn_name }/clientProfiles"
+        return [item["clientProfileName"] async for item in self.get_collection(url, select="clientProfileName")]
+
+    async def acl_profile_exists(self, profile_name):
+        return await self.exists(f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}")
+
+    async def create_acl_profile(self, acl_profile, app_name):
+        url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles"
+        profile_name = acl_profile.name
+        logging.info(f"Create ACL-Profile '{profile_name}' for Application {app_name} on messageVPN '{self.msg_vpn_name}'")
+        await self.upsert("ACL-profile", url, profile_name, acl_profile.payload(msgVpnName=self.msg_vpn_name))
+        tasks = [
+            self.process_acl_publish_topic_exceptions(profile_name, acl_profile.publish_topic_exceptions),
+            self.process_acl_subscribe_topic_exceptions(profile_name, acl_profile.subscribe_topic_exceptions)
+        ]
+        if acl_profile.client_connect_exceptions:
+            tasks.append(self.process_acl_client_connect_exceptions(profile_name, acl_profile.client_connect_exceptions))
+        await asyncio.gather(*tasks)
+
+    async def process_acl_client_connect_exceptions(self, profile_name, connect_exceptions):
+        current = await self.get_acl_client_connect_exceptions(profile_name)
+        return await self.reconcile("clientConnectExceptions", profile_name, current, connect_exceptions,
+                                    lambda item: self.create_acl_client_connect_exception(profile_name, item),
+                                    lambda item: self.delete_acl_client_connect_exception(profile_name, item))
+
+    async def get_acl_client_connect_exceptions(self, profile_name):
+        url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/clientConnectExceptions"
+        return [item["clientConnectExceptionAddress"] async for item in self.get_collection(url, select="clientConnectExceptionAddress")]
+
+    async def create_acl_client_connect_exception(self, profile_name, exception):
+        url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/clientConnectExceptions"
+        payload = {
+            "aclProfileName": profile_name,
+            "msgVpnName": self.msg_vpn_name,
+            "clientConnectExceptionAddress": exception
+        }
+        logging.info(f"Create clientConnectException '{ exception }' on ACL-Profile '{profile_name}' on messageVPN '{self.msg_vpn_name}'")
+        resp = await self.api("POST", url, json=payload)
+        self.check_response(resp, "clientConnectException", exception)
+        return resp
+
+    async def delete_acl_client_connect_exception(self, profile_name, exception):
+        delete_url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/clientConnectExceptions/{quote(exception, '')}"
+        resp = await self.api("DELETE", delete_url)
+        self.check_response(resp, "clientConnectException", profile_name)
+        return resp
+
+    async def process_acl_publish_topic_exceptions(self, profile_name, topic_exceptions):
+        current = await self.get_acl_publish_topic_exceptions(profile_name)
+        return await self.reconcile("publishTopicExceptions", profile_name, current, topic_exceptions,
+                                    lambda item: self.create_acl_publish_topic_exception(profile_name, item),
+                                    lambda item: self.delete_acl_publish_topic_exception(profile_name, item))
+
+    async def get_acl_publish_topic_exceptions(self, profile_name):
+        url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/publishTopicExceptions"
+        return [item["publishTopicException"] async for item in self.get_collection(url, select="publishTopicException")]
+
+    async def create_acl_publish_topic_exception(self, profile_name, exception):
+        url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/publishTopicExceptions"
+        payload = {
+            "aclProfileName": profile_name,
+            "msgVpnName": self.msg_vpn_name,
+            "publishTopicException": exception,
+            "publishTopicExceptionSyntax": "smf"
+        }
+        logging.info(f"Create publishTopicException '{ exception }' on ACL-Profile '{profile_name}' on messageVPN '{self.msg_vpn_name}'")
+        resp = await self.api("POST", url, json=payload)
+        self.check_response(resp, "publishTopicExceptions", exception)
+        return resp
+
+    async def delete_acl_publish_topic_exception(self, profile_name, exception):
+        delete_url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/publishTopicExceptions/smf,{quote(exception,'')}"
+        resp = await self.api("DELETE", delete_url)
+        self.check_response(resp, "publishTopicException", exception)
+        return resp
+
+    async def process_acl_subscribe_topic_exceptions(self, profile_name, topic_exceptions):
+        current = await self.get_acl_subscribe_topic_exceptions(profile_name)
+        return await self.reconcile("subscribeTopicExceptions", profile_name, current, topic_exceptions,
+                                    lambda item: self.create_acl_subscribe_topic_exception(profile_name, item),
+                                    lambda item: self.delete_acl_subscribe_topic_exception(profile_name, item))
+
+    async def get_acl_subscribe_topic_exceptions(self, profile_name):
+        url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/subscribeTopicExceptions"
+        return [item["subscribeTopicException"] async for item in self.get_collection(url, select="subscribeTopicException")]
+
+    async def create_acl_subscribe_topic_exception(self, profile_name, exception):
+        url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/subscribeTopicExceptions"
+        payload = {
+            "aclProfileName": profile_name,
+            "msgVpnName": self.msg_vpn_name,
+            "subscribeTopicException": exception,
+            "subscribeTopicExceptionSyntax": "smf"
+        }
+        logging.info(f"Create subscribeTopicException '{ exception }' on ACL-Profile '{profile_name}' on messageVPN '{self.msg_vpn_name}'")
+        resp = await self.api("POST", url, json=payload)
+        self.check_response(resp, "subscribeTopicExceptions", exception)
+        return resp
+
+    async def delete_acl_subscribe_topic_exception(self, profile_name, exception):
+        delete_url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/subscribeTopicExceptions/smf,{quote(exception,'')}"
+        resp = await self.api("DELETE", delete_url)
+        self.check_response(resp, "subscribeTopicException", profile_name)
+        return resp
+
+    async def delete_acl_profile(self, acl_profile, app_name):
+        url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles"
+        acl_profile_name = acl_profile.name
+        logging.info(f"Delete ACL Profile {acl_profile_name} for {app_name}")
+        await self.remove("aclProfile", url, acl_profile_name)
+
+    async def client_username_exists(self, user_name):
+        return await self.exists(f"msgVpns/{ self.msg_vpn_name }/clientUsernames/{user_name}")
+
+    async def create_client_username(self, client_username, acl_profile, app_name, user):
+        logging.info(f"Create Client Username {user.get("name")} for Application {app_name}")
+        url = f"msgVpns/{ self.msg_vpn_name }/clientUsernames"
+        user_name = user.get("name")
+        client_profile_name = user.get("clientProfileName", "default")
+        payload = client_username.payload(msgVpnName=self.msg_vpn_name, aclProfileName=acl_profile.name, clientUsername=user_name,
+                                          clientProfileName=client_profile_name)
+        if not await self.client_profile_exists(client_profile_name):
+            logging.error(f"Client Profile Name {client_profile_name} does NOT exist on broker {self.name}")
+        if user.get("type") == "solaceClientUsername":
+            payload["password"] = user.get("password")
+        logging.info(f"Create clientUsername {user_name} on messageVPN {self.msg_vpn_name}")
+        await self.upsert("clientUsername", url, user_name, payload)
+
+    async def delete_client_username(self, client_username, app_name, user=None):
+        url = f"msgVpns/{ self.msg_vpn_name }/clientUsernames"
+        client_name = client_username.name if user is None else user.get("name")
+        logging.info(f"Delete client name { client_name } for Application {app_name}")
+        await self.remove("clientUsername", url, client_name)
+
+    async def authorization_group_exists(self, group_name):
+        return await self.exists(f"msgVpns/{ self.msg_vpn_name }/authorizationGroups/{group_name}")
+
+    async def create_authorization_group(self, authorization_group, acl_profile, app_name, group):
+        logging.info(f"Create Authentication Group {group.get("name")} for Application {app_name}")
+        url = f"msgVpns/{ self.msg_vpn_name }/authorizationGroups"
+        group_name = group.get("name")
+        client_profile_name = group.get("clientProfileName", "default")
+        payload = authorization_group.payload(msgVpnName=self.msg_vpn_name, aclProfileName=acl_profile.name, authorizationGroupName=group_name,
+                                              clientProfileName=client_profile_name)
+        if not await self.client_profile_exists(client_profile_name):
+            logging.error(f"Client Profile Name {client_profile_name} does NOT exist on broker {self.name}")
+        logging.info(f"Create authorizationGroup {group_name} on messageVPN {self.msg_vpn_name}")
+        await self.upsert("authorizationGroup", url, group_name, payload)
+
+    async def delete_authorization_group(self, authorization_group, group, app_name):
+        url = f"msgVpns/{ self.msg_vpn_name }/authorizationGroups"
+        authorization_group_name = group.get("name")
+        logging.info(f"Delete Authorization Group {authorization_group_name} for Application {app_name}")
+        await self.remove("authorizationGroup", url, authorization_group_name)
+
+    async def queue_exists(self, queue_name):
+        return await self.exists(f"msgVpns/{ self.msg_vpn_name }/queues/{queue_name}")
+
+    async def create_queues(self, solace_queues, owner):
+        logging.info(f"Create Queues")
+        await asyncio.gather(*[self.create_queue(queue, owner) for queue in solace_queues])
+
+    async def create_queue(self, queue, owner):
+        url = f"msgVpns/{ self.msg_vpn_name }/queues"
+        queue_name = queue.name
+        payload = queue.payload(msgVpnName=self.msg_vpn_name)
+        if owner and owner.get("name"):
+            payload["owner"] = owner["name"]
+        logging.info(f"Create queue '{queue_name}' on messageVPN '{self.msg_vpn_name}'")
+        await self.upsert("queue", url, queue_name, payload)
+        await self.process_queue_subscription_topics(queue_name, queue.subscriptions)
+
+    async def delete_queues(self, solace_queues):
+        logging.info(f"Delete Queues")
+        await asyncio.gather(*[self.delete_queue(queue) for queue in solace_queues])
+
+    async def delete_queue(self, queue):
+        url = f"msgVpns/{ self.msg_vpn_name }/queues"
+        queue_name = queue.name
+        logging.info(f"Delete Queue {queue_name}")
+        await self.remove("queue", url, queue_name)
+
+    async def process_queue_subscription_topics(self, queue_name, subscriptions):
+        current = await self.get_queue_subscription_topics(queue_name)
+        return await self.reconcile("subscriptions", queue_name, current, subscriptions,
+                                    lambda item: self.create_queue_subscription_topic(queue_name, item),
+                                    lambda item: self.delete_queue_subscription_topic(queue_name, item))
+
+    async def get_queue_subscription_topics(self, queue_name):
+        url = f"msgVpns/{ self.msg_vpn_name }/queues/{queue_name}/subscriptions"
+        return [item["subscriptionTopic"] async for item in self.get_collection(url, select="subscriptionTopic")]
+
+    async def create_queue_subscription_topic(self, queue_name, topic):
+        url = f"msgVpns/{ self.msg_vpn_name }/queues/{queue_name}/subscriptions"
+        payload = {
+            "queueName": queue_name,
+            "msgVpnName": self.msg_vpn_name,
+            "subscriptionTopic": topic
+        }
+        logging.info(f"Create subscriptionTopic '{ topic }' on Queue '{queue_name}' on messageVPN '{self.msg_vpn_name}'")
+        resp = await self.api("POST", url, json=payload)
+        self.check_response(resp, "subscriptionTopic", topic)
+        return resp
+
+    async def delete_queue_subscription_topic(self, queue_name, topic):
+        delete_url = f"msgVpns/{ self.msg_vpn_name }/queues/{queue_name}/subscriptions/{quote(topic, '')}"
+        resp = await self.api("DELETE", delete_url)
+        self.check_response(resp, "subscription", topic)
+        return resp
+
+    async def rdp_exists(self, rdp_name):
+        return await self.exists(f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }")
+
+    async def create_rdps(self, solace_rdps):
+        logging.info(f"Create restDeliveryPoints")
+        await asyncio.gather(*[self.create_rdp(rdp) for rdp in solace_rdps])
+
+    async def create_rdp(self, rdp):
+        url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints"
+        rdp_name = rdp.name
+        logging.info(f"Create rdp '{ rdp_name }' on messageVPN '{ self.msg_vpn_name }'")
+        await self.upsert("rdp", url, rdp_name, rdp.payload(msgVpnName=self.msg_vpn_name))
+        await self.process_rdp_consumers(rdp_name, rdp.consumers)
+
+    async def delete_rdps(self, solace_rdps):
+        logging.info(f"Delete restDeliveryPoints")
+        await asyncio.gather(*[self.delete_rdp(rdp) for rdp in solace_rdps])
+
+    async def delete_rdp(self, rdp):
+        url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints"
+        rdp_name = rdp.name
+        logging.info(f"Delete restDeliveryPoint { rdp_name }")
+        await self.remove("rdp", url, rdp_name)
+
+    async def process_rdp_consumers(self, rdp_name, rdp_consumers):
+        await asyncio.gather(*[self.create_rdp_consumer(rdp_name, rest_consumer) for rest_consumer in rdp_consumers])
+
+    async def get_rdp_consumers(self, rdp_name):
+        url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{rdp_name}/restConsumers"
+        return [item["restConsumerName"] async for item in self.get_collection(url, select="restConsumerName")]
+
+    async def rdp_consumer_exists(self, rdp_name, rdp_consumer_name):
+        return await self.exists(f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/restConsumers/{ rdp_consumer_name }")
+
+    async def create_rdp_consumer(self, rdp_name, rdp_consumer):
+        url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/restConsumers"
+        await self.upsert("rdp_consumer", url, rdp_consumer.name, rdp_consumer.payload())
+
+    async def rdp_queue_binding_exists(self, rdp_name, queue_binding_name):
+        return await self.exists(f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/queueBindings/{ queue_binding_name }")
+
+    async def create_rdp_queue_bindings(self, rdp_queue_bindings):
+        logging.info(f"Create RDP Queue bindings")
+        await asyncio.gather(*[self.create_rdp_queue_binding(queue_binding) for queue_binding in rdp_queue_bindings])
+
+    async def create_rdp_queue_binding(self, queue_binding):
+        rdp_name = queue_binding.rdp_name
+        queue_binding_name = queue_binding.name
+        url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/queueBindings"
+        await self.upsert("queue_binding", url, queue_binding_name, queue_binding.payload())
+        if queue_binding.protected_request_headers:
+            await self.create_queue_binding_request_headers(rdp_name, queue_binding_name, True, queue_binding.protected_request_headers)
+        if queue_binding.request_headers:
+            await self.create_queue_binding_request_headers(rdp_name, queue_binding_name, False, queue_binding.request_headers)
+
+    async def create_queue_binding_request_headers(self, rdp_name, queue_binding_name, protected, request_headers):
+        logging.info(f"Create RDP Queue Bindings RequestHeaders")
+        for request_header in request_headers:
+            await self.create_queue_binding_request_header(rdp_name, queue_binding_name, protected, request_header)
+
+    async def create_queue_binding_request_header(self, rdp_name, queue_binding_name, protected, request_header):
+        request = "protectedRequestHeaders" if protected else "requestHeaders"
+        logging.info(f"Create RDP Queue Bindings { request }")
+        url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/queueBindings/{ queue_binding_name }/{ request }"
+        if protected:
+            logging.error("")
+        else:
+            resp = await self.api("POST", url, json=dict(request_header))
+            self.check_response(resp, "requestHeader", request)
+
+    async def delete_rdp_queue_bindings(self, solace_rdp_queue_bindings):
+        logging.info(f"Delete restDeliveryPointQueueBindings")
+        await asyncio.gather(*[self.delete_rdp_queue_binding(queue_binding) for queue_binding in solace_rdp_queue_bindings])
+
+    async def delete_rdp_queue_binding(self, queue_binding):
+        rdp_name = queue_binding.rdp_name
+        queue_binding_name = queue_binding.name
+        url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/queueBindings/{ queue_binding_name }"
+        logging.info(f"Delete restDeliveryPoint { rdp_name } QueueBinding { queue_binding_name }")
+        resp = await self.api("DELETE", url)
+        self.check_response(resp, "rdp", rdp_name)
+
+    async def api(self, method, endpoint, params=None, json=None):
+        try:
+            if method is None or endpoint is None:
+                raise Exception('You must pass a method and endpoint')
+            if method != "GET" and self.plan is not None:
+                self.plan.add(method, endpoint, json)
+            if method != "GET" and self.dry_run:
+                return BrokerResponse(200, {"meta": {"request": {"method": method}}})
+            await self.open()
+            async with self.in_flight:
+                start = time.perf_counter()
+                response = await request(self.session, method, f"{ self.url }/{endpoint}", self.retries, self.backoff_factor, params=params, json=json, rate_limiter=self.rate_limiter)
+            observe("semp", method, endpoint, response, time.perf_counter() - start)
+        except Exception as exc:
+            logging.error(f"BROKER::HTTP { method } Request to endpoint { endpoint } failed with exception { exc}")
+            raise BrokerException( 22, "BROKER::Exception", f"HTTP { method } Request to endpoint { endpoint } failed")
+        code = response.status_code
+        message = response.json()
+        if code < 400:
+            return BrokerResponse(code, message)
+        if code == 400:
+            self.check_semp_message(method, endpoint, code, message)
+            return BrokerResponse(code, message)
+        if code == 422:
+            logging.error(f"BROKER::HTTP { method } Request to endpoint { endpoint } failed with status_code { code }: message: { message }")
+            raise response.unprocessable_entity()
+        raise BrokerException(21, "BROKER::HTTPError", f"code:{code}, message:{ message }")
@@ -0,0 +1,265 @@
+from deployer.errors import *
+from deployer.event_portal import get_path_expr, DEFAULT_PAGE_SIZE
+from deployer.session import DEFAULT_POOL_SIZE, DEFAULT_RETRIES, DEFAULT_BACKOFF_FACTOR
+from deployer.async_session import create_async_session, request, require_aiohttp
+from deployer.cache import ResponseCache
+from deployer.rate_limit import get_rate_limiter
+from deployer.metrics import observe
+from functools import reduce
+
+import asyncio
+import os
+import logging
+import time
+
+# asyncio counterpart of EventPortal with the same methods as coroutines (the iter_* methods are async generators).
+# Use it as an async context manager, the session is opened on enter.
+class AsyncEventPortal:
+
+    def __init__(self, base_url, solace_cloud_token, pool_size=DEFAULT_POOL_SIZE, timeout=None,
+                 retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, max_in_flight=None, cache_dir=None,
+                 cache_ttl=None, page_size=DEFAULT_PAGE_SIZE, rate_limit=None):
+        require_aiohttp()
+        if solace_cloud_token is None and os.environ.get('SOLACE_CLOUD_TOKEN') is None or base_url is None:
+            raise EventPortalException(10,'You must define the base_url and Solace Cloud token')
+        token = solace_cloud_token if solace_cloud_token else os.environ.get('SOLACE_CLOUD_TOKEN')
+        self.base_url = base_url
+        self.headers = {"authorization": f"Bearer {token}"}
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = get_rate_limiter(base_url, rate_limit)
+        self.in_flight = asyncio.Semaphore(max_in_flight if max_in_flight else pool_size)
+        self.cache = ResponseCache(cache_dir, cache_ttl)
+        self.indexes = {}
+        self.page_size = page_size
+        self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            self.session = create_async_session(self.pool_size, self.timeout, self.headers)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    ## Design API calls
+    async def get_application_domain_object(self,application_domain_name):
+        application_domains = self.paged(self.design_api, "applicationDomains", params={"name": application_domain_name})
+        return await first(application_domains, lambda domain: domain.get('name') == application_domain_name)
+
+    async def get_application_domain_id(self, application_domain_name):
+        application_domain = await self.get_application_domain_object(application_domain_name)
+        return application_domain.get("id")
+
+    async def get_application_objects(self,application_domain_id):
+        return [application async for application in self.iter_application_objects(application_domain_id)]
+
+    def iter_application_objects(self, application_domain_id):
+        return self.paged(self.design_api, "applications", params={"applicationDomainId": application_domain_id})
+
+    async def get_application_object_by_name(self, application_domain_id, application_name ):
+        index = self.indexes.get(("applications", application_domain_id))
+        if index is not None:
+            return index.get(application_name)
+        applications = self.iter_application_objects(application_domain_id)
+        return await first(applications, lambda application: application.get("name") == application_name)
+
+    async def get_application_objects_by_name(self, application_domain_id):
+        key = ("applications", application_domain_id)
+        if key not in self.indexes:
+            applications = await self.get_application_objects(application_domain_id)
+            self.indexes[key] = {application.get("name"): application for application in applications}
+        return self.indexes[key]
+
+    async def get_application_ids(self,application_domain_id):
+        applications = await self.get_application_objects(application_domain_id)
+        return get_path_expr(applications, "$..id")
+
+    async def get_application_id_by_name(self,application_domain_id, application_name):
+        application = await self.get_application_object_by_name(application_domain_id, application_name)
+        return application["id"] if application["id"] else None
+
+    async def get_application_version_objects(self,application_id):
+        return [version async for version in self.iter_application_version_objects(application_id)]
+
+    # application_ids is a single id or a comma separated list of ids
+    def iter_application_version_objects(self, application_ids):
+        return self.paged(self.design_api, "applicationVersions", params={"applicationIds": application_ids})
+
+    # All versions of the given applications indexed by (applicationId, version), the chunks are read concurrently
+    async def get_application_version_objects_by_name(self, application_ids, chunk_size=20):
+        chunks = [",".join(application_ids[start:start + chunk_size]) for start in range(0, len(application_ids), chunk_size)]
+        versions = {}
+        for chunk in await asyncio.gather(*[self.get_application_version_objects(chunk) for chunk in chunks]):
+            for version in chunk:
+                versions[(version.get("applicationId"), version.get("version"))] = version
+        return versions
+
+    async def get_application_version_ids(self,application_id):
+        versions = await self.get_application_version_objects(application_id)
+        return get_path_expr(versions, "$..id")
+
+    async def get_application_version_object_by_name(self,application_id, version_name):
+        versions = self.iter_application_version_objects(application_id)
+        return await first(versions, lambda version: version.get("version") == version_name)
+
+    async def get_application_version_id_by_name(self,application_id, version_name):
+        version = await self.get_application_version_object_by_name(application_id, version_name)
+        return version["id"] if version["id"] else None
+
+    ## Runtime API calls
+    async def get_environment_object(self, environment_name):
+        environments = self.paged(self.runtime_api, "environments")
+        return await first(environments, lambda env: env.get('name') == environment_name)
+
+    async def get_environment_id(self, environment_name):
+        env = await self.get_environment_object(environment_name)
+        return env.get("id")
+
+    async def get_modeled_event_mesh_object(self, environment_id, mesh_name):
+        meshes = self.paged(self.runtime_api, "eventMeshes", params={"environmentId": environment_id})
+        return await first(meshes, lambda mesh: mesh.get('name') == mesh_name)
+
+    async def get_modeled_event_mesh_id(self, environment_id, mesh_name):
+        mesh = await self.get_modeled_event_mesh_object(environment_id, mesh_name)
+        return mesh.get("id")
+
+    async def get_messaging_services_objects(self, mesh_id):
+        return [service async for service in self.paged(self.runtime_api, "messagingServices", params={"eventMeshId": mesh_id})]
+
+    async def get_messaging_services_ids(self, mesh_id):
+        services = await self.get_messaging_services_objects(mesh_id)
+        return get_path_expr(services, "$..messagingServiceId")
+
+    async def preview_application_deployment(self, version_id, action, messaging_service_id):
+        payload = {
+            "applicationVersionId": version_id,
+            "action": action,
+            "eventBrokerId": messaging_service_id
+        }
+        try:
+            return await self.runtime_api("POST", "runtimeManagement/applicationDeploymentPreviews", json=payload)
+        except Exception as ex:
+            logging.error(f"preview_application-deployment:: Exception {ex}")
+            raise ex
+
+    async def create_application_deployment(self, version_id, action, messaging_service_id):
+        payload = {
+            "applicationVersionId": version_id,
+            "action": action,
+            "eventBrokerId": messaging_service_id
+        }
+        return await self.runtime_api("POST", "runtimeManagement/applicationDeployments", json=payload)
+
+    ## Mission Control API calls
+    async def get_event_broker_objects(self, environment_id):
+        return [broker async for broker in self.iter_event_broker_objects(environment_id)]
+
+    def iter_event_broker_objects(self, environment_id):
+        return self.paged(self.missioncontrol_api, "eventBrokerServices", params={"customAttributes": f"environmentId=={environment_id}"})
+
+    async def get_broker_ids(self, environment_id):
+        brokers = await self.get_event_broker_objects(environment_id)
+        return get_path_expr(brokers, "$..id")
+
+    async def get_broker_id_by_name(self, environment_id, broker_name):
+        broker = await self.get_broker_by_name(environment_id, broker_name)
+        return broker.get("id") if broker else None
+
+    async def get_broker_by_name(self, environment_id, broker_name):
+        brokers = self.iter_event_broker_objects(environment_id)
+        return await first(brokers, lambda broker: broker.get("name") == broker_name)
+
+    async def get_client_profile_objects(self, service_id):
+        return [profile async for profile in self.paged(self.missioncontrol_api, f"eventBrokerServices/{service_id}/clientProfiles")]
+
+    async def get_client_profile_names(self, service_id):
+        profiles = await self.get_client_profile_objects(service_id)
+        return get_path_expr(profiles, "$..name")
+
+    async def profile_exists(self, service_id, preview_profile_names):
+        profile_names = await self.get_client_profile_names(service_id)
+        return reduce(lambda acc, name: acc and any(map(lambda target: name == target, preview_profile_names)), profile_names, True)
+
+    # Yields the objects of all pages of a list endpoint, the next page is requested once the consumer resumes after the
+    # first object of the current page, so an early exit never requests a page nobody reads
+    async def paged(self, api, endpoint, params=None, page_size=None):
+        params = dict(params or {})
+        params["pageSize"] = page_size if page_size else self.page_size
+        fetch = lambda page_number: asyncio.ensure_future(api("GET", endpoint, params={**params, "pageNumber": page_number}))
+        future = fetch(1)
+        try:
+            while future is not None:
+                response = await future
+                next_page = response.get("meta", {}).get("pagination", {}).get("nextPage")
+                future = None
+                for item in response.get("data") or []:
+                    yield item
+                    if next_page and future is None:
+                        future = fetch(next_page)
+                if next_page and future is None:
+                    future = fetch(next_page)
+        finally:
+            if future is not None:
+                future.cancel()
+
+    ## Internal api calls
+    async def design_api(self, method, endpoint, **kwargs):
+        return await self.api(method, f"architecture/{endpoint}", **kwargs)
+
+    async def runtime_api(self, method, endpoint, **kwargs):
+        return await self.api(method, f"architecture/{endpoint}", **kwargs)
+
+    async def missioncontrol_api(self, method, endpoint, **kwargs):
+        return await self.api(method, f"missionControl/{endpoint}", **kwargs)
+
+    async def api(self, method, endpoint, params=None, json=None):
+        try:
+            if method is None or endpoint is None:
+                raise Exception('You must pass a method and endpoint')
+            # read-only calls are answered from the cache, keyed by endpoint and query parameters
+            key = ResponseCache.key(endpoint, params) if method == "GET" else None
+            if key:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+            await self.open()
+            async with self.in_flight:
+                start = time.perf_counter()
+                response = await request(self.session, method, f"{self.base_url}/{endpoint}", self.retries, self.backoff_factor, params=params, json=json, rate_limiter=self.rate_limiter)
+            observe("portal", method, endpoint, response, time.perf_counter() - start)
+        except Exception as exc:
+            logging.error(f"PORTAL:HTTP { method } Request to endpoint { endpoint } failed with exception { exc}")
+            raise EventPortalException( 12, "PORTAL:Exception", f"HTTP { method } Request to endpoint { endpoint } failed")
+        code = response.status_code
+        message = response.json()
+        if code < 400:
+            if key:
+                self.cache.put(key, message)
+            return message
+        logging.error(f"PORTAL::HTTP { method } Request to endpoint { endpoint } failed with status_code { code }: message: { message }")
+        if code == 400 and "not currently deployed" not in message:
+            return message
+        if code == 422:
+            raise response.unprocessable_entity()
+        raise EventPortalException(11, "PORTAL:HTTPError", f"code:{code}, message:{ message }")
+
+# Returns the first item of an async iterator that matches, closing the iterator so no further pages are read
+async def first(items, match):
+    try:
+        async for item in items:
+            if match(item):
+                return item
+        return None
+    finally:
+        await items.aclose()
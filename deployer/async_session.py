@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from requests import Request, Response
+from deployer.errors import UnprocessableEntity
+from deployer.session import DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_RETRIES, DEFAULT_BACKOFF_FACTOR, should_retry
+from deployer.rate_limit import THROTTLE_STATUS_CODES, parse_retry_after, backoff
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# The async clients are optional, aiohttp is only installed with: pip install SolaceDeployer[async]
+def require_aiohttp():
+    if aiohttp is None:
+        raise ImportError("The async clients need aiohttp, install it with: pip install SolaceDeployer[async]")
+
+def get_async_timeout(timeout):
+    # same settings as get_timeout: a single number for both the connect and read timeout, a list as [connect, read]
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    connect, read = timeout if isinstance(timeout, (list, tuple)) else (timeout, timeout)
+    return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+def create_async_session(pool_size=DEFAULT_POOL_SIZE, timeout=None, headers=None, auth=None, verify=True):
+    require_aiohttp()
+    connector = aiohttp.TCPConnector(limit=pool_size, ssl=None if verify else False)
+    return aiohttp.ClientSession(connector=connector, timeout=get_async_timeout(timeout), headers=headers, auth=auth)
+
+class AsyncResponse:
+    def __init__(self, method, url, status_code, content, payload=None, retries=0):
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.payload = payload
+        self.retries = retries
+
+    def json(self):
+        return json.loads(self.content) if self.content else {}
+
+    # UnprocessableEntity is a requests HTTPError, it is given the request and response it expects
+    def unprocessable_entity(self):
+        request = Request(self.method, self.url, json=self.payload).prepare()
+        response = Response()
+        response.status_code = self.status_code
+        response._content = self.content
+        response.request = request
+        return UnprocessableEntity(request, response)
+
+# Retries the same methods and status codes as the RetryAdapter of create_session, with jittered backoff and the rate limiter of the host
+async def request(session, method, url, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, params=None, json=None, rate_limiter=None):
+    attempt = 0
+    while True:
+        if rate_limiter:
+            wait = rate_limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        async with session.request(method, url, params=params, json=json) as response:
+            content = await response.read()
+            status_code = response.status
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if rate_limiter:
+            if status_code in THROTTLE_STATUS_CODES:
+                rate_limiter.throttled(retry_after)
+            else:
+                rate_limiter.succeeded()
+        if not should_retry(method, status_code, attempt, retries):
+            return AsyncResponse(method, url, status_code, content, json, attempt)
+        await asyncio.sleep(backoff(attempt, backoff_factor, retry_after))
+        attempt += 1
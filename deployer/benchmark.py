@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from deployer import deploy
+from deployer.mock_server import MockSolace
+from deployer.scheduler import JobResult
+from deployer.utils import parse_arguments, setup_logging
+
+DEFAULT_SIZES = [10, 100, 1000]
+
+# Scenario name and the extra deployer arguments, run in this order on the same broker:
+# a first deploy, a redeploy that is skipped by the fingerprints, a forced redeploy that finds every object unchanged and an undeploy
+SCENARIOS = [
+    ("deploy", ["--action=deploy"]),
+    ("redeploy", ["--action=deploy"]),
+    ("redeploy --force", ["--action=deploy", "--force"]),
+    ("undeploy", ["--action=undeploy"])
+]
+
+# Runs the deployer in mode semp against a MockSolace for every number of applications and reports
+# the wall time, the number of SEMP and Event Portal requests and the requests per second of every scenario
+def benchmark(sizes=None, parallel=1, latency=0.0, error_rate=0.0, topics=3, rate_limit=None):
+    reports = []
+    cwd = os.getcwd()
+    for size in sizes or DEFAULT_SIZES:
+        with tempfile.TemporaryDirectory(prefix="deployer-benchmark-") as directory, MockSolace(size, topics=topics, latency=latency, error_rate=error_rate, rate_limit=rate_limit) as mock:
+            write_configs(directory, mock, size)
+            os.chdir(directory)
+            try:
+                for scenario, extra in SCENARIOS:
+                    arguments = parse_arguments(["--mode=semp", "--target=tst", f"--parallel={parallel}"] + extra)
+                    mock.reset_counts()
+                    start = time.perf_counter()
+                    results = deploy.run_target(arguments, arguments.target)
+                    duration = time.perf_counter() - start
+                    requests = mock.requests()
+                    reports.append({
+                        "applications": size,
+                        "scenario": scenario,
+                        "seconds": round(duration, 3),
+                        "sempRequests": mock.requests("semp"),
+                        "portalRequests": mock.requests("portal"),
+                        "requestsPerSecond": round(requests / duration, 1) if duration else 0.0,
+                        "throttled": mock.throttled,
+                        "failed": len([result for result in results if result.status != JobResult.SUCCEEDED])
+                    })
+                    print_report(reports[-1])
+            finally:
+                os.chdir(cwd)
+    return reports
+
+def write_configs(directory, mock, size):
+    os.makedirs(os.path.join(directory, "config"))
+    applications = [{
+        "name": f"app{index}",
+        "version": mock.version,
+        "user": {"name": f"app{index}-user", "type": "solaceClientUsername", "password": f"app{index}"}
+    } for index in range(size)]
+    configs = {
+        "eventPortal": {"baseUrl": mock.portal_url, "token": "benchmark"},
+        "dev": {"environment": "dev", "environmentName": "Dev", "meshName": mock.mesh_name},
+        "tst": {
+            "environment": "tst",
+            "environmentName": "Test",
+            "meshName": mock.mesh_name,
+            "domains": [{"domainName": mock.domain_name, "applications": applications}],
+            "brokers": [{"name": "mock", "url": mock.semp_url, "user": "admin", "password": "admin", "msgVpnName": "benchmark"}]
+        }
+    }
+    for name, config in configs.items():
+        with open(os.path.join(directory, "config", f"{ name }.json"), "w") as file:
+            json.dump(config, file, indent=2)
+
+def print_report(report):
+    print(f"{report['applications']:>6} apps  {report['scenario']:<18} {report['seconds']:9.2f}s "
+          f"{report['sempRequests']:>8} semp {report['portalRequests']:>6} portal {report['requestsPerSecond']:>9.1f} req/s "
+          f"{report['throttled']:>6} throttled {report['failed']:>4} failed")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the deployer against a local mock of SEMP v2 and the Event Portal")
+    parser.add_argument("--sizes", type=str, help="Comma separated numbers of applications", default=",".join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument("--parallel", type=int, help="Number of applications to handle concurrently", default=1)
+    parser.add_argument("--latency", type=float, help="Seconds added to every mock request", default=0.0)
+    parser.add_argument("--error-rate", type=float, help="Fraction of mock requests that fail with a 503", default=0.0)
+    parser.add_argument("--rate-limit", type=int, help="Requests per second above which the mock answers with a 429", default=None)
+    parser.add_argument("--topics", type=int, help="Topic exceptions and queue subscriptions per application", default=3)
+    parser.add_argument("--output", type=str, help="Write the results as JSON to this file", default=None)
+    parser.add_argument("--log", type=str, help="Logging level of the deployer", default="WARNING")
+    arguments = parser.parse_args()
+    setup_logging(arguments.log)
+    sizes = [int(size) for size in arguments.sizes.split(",")]
+    reports = benchmark(sizes, arguments.parallel, arguments.latency, arguments.error_rate, arguments.topics, arguments.rate_limit)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(reports, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,57 @@
 from requests.auth import HTTPBasicAuth
-from requests import request
 from requests import exceptions
 from deployer.errors import *
-from deployer.event_portal import get_path_expr
-from urllib.parse import quote
-
+from deployer.session import create_session, get_timeout, DEFAULT_POOL_SIZE, DEFAULT_RETRIES, DEFAULT_BACKOFF_FACTOR
+from deployer.plan import diff, readable
+from deployer.metrics import observe
+from deployer.rate_limit import get_rate_limiter
+from deployer.state import VpnState, COLLECTIONS, DEFAULT_TTL
+from deployer.scheduler import map_parallel
+from urllib.parse import quote, urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+import copy
 import logging
+import threading
+import time
 import urllib3
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+DEFAULT_PAGE_SIZE = 100
+RESPONSE_TOO_LARGE = 549 # SEMP_RESPONSE_BUFFER_ALLOCATION_FAILED
+NOT_FOUND = 6
+ALREADY_EXISTS = 10
+
+def semp_error_code(message):
+    return (message.get("meta", {}).get("error") or {}).get("code") if isinstance(message, dict) else None
+
+# A create of an object that already exists or a delete of an object that is already gone leaves the broker as requested
+def write_succeeded(response):
+    if response is None or response.status_code in [200, 201]:
+        return True
+    method = response.message.get("meta", {}).get("request", {}).get("method")
+    return (method, semp_error_code(response.message)) in [("POST", ALREADY_EXISTS), ("DELETE", NOT_FOUND)]
+
+# The cursor of the next page, from the cursorQuery of the paging metadata or else from the cursor of its nextPageUri
+def page_cursor(message):
+    paging = message.get("meta", {}).get("paging") or {}
+    if paging.get("cursorQuery"):
+        return paging["cursorQuery"]
+    next_page = paging.get("nextPageUri")
+    if next_page:
+        return parse_qs(urlsplit(next_page).query).get("cursor", [None])[0]
+    return None
+
 class BrokerResponse:
     def __init__(self, status_code, message):
         self.status_code = status_code
         self.message = message
 
 class Broker:
-    def __init__(self, name, url, user, password, msg_vpn_name, headers=None):
+    def __init__(self, name, url, user, password, msg_vpn_name, headers=None, pool_size=DEFAULT_POOL_SIZE,
+                 timeout=None, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, max_in_flight=None,
+                 snapshot_ttl=DEFAULT_TTL, rate_limit=None):
         if user is None and password is None or url is None:
             raise BrokerException(20, 'You must define the url, username and password')
         self.name = name
@@ -24,8 +59,146 @@ class Broker:
         self.auth = HTTPBasicAuth(user, password) if user and password else None
         self.msg_vpn_name = msg_vpn_name
         self.headers = headers
+        self.timeout = get_timeout(timeout)
+        self.session = create_session(pool_size, retries, backoff_factor, get_rate_limiter(url, rate_limit))
+        self.session.auth = self.auth
+        self.session.verify = False
+        if headers:
+            self.session.headers.update(headers)
+        # bounds the number of concurrent requests to this broker, whatever the number of threads using it
+        self.max_in_flight = max_in_flight if max_in_flight else pool_size
+        self.in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        # the write threads of the broker, shared by all applications and tasks writing lists of objects to it. Only leaf
+        # writes run on it, so a write never waits for another one queued behind it.
+        self.writer = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix=f"{name}-write")
+        self.state = VpnState(self, snapshot_ttl)
+        self.plan = None
+        self.dry_run = False
+
+    def close(self):
+        self.writer.shutdown()
+        self.session.close()
+
+    # Shallow copy sharing the connection pool, write threads and VPN state, so concurrent executions each record their own plan
+    def planned(self, plan, dry_run=False):
+        broker = copy.copy(self)
+        broker.plan = plan
+        broker.dry_run = dry_run
+        return broker
+
+    # Iterates over all objects of a collection page by page, following the cursor of the broker. select limits the attributes
+    # returned per object. A page too large for the broker is requested again with half the count. A collection whose parent
+    # object does not exist is empty, any other failing page raises instead of silently truncating the collection.
+    def get_collection(self, endpoint, select=None, count=DEFAULT_PAGE_SIZE):
+        params = {"count": count}
+        if select:
+            params["select"] = select
+        pages = 0
+        while True:
+            resp = self.api("GET", endpoint, params=params)
+            if resp.status_code != 200:
+                if semp_error_code(resp.message) == RESPONSE_TOO_LARGE and params["count"] > 1:
+                    params["count"] = params["count"] // 2
+                    continue
+                # only a missing parent object means an empty collection, any other error would truncate it
+                if pages == 0 and semp_error_code(resp.message) == NOT_FOUND:
+                    return
+                raise BrokerException(23, "BROKER::PagingError", f"GET { endpoint } failed after { pages } pages with status_code { resp.status_code }: { resp.message.get('meta', {}).get('error') }")
+            pages += 1
+            yield from resp.message.get("data", [])
+            cursor = page_cursor(resp.message)
+            if not cursor:
+                return
+            params["cursor"] = cursor
+
+    def get_current(self, url, name, fields=None):
+        collection = self.state.collection_of(url) if self.state else None
+        if collection:
+            return self.state.get(collection, name, fields)
+        return self.read(url, name, fields)
+
+    # Reads an object from the broker, bypassing the VPN state
+    def read(self, url, name, fields=None):
+        params = {"select": ",".join(sorted(fields))} if fields else None
+        response = self.api("GET", f"{url}/{name}", params=params)
+        return response.message.get("data") if response.status_code == 200 else None
+
+    # Creates the object when it does not exist and only patches the attributes that differ from the broker.
+    # The state is only updated with writes the broker applied.
+    def upsert(self, object_type, url, name, payload):
+        fields = readable(payload.keys())
+        current = self.get_current(url, name, fields)
+        if current is None:
+            logging.debug(f"POST { url } payload { payload }")
+            resp = self.api("POST", url, json=payload)
+            if semp_error_code(resp.message) != ALREADY_EXISTS:
+                self.check_response(resp, object_type, name)
+                self.update_state(url, name, payload)
+                return
+            # created since the VPN state was read, it is compared with the broker and patched like any existing object
+            logging.info(f"{object_type} {name} already exists on the broker, reading it to apply the requested attributes")
+            self.forget_state(url, name)
+            current = self.read(url, name, fields)
+            if current is None:
+                raise BrokerException(24, "BROKER::WriteFailed", f"{object_type} {name} already exists but can not be read")
+        changes = diff(current, payload)
+        if not changes:
+            logging.info(f"{object_type} {name} is unchanged")
+            if self.plan is not None:
+                self.plan.unchanged(f"{url}/{name}")
+            return
+        logging.debug(f"PATCH {url}/{name} payload { changes }")
+        resp = self.api("PATCH", f"{url}/{name}", json=changes)
+        self.check_response(resp, object_type, name)
+        self.update_state(url, name, changes)
+
+    def remove(self, object_type, url, name):
+        collection = self.state.collection_of(url) if self.state else None
+        # an object missing from the state can have been created after it was read, the broker confirms before the delete is skipped
+        if collection and not self.state.exists(collection, name) and self.read(url, name, [COLLECTIONS[collection]]) is None:
+            logging.info(f"{object_type} {name} does not exist")
+            return
+        resp = self.api("DELETE", f"{url}/{name}")
+        self.check_response(resp, object_type, name)
+        self.forget_state(url, name)
+
+    # Set based reconciliation of a list of child objects (topic exceptions, subscriptions). The creates and deletes are
+    # one request per item, all sent concurrently on the write threads of the broker over the keep-alive connections. A failing item does
+    # not stop the others, the failed items fail the list once all writes are done.
+    def reconcile(self, object_type, owner, current, requested, create, delete):
+        current = set(current or [])
+        requested = list(dict.fromkeys(requested or []))
+        added = [item for item in requested if item not in current]
+        wanted = set(requested)
+        removed = [item for item in current if item not in wanted]
+        writes = [(create, item) for item in added] + [(delete, item) for item in removed]
+        results = map_parallel(lambda write: write[0](write[1]), writes, executor=self.writer) if writes else []
+        failed = [(item, error) for (_, item), (_, error) in zip(writes, results) if error]
+        logging.info(f"{object_type} of {owner}: {len(added)} added, {len(removed)} removed, {len(requested) - len(added)} unchanged, {len(failed)} failed")
+        if failed:
+            raise BrokerException(24, "BROKER::WriteFailed", f"{len(failed)} {object_type} of {owner} failed: {[item for item, _ in failed[:10]]}")
+        return {"added": len(added), "removed": len(removed), "unchanged": len(requested) - len(added)}
+
+    def run_concurrently(self, task, items):
+        if len(items) <= 1:
+            for item in items:
+                task(item)
+            return
+        list(self.writer.map(task, items))
+
+    def update_state(self, url, name, attributes):
+        collection = self.state.collection_of(url) if self.state else None
+        if collection and not self.dry_run:
+            self.state.put(collection, name, attributes)
+
+    def forget_state(self, url, name):
+        collection = self.state.collection_of(url) if self.state else None
+        if collection and not self.dry_run:
+            self.state.remove(collection, name)
 
     def client_profile_exists(self, profile_name):
+        if self.state:
+            return self.state.exists("clientProfiles", profile_name)
         url = f"msgVpns/{ self.msg_vpn_name }/clientProfiles/{profile_name}"
         response = self.api("GET", url)
         return response.status_code == 200
@@ -37,44 +210,30 @@ class Broker:
         self.check_response(response, "ClientProfiles", "all")
 
     def acl_profile_exists(self, profile_name):
+        if self.state:
+            return self.state.exists("aclProfiles", profile_name)
         url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}"
         response = self.api("GET", url)
         return response.status_code == 200
 
     def create_acl_profile(self, acl_profile, app_name):
         url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles"
-        profile = acl_profile["aclProfile"]
-        profile["msgVpnName"] = self.msg_vpn_name
-        profile_name = profile["aclProfileName"]
-        #profile["aclProfileName"] = f"app-{ app_name.lower() }_{index}" if profile["aclProfileName"].startswith("app-") else profile["aclProfileName"]
+        profile_name = acl_profile.name
         logging.info(f"Create ACL-Profile '{profile_name}' for Application {app_name} on messageVPN '{self.msg_vpn_name}'")
-        if self.acl_profile_exists(profile_name):
-            logging.debug(f"Patch {url}/{profile_name} payload { profile }")
-            resp = self.api("PATCH", f"{url}/{profile_name}", json=profile)
-            self.check_response(resp, "ACL-profile", acl_profile)
-        else:
-            logging.debug(f"POST { url } payload { profile}")
-            resp = self.api("POST", url, json=profile)
-            self.check_response(resp, "ACL-profile", acl_profile)
-        self.process_acl_client_connect_exceptions(profile_name, acl_profile["clientConnectExceptions"]) if acl_profile.get("clientConnectExceptions") else None
-        self.process_acl_publish_topic_exceptions(profile_name, acl_profile["publishTopicExceptions"])
-        self.process_acl_subscribe_topic_exceptions(profile_name, acl_profile["subscribeTopicExceptions"])
+        self.upsert("ACL-profile", url, profile_name, acl_profile.payload(msgVpnName=self.msg_vpn_name))
+        self.process_acl_client_connect_exceptions(profile_name, acl_profile.client_connect_exceptions) if acl_profile.client_connect_exceptions else None
+        self.process_acl_publish_topic_exceptions(profile_name, acl_profile.publish_topic_exceptions)
+        self.process_acl_subscribe_topic_exceptions(profile_name, acl_profile.subscribe_topic_exceptions)
 
     def process_acl_client_connect_exceptions(self, profile_name, connect_exceptions):
-        current_exceptions = self.get_acl_client_connect_exceptions(profile_name)
-        for exception in connect_exceptions:
-            if exception not in current_exceptions:
-                self.create_acl_client_connect_exception(profile_name, exception)
-            else:
-                logging.info(f"ConnectException {exception} already exists in ACL-profile {profile_name}...")
-                current_exceptions.remove(exception) if current_exceptions else None
-        for exception in current_exceptions:
-            self.delete_acl_client_connect_exception(profile_name, exception)
+        current = self.get_acl_client_connect_exceptions(profile_name)
+        return self.reconcile("clientConnectExceptions", profile_name, current, connect_exceptions,
+                              lambda item: self.create_acl_client_connect_exception(profile_name, item),
+                              lambda item: self.delete_acl_client_connect_exception(profile_name, item))
 
     def get_acl_client_connect_exceptions(self, profile_name):
         url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/clientConnectExceptions"
-        resp = self.api("GET", url)
-        return get_path_expr(resp.message, "$..clientConnectExceptionAddress") if resp.status_code == 200 else None
+        return [item["clientConnectExceptionAddress"] for item in self.get_collection(url, select="clientConnectExceptionAddress")]
 
     def create_acl_client_connect_exception(self, profile_name, exception):
         url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/clientConnectExceptions"
@@ -87,27 +246,23 @@ class Broker:
         logging.debug(f"POST { url } payload { payload }")
         resp = self.api("POST", url, json=payload)
         self.check_response(resp, "clientConnectException", exception)
+        return resp
 
     def delete_acl_client_connect_exception(self, profile_name, exception):
         delete_url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/clientConnectExceptions/{quote(exception, '')}"
         resp = self.api("DELETE", delete_url)
         self.check_response(resp, "clientConnectException", profile_name)
+        return resp
 
     def process_acl_publish_topic_exceptions(self, profile_name, topic_exceptions):
-        current_exceptions = self.get_acl_publish_topic_exceptions(profile_name)
-        for exception in topic_exceptions:
-            if exception not in current_exceptions:
-                self.create_acl_publish_topic_exception(profile_name, exception)
-            else:
-                logging.info(f"PublishTopicException {exception} already exists in ACL-profile {profile_name}...")
-                current_exceptions.remove(exception) if current_exceptions else None
-        for exception in current_exceptions:
-            self.delete_acl_publish_topic_exception(profile_name, exception)
+        current = self.get_acl_publish_topic_exceptions(profile_name)
+        return self.reconcile("publishTopicExceptions", profile_name, current, topic_exceptions,
+                              lambda item: self.create_acl_publish_topic_exception(profile_name, item),
+                              lambda item: self.delete_acl_publish_topic_exception(profile_name, item))
 
     def get_acl_publish_topic_exceptions(self, profile_name):
         url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/publishTopicExceptions"
-        resp = self.api("GET", url)
-        return get_path_expr(resp.message, "$..publishTopicException") if resp.status_code == 200 else None
+        return [item["publishTopicException"] for item in self.get_collection(url, select="publishTopicException")]
 
     def create_acl_publish_topic_exception(self, profile_name, exception):
         url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/publishTopicExceptions"
@@ -121,27 +276,23 @@ class Broker:
         logging.debug(f"POST { url } payload { payload }")
         resp = self.api("POST", url, json=payload)
         self.check_response(resp, "publishTopicExceptions", exception)
+        return resp
 
     def delete_acl_publish_topic_exception(self, profile_name, exception):
         delete_url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/publishTopicExceptions/smf,{quote(exception,'')}"
         resp = self.api("DELETE", delete_url)
         self.check_response(resp, "publishTopicException", exception)
+        return resp
 
     def process_acl_subscribe_topic_exceptions(self, profile_name, topic_exceptions):
-        current_exceptions = self.get_acl_subscribe_topic_exceptions(profile_name)
-        for exception in topic_exceptions:
-            if exception not in current_exceptions:
-                self.create_acl_subscribe_topic_exception(profile_name, exception)
-            else:
-                logging.info(f"SubscribeTopicException {exception} already exists in ACL-profile {profile_name}...")
-                current_exceptions.remove(exception) if current_exceptions else None
-        for exception in current_exceptions:
-            self.delete_acl_subscribe_topic_exception(profile_name, exception)
+        current = self.get_acl_subscribe_topic_exceptions(profile_name)
+        return self.reconcile("subscribeTopicExceptions", profile_name, current, topic_exceptions,
+                              lambda item: self.create_acl_subscribe_topic_exception(profile_name, item),
+                              lambda item: self.delete_acl_subscribe_topic_exception(profile_name, item))
 
     def get_acl_subscribe_topic_exceptions(self, profile_name):
         url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/subscribeTopicExceptions"
-        resp = self.api("GET", url)
-        return get_path_expr(resp.message, "$..subscribeTopicException") if resp.status_code == 200 else []
+        return [item["subscribeTopicException"] for item in self.get_collection(url, select="subscribeTopicException")]
 
     def create_acl_subscribe_topic_exception(self, profile_name, exception):
         url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/subscribeTopicExceptions"
@@ -155,22 +306,23 @@ class Broker:
         logging.debug(f"POST { url } payload { payload }")
         resp = self.api("POST", url, json=payload)
         self.check_response(resp, "subscribeTopicExceptions", exception)
+        return resp
 
     def delete_acl_subscribe_topic_exception(self, profile_name, exception):
         delete_url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles/{profile_name}/subscribeTopicExceptions/smf,{quote(exception,'')}"
         resp = self.api("DELETE", delete_url)
         self.check_response(resp, "subscribeTopicException", profile_name)
+        return resp
 
     def delete_acl_profile(self, acl_profile, app_name):
         url = f"msgVpns/{ self.msg_vpn_name }/aclProfiles"
-        profile = acl_profile["aclProfile"]
-        acl_profile_name = profile["aclProfileName"]
+        acl_profile_name = acl_profile.name
         logging.info(f"Delete ACL Profile {acl_profile_name} for {app_name}")
-        delete_url = f"{url}/{acl_profile_name}"
-        resp = self.api("DELETE", delete_url)
-        self.check_response(resp, "aclProfile", acl_profile)
+        self.remove("aclProfile", url, acl_profile_name)
 
     def client_username_exists(self, user_name):
+        if self.state:
+            return self.state.exists("clientUsernames", user_name)
         url = f"msgVpns/{ self.msg_vpn_name }/clientUsernames/{user_name}"
         response = self.api("GET", url)
         return response.status_code == 200
@@ -178,38 +330,29 @@ class Broker:
     def create_client_username(self, client_username, acl_profile, app_name, user):
         logging.info(f"Create Client Username {user.get("name")} for Application {app_name}")
         url = f"msgVpns/{ self.msg_vpn_name }/clientUsernames"
-        client_username["msgVpnName"] = self.msg_vpn_name
-        client_username["aclProfileName"] = acl_profile["aclProfileName"]
         user_name = user.get("name")
-        client_username["clientUsername"] =  user_name
         client_profile_name = user.get("clientProfileName", "default")
-        client_username["clientProfileName"] = client_profile_name
+        payload = client_username.payload(msgVpnName=self.msg_vpn_name, aclProfileName=acl_profile.name, clientUsername=user_name,
+                                          clientProfileName=client_profile_name)
         if not self.client_profile_exists(client_profile_name):
             logging.error(f"Client Profile Name {client_profile_name} does NOT exist on broker {self.name}")
         if user.get("type") == "solaceClientUsername":
-            client_username["password"] = user.get("password")
+            payload["password"] = user.get("password")
         logging.info(f"Create clientUsername {user_name} on messageVPN {self.msg_vpn_name}")
-        if self.client_username_exists(user_name):
-            logging.debug(f"PATCH { url } payload { client_username }")
-            resp = self.api("PATCH", f"{url}/{user_name}", json=client_username)
-            self.check_response(resp, "clientUsername", user_name)
-        else:
-            logging.debug(f"POST { url } payload { client_username }")
-            resp = self.api("POST", url, json=client_username)
-            self.check_response(resp, "clientUsername", user_name)
+        self.upsert("clientUsername", url, user_name, payload)
 
     def delete_client_username(self, client_username, app_name, user=None):
         url = f"msgVpns/{ self.msg_vpn_name }/clientUsernames"
         if user is None:
-            client_name = client_username["clientUserName"]
+            client_name = client_username.name
         else:
             client_name = user.get("name")
-        delete_url = f"{url}/{client_name}"
         logging.info(f"Delete client name { client_name } for Application {app_name}")
-        resp = self.api("DELETE", delete_url)
-        self.check_response(resp, "clientUsername", client_username)
+        self.remove("clientUsername", url, client_name)
 
     def authorization_group_exists(self, group_name):
+        if self.state:
+            return self.state.exists("authorizationGroups", group_name)
         url = f"msgVpns/{ self.msg_vpn_name }/authorizationGroups/{group_name}"
         response = self.api("GET", url)
         return response.status_code == 200
@@ -218,32 +361,23 @@ class Broker:
         logging.info(f"Create Authentication Group {group.get("name")} for Application {app_name}")
         url = f"msgVpns/{ self.msg_vpn_name }/authorizationGroups"
         group_name = group.get("name")
-        authorization_group["msgVpnName"] = self.msg_vpn_name
-        authorization_group["aclProfileName"] = acl_profile["aclProfileName"]
-        authorization_group["authorizationGroupName"] = group_name
         client_profile_name = group.get("clientProfileName", "default")
-        authorization_group["clientProfileName"] = client_profile_name
+        payload = authorization_group.payload(msgVpnName=self.msg_vpn_name, aclProfileName=acl_profile.name, authorizationGroupName=group_name,
+                                              clientProfileName=client_profile_name)
         if not self.client_profile_exists(client_profile_name):
             logging.error(f"Client Profile Name {client_profile_name} does NOT exist on broker {self.name}")
         logging.info(f"Create authorizationGroup {group_name} on messageVPN {self.msg_vpn_name}")
-        if self.authorization_group_exists(group_name):
-            logging.debug(f"PATCH { url } payload { authorization_group }")
-            resp = self.api("PATCH", f"{url}/{group_name}", json=authorization_group)
-            self.check_response(resp, "authorizationGroup", group_name)
-        else:
-            logging.debug(f"POST { url } payload { authorization_group }")
-            resp = self.api("POST", url, json=authorization_group)
-            self.check_response(resp, "authorizationGroup", group_name)
+        self.upsert("authorizationGroup", url, group_name, payload)
 
     def delete_authorization_group(self, authorization_group, group, app_name):
         url = f"msgVpns/{ self.msg_vpn_name }/authorizationGroups"
         authorization_group_name = group.get("name")
-        delete_url = f"{url}/{authorization_group_name}"
         logging.info(f"Delete Authorization Group {authorization_group_name} for Application {app_name}")
-        resp = self.api("DELETE", delete_url)
-        self.check_response(resp, "authorizationGroup", authorization_group_name)
+        self.remove("authorizationGroup", url, authorization_group_name)
 
     def queue_exists(self, queue_name):
+        if self.state:
+            return self.state.exists("queues", queue_name)
         url = f"msgVpns/{ self.msg_vpn_name }/queues/{queue_name}"
         response = self.api("GET", url)
         return response.status_code == 200
@@ -255,21 +389,13 @@ class Broker:
 
     def create_queue(self, queue, owner):
         url = f"msgVpns/{ self.msg_vpn_name }/queues"
-        configuration = queue["queueConfiguration"]
-        configuration["msgVpnName"] = self.msg_vpn_name
-        queue_name = configuration["queueName"]
+        queue_name = queue.name
+        payload = queue.payload(msgVpnName=self.msg_vpn_name)
         if owner and owner.get("name"):
-            configuration["owner"] = owner["name"]
+            payload["owner"] = owner["name"]
         logging.info(f"Create queue '{queue_name}' on messageVPN '{self.msg_vpn_name}'")
-        if self.queue_exists(queue_name):
-            logging.debug(f"Patch {url}/{queue_name} payload { configuration }")
-            resp = self.api("PATCH", f"{url}/{queue_name}", json=configuration)
-            self.check_response(resp, "queue", queue_name)
-        else:
-            logging.debug(f"POST { url } payload { configuration }")
-            resp = self.api("POST", url, json=configuration)
-            self.check_response(resp, "queue", queue_name)
-        self.process_queue_subscription_topics(queue_name, queue["subscriptions"])
+        self.upsert("queue", url, queue_name, payload)
+        self.process_queue_subscription_topics(queue_name, queue.subscriptions)
 
     def delete_queues(self, solace_queues):
         logging.info(f"Delete Queues")
@@ -278,28 +404,19 @@ class Broker:
 
     def delete_queue(self, queue):
         url = f"msgVpns/{ self.msg_vpn_name }/queues"
-        configuration = queue["queueConfiguration"]
-        queue_name = configuration["queueName"]
+        queue_name = queue.name
         logging.info(f"Delete Queue {queue_name}")
-        delete_url = f"{url}/{queue_name}"
-        resp = self.api("DELETE", delete_url)
-        self.check_response(resp, "queue", queue_name)
+        self.remove("queue", url, queue_name)
 
     def process_queue_subscription_topics(self, queue_name, subscriptions):
-        current_subscriptions = self.get_queue_subscription_topics(queue_name)
-        for subscription in subscriptions:
-            if subscription not in current_subscriptions:
-                self.create_queue_subscription_topic(queue_name, subscription)
-            else:
-                logging.info(f"Subscription {subscription} already exists...")
-                current_subscriptions.remove(subscription) if current_subscriptions else None
-        for subscription in current_subscriptions:
-            self.delete_queue_subscription_topic(queue_name, subscription)
+        current = self.get_queue_subscription_topics(queue_name)
+        return self.reconcile("subscriptions", queue_name, current, subscriptions,
+                              lambda item: self.create_queue_subscription_topic(queue_name, item),
+                              lambda item: self.delete_queue_subscription_topic(queue_name, item))
 
     def get_queue_subscription_topics(self, queue_name):
         url = f"msgVpns/{ self.msg_vpn_name }/queues/{queue_name}/subscriptions"
-        resp = self.api("GET", url)
-        return get_path_expr(resp.message, "$..subscriptionTopic") if resp.status_code == 200 else None
+        return [item["subscriptionTopic"] for item in self.get_collection(url, select="subscriptionTopic")]
 
     def create_queue_subscription_topic(self, queue_name, topic):
         url = f"msgVpns/{ self.msg_vpn_name }/queues/{queue_name}/subscriptions"
@@ -312,13 +429,17 @@ class Broker:
         logging.debug(f"POST { url } payload { payload }")
         resp = self.api("POST", url, json=payload)
         self.check_response(resp, "subscriptionTopic", topic)
+        return resp
 
     def delete_queue_subscription_topic(self, queue_name, topic):
         delete_url = f"msgVpns/{ self.msg_vpn_name }/queues/{queue_name}/subscriptions/{quote(topic, '')}"
         resp = self.api("DELETE", delete_url)
         self.check_response(resp, "subscription", topic)
+        return resp
 
     def rdp_exists(self, rdp_name):
+        if self.state:
+            return self.state.exists("restDeliveryPoints", rdp_name)
         url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }"
         response = self.api("GET", url)
         return response.status_code == 200
@@ -330,19 +451,10 @@ class Broker:
 
     def create_rdp(self, rdp):
         url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints"
-        configuration = rdp["restDeliveryPointConfiguration"]
-        configuration["msgVpnName"] = self.msg_vpn_name
-        rdp_name = configuration["restDeliveryPointName"]
+        rdp_name = rdp.name
         logging.info(f"Create rdp '{ rdp_name }' on messageVPN '{ self.msg_vpn_name }'")
-        if self.rdp_exists(rdp_name):
-            logging.debug(f"Patch { url }/{ rdp_name } payload { configuration }")
-            resp = self.api("PATCH", f"{ url }/{ rdp_name }", json=configuration)
-            self.check_response(resp, "rdp", rdp_name)
-        else:
-            logging.debug(f"POST { url } payload { configuration }")
-            resp = self.api("POST", url, json=configuration)
-            self.check_response(resp, "rdp", rdp_name)
-        self.process_rdp_consumers(rdp_name, rdp["restConsumers"])
+        self.upsert("rdp", url, rdp_name, rdp.payload(msgVpnName=self.msg_vpn_name))
+        self.process_rdp_consumers(rdp_name, rdp.consumers)
 
     def delete_rdps(self, solace_rdps):
         logging.info(f"Delete restDeliveryPoints")
@@ -351,21 +463,16 @@ class Broker:
 
     def delete_rdp(self, rdp):
         url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints"
-        configuration = rdp["restDeliveryPointConfiguration"]
-        rdp_name = configuration["restDeliveryPointName"]
+        rdp_name = rdp.name
         logging.info(f"Delete restDeliveryPoint { rdp_name }")
-        resp = self.api("DELETE", f"{url}/{rdp_name}")
-        self.check_response(resp, "rdp", rdp_name)
+        self.remove("rdp", url, rdp_name)
 
     def process_rdp_consumers(self, rdp_name, rdp_consumers):
-        for rest_consumer in rdp_consumers:
-            rest_consumer_name = rest_consumer["restConsumerConfiguration"]["restConsumerName"]
-            self.create_rdp_consumer(rdp_name, rest_consumer)
+        self.run_concurrently(lambda rest_consumer: self.create_rdp_consumer(rdp_name, rest_consumer), rdp_consumers)
 
     def get_rdp_consumers(self, rdp_name):
         url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{rdp_name}/restConsumers"
-        resp = self.api("GET", url)
-        return get_path_expr(resp.message, "$..restConsumerName") if resp.status_code == 200 else None
+        return [item["restConsumerName"] for item in self.get_collection(url, select="restConsumerName")]
 
     def rdp_consumer_exists(self, rdp_name, rdp_consumer_name):
         url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/restConsumers/{ rdp_consumer_name }"
@@ -374,16 +481,7 @@ class Broker:
 
     def create_rdp_consumer(self, rdp_name, rdp_consumer):
         url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/restConsumers"
-        configuration = rdp_consumer["restConsumerConfiguration"]
-        rdp_consumer_name = configuration["restConsumerName"]
-        if self.rdp_consumer_exists(rdp_name, rdp_consumer_name):
-            logging.debug(f"Patch { url }/{ rdp_consumer_name } payload { configuration }")
-            resp = self.api("PATCH", f"{ url }/{ rdp_consumer_name }", json=configuration)
-            self.check_response(resp, "rdp_consumer", rdp_consumer_name)
-        else:
-            logging.debug(f"POST { url } payload { configuration }")
-            resp = self.api("POST", url, json=configuration)
-            self.check_response(resp, "rdp_consumer", rdp_consumer_name)
+        self.upsert("rdp_consumer", url, rdp_consumer.name, rdp_consumer.payload())
 
     def rdp_queue_binding_exists(self, rdp_name, queue_binding_name):
         url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/queueBindings/{ queue_binding_name }"
@@ -396,22 +494,14 @@ class Broker:
             self.create_rdp_queue_binding(queue_binding)
 
     def create_rdp_queue_binding(self, queue_binding):
-        configuration = queue_binding["queueBindingConfiguration"]
-        rdp_name = configuration["restDeliveryPointName"]
-        queue_binding_name = configuration["queueBindingName"]
+        rdp_name = queue_binding.rdp_name
+        queue_binding_name = queue_binding.name
         url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/queueBindings"
-        if self.rdp_queue_binding_exists(rdp_name, queue_binding_name):
-            logging.debug(f"Patch { url }/{ queue_binding_name } payload { configuration }")
-            resp = self.api("PATCH", f"{ url }/{ queue_binding_name }", json=configuration)
-            self.check_response(resp, "queue_binding", queue_binding_name)
-        else:
-            logging.debug(f"POST { url } payload { configuration }")
-            resp = self.api("POST", url, json=configuration)
-            self.check_response(resp, "rdp_consumer", queue_binding_name)
-        protected_request_headers = queue_binding["protectedRequestHeaders"]
+        self.upsert("queue_binding", url, queue_binding_name, queue_binding.payload())
+        protected_request_headers = queue_binding.protected_request_headers
         if protected_request_headers:
             self.create_queue_binding_request_headers(rdp_name, queue_binding_name, True, protected_request_headers )
-        request_headers = queue_binding["requestHeaders"]
+        request_headers = queue_binding.request_headers
         if request_headers:
             self.create_queue_binding_request_headers(rdp_name, queue_binding_name, False, request_headers )
 
@@ -428,7 +518,7 @@ class Broker:
         if protected:
             logging.error("")
         else:
-            resp = self.api("POST", url, json=request_header)
+            resp = self.api("POST", url, json=dict(request_header))
             self.check_response(resp, "requestHeader", request)
 
     def delete_rdp_queue_bindings(self, solace_rdp_queue_bindings):
@@ -437,9 +527,8 @@ class Broker:
             self.delete_rdp_queue_binding(rdp_queue_binding)
 
     def delete_rdp_queue_binding(self, queue_binding):
-        configuration = queue_binding["queueBindingConfiguration"]
-        rdp_name = configuration["restDeliveryPointName"]
-        queue_binding_name = configuration["queueBindingName"]
+        rdp_name = queue_binding.rdp_name
+        queue_binding_name = queue_binding.name
         url = f"msgVpns/{ self.msg_vpn_name }/restDeliveryPoints/{ rdp_name }/queueBindings/{ queue_binding_name }"
         logging.info(f"Delete restDeliveryPoint { rdp_name } QueueBinding { queue_binding_name }")
         resp = self.api("DELETE", f"{url}")
@@ -449,8 +538,15 @@ class Broker:
         try:
             if method is None or endpoint is None:
                 raise Exception('You must pass a method and endpoint')
+            if method != "GET" and self.plan is not None:
+                self.plan.add(method, endpoint, kwargs.get("json"))
+            if method != "GET" and self.dry_run:
+                return BrokerResponse(200, {"meta": {"request": {"method": method}}})
             url = f"{ self.url }/{endpoint}"
-            response = request(method, url, verify=False, auth=self.auth, headers=self.headers, **kwargs)
+            with self.in_flight:
+                start = time.perf_counter()
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            observe("semp", method, endpoint, response, time.perf_counter() - start)
             response.raise_for_status()
             return BrokerResponse(response.status_code, response.json())
         except exceptions.HTTPError as exc:
@@ -474,13 +570,20 @@ class Broker:
             "PATCH": "Modification",
             "DELETE": "Deletion"
         }
+        if self.dry_run:
+            return
         method = response.message.get("meta").get("request").get("method")
         operation = method_mapping.get(method, "Unknown")
         if response.status_code in [200, 201]:
             logging.info(f"{operation} of {object_type} {name} succeeded")
-        else:
-            error = response.message.get("meta",{}).get("error")
-            logging.error(f"{operation} of {object_type} {name} failed! Error: {error}")
+            return
+        error = response.message.get("meta",{}).get("error")
+        if write_succeeded(response):
+            logging.info(f"{operation} of {object_type} {name} not needed: {error.get('status') if error else None}")
+            return
+        # a failed write fails the application on this broker, so it is not fingerprinted or checkpointed as done
+        logging.error(f"{operation} of {object_type} {name} failed! Error: {error}")
+        raise BrokerException(24, "BROKER::WriteFailed", f"{operation} of {object_type} {name} failed: {error}")
 
     #    Common SEMP v2 Error Codes
     #    Code	Status	                                Description
@@ -498,6 +601,8 @@ class Broker:
         error = message.get('meta',{}).get('error',None)
         error_code = error.get("code")
         match error_code:
+            case 549:
+                logging.warning(f"BROKER::HTTP { method } Request to endpoint { endpoint } returned a response too large for the broker, requesting smaller pages")
             case 6 | 10:
                 logging.debug(f"BROKER::HTTP { method } Request to endpoint { endpoint } failed with status_code { code }: SEMP error: { error }")
             case _:
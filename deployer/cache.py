@@ -0,0 +1,76 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# Memoizes the responses of read-only API calls for the lifetime of a client.
+# With a directory the responses are also written to disk, so later runs (CI jobs) reuse them until ttl seconds have passed.
+class ResponseCache:
+    def __init__(self, directory=None, ttl=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(endpoint, params=None):
+        return json.dumps([endpoint, params or {}], sort_keys=True, default=str)
+
+    def key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                return self.entries[key]
+        value = self.read(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries[key] = value
+        return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+        self.write(key, value)
+
+    def file_path(self, key):
+        return os.path.join(self.directory, f"{ hashlib.sha256(key.encode()).hexdigest() }.json")
+
+    def read(self, key):
+        if not self.directory:
+            return None
+        file_path = self.file_path(key)
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl:
+            return None
+        return entry.get("value")
+
+    def write(self, key, value):
+        if not self.directory:
+            return
+        file_path = self.file_path(key)
+        try:
+            # write and rename, so a concurrent job never reads a partial file
+            temp_path = f"{ file_path }.{ os.getpid() }.{ threading.get_ident() }.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"created": time.time(), "key": key, "value": value}, file)
+            os.replace(temp_path, file_path)
+        except OSError as ex:
+            logging.warning(f"Could not write cache file { file_path }: { ex }")
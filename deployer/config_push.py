@@ -1,9 +1,12 @@
 import logging
 
-from deployer.errors import EventPortalException
+from functools import partial
 from deployer.event_portal import EventPortal
-from deployer.utils import preview_exists, get_preview, store_preview
+from deployer.utils import store_preview
 from deployer.enums import Action
+from deployer.preview import requested_objects
+from deployer.scheduler import Job, JobResult, run_jobs, map_parallel, shared_object_keys, log_summary
+from deployer.deployments import Deployment, DeploymentPoller, log_deployments, DEFAULT_DEPLOYMENT_TIMEOUT
 
 def config_push(parameters):
     logging.debug(f"Running config_push with parameters { parameters }")
@@ -14,31 +17,59 @@ def config_push(parameters):
     target = parameters["target"]
     environment_name = target.get("environment")
     preview = parameters["preview"]
-    if target.get("broker_ids") is None:
+    broker_ids = parameters["mesh"].broker_ids
+    if broker_ids is None:
         logging.error(f"No brokers found for target-environment {target.get("environmentName")}")
         return None
     apps = [item.strip() for item in target.get("appl").split(",")] if target.get("appl") else None
-    config = parameters.get("target")
     logging.debug(f"Action={action}, apps = {apps}, config={target}")
+    parallel = parameters.get("parallel") or 1
     # Gets the application to perform the action on, defaults to all applications of all domains in the json config file
+    applications = []
     for domain in target.get("domains"):
         domain_name = domain.get("domainName")
-        applications = domain.get("applications")
-        for application in [app for app in applications if app["versionId"]]:
-            application_name = application["name"]
-            version_name = application["version"]
-            state = application["state"]
+        for application in domain.get("applications"):
             if application.get("versionId"):
-                version_id = application["versionId"]
-                for broker_id in target["broker_ids"]:
-                    logging.info(f"{ action.capitalize() } for application { application_name } with version { version_name } and id { version_id } on broker {broker_id} for application domain { domain_name }")
-                    try:
-                        preview_broker_id = preview.get('broker_id') if action == Action.UNDEPLOY.value else broker_id
-                        preview = ep.preview_application_deployment(version_id, Action.DEPLOY.value, preview_broker_id)
-                        if action in [Action.SAVE.value]:
-                            store_preview(preview, environment_name, domain_name, application_name, version_name, state)
-                        ep.create_application_deployment(version_id, action, broker_id )
-                    except EventPortalException as ex:
-                        logging.error(f"config_push::Exception::{ex}")
+                applications.append((domain_name, application))
             else:
-                logging.info(f"Application { application_name } with version { application["version"] } in domain {domain.get("domainName")} is not eligible for action { action }")
+                logging.info(f"Application { application["name"] } with version { application["version"] } in domain { domain_name } is not eligible for action { action }")
+    preview_requests = [(domain_name, application, broker_id) for domain_name, application in applications for broker_id in broker_ids]
+    preview_broker_id = preview.get('broker_id')
+    # The previews are read-only Event Portal calls, they are fetched upfront so the shared broker objects are known when scheduling
+    previews = map_parallel(
+        lambda item: ep.preview_application_deployment(item[1]["versionId"], Action.DEPLOY.value, preview_broker_id if action == Action.UNDEPLOY.value else item[2]),
+        preview_requests,
+        parallel
+    )
+    # the deployments are confirmed by one poller while the next ones are still being submitted
+    poller = DeploymentPoller(ep, parallel, timeout=parameters.get("deployment_timeout") or DEFAULT_DEPLOYMENT_TIMEOUT)
+    jobs = []
+    for (domain_name, application, broker_id), (application_preview, error) in zip(preview_requests, previews):
+        name = f"{domain_name}/{application['name']}@{broker_id}"
+        task = partial(config_push_application, ep, poller, name, action, environment_name, domain_name, application, broker_id, application_preview, error)
+        keys = {(broker_id, key) for key in shared_object_keys(requested_objects(application_preview), application.get("user"))}
+        jobs.append(Job(name, task, keys))
+    results = run_jobs(jobs, parallel)
+    deployments = poller.wait()
+    if deployments:
+        log_deployments(f"Deployments on environment {environment_name}", deployments)
+    failed = {deployment.name: deployment for deployment in deployments if deployment.status in [Deployment.FAILED, Deployment.TIMED_OUT]}
+    for result in results:
+        if result.name in failed:
+            result.status = JobResult.FAILED
+            result.error = result.error or Exception(f"Deployment {failed[result.name].deployment_id} {failed[result.name].status}")
+    log_summary(f"{action.capitalize()} on environment {environment_name}", results)
+    return results
+
+def config_push_application(ep, poller, name, action, environment_name, domain_name, application, broker_id, preview, error):
+    application_name = application["name"]
+    version_name = application["version"]
+    version_id = application["versionId"]
+    state = application["state"]
+    logging.info(f"{ action.capitalize() } for application { application_name } with version { version_name } and id { version_id } on broker {broker_id} for application domain { domain_name }")
+    if error:
+        raise error
+    if action in [Action.SAVE.value]:
+        store_preview(preview, environment_name, domain_name, application_name, version_name, state)
+    response = ep.create_application_deployment(version_id, action, broker_id )
+    poller.add(name, broker_id, response)
@@ -1,10 +1,14 @@
-from deployer.utils import parse_arguments, setup_logging, show_help, logging, ConfigLoader
-from deployer.config_push import config_push
-from deployer.semp import semp
-from deployer.event_portal import EventPortal
-from deployer.enums import Environment, Action, Mode, State
+from deployer.utils import parse_arguments, setup_logging, show_help, logging, ConfigLoader, find_preview, get_preview
+from deployer.enums import Environment, Action, Mode, State, Policy
+from deployer.scheduler import map_parallel, JobResult
+from deployer.metrics import Profile, add_hook, remove_hook, phase
+from deployer.rate_limit import log_rate_limiters
+from functools import cached_property
 import os
 
+# The modes and the Event Portal client (requests, urllib3, jsonpath_ng) are imported when first used,
+# so the arguments are validated without loading them
+
 def run(arguments):
     setup_logging(arguments.log)
     if arguments.mode is None or arguments.mode not in [Mode.CONFIG_PUSH.value, Mode.SEMP.value]:
@@ -13,7 +17,23 @@ def run(arguments):
     if arguments.target is None:
         show_help()
         exit (1)
-    if arguments.mode == Mode.CONFIG_PUSH.value and arguments.target == Environment.DEV.value:
+    if arguments.policy not in [Policy.FAIL_FAST.value, Policy.BEST_EFFORT.value]:
+        show_help()
+        exit (1)
+    if arguments.mode == Mode.CONFIG_PUSH.value and arguments.action == Action.PLAN.value:
+        logging.info("The plan action can only be used in mode semp!")
+        exit(1)
+    if arguments.profile_format not in ["json", "openmetrics"]:
+        show_help()
+        exit (1)
+    if arguments.from_store and (arguments.mode != Mode.SEMP.value or arguments.action == Action.SAVE.value):
+        logging.info("Deploying from the store can only be used in mode semp with the actions deploy, undeploy and plan!")
+        exit(1)
+    if arguments.resume and (arguments.mode != Mode.SEMP.value or arguments.action not in [Action.DEPLOY.value, Action.UNDEPLOY.value]):
+        logging.info("Resuming can only be used in mode semp with the actions deploy and undeploy!")
+        exit(1)
+    targets = [target.strip() for target in arguments.target.split(",") if target.strip()]
+    if arguments.mode == Mode.CONFIG_PUSH.value and Environment.DEV.value in targets:
         logging.info("This mode can not be used on the Dev environment. Use config push via the Event Portal!")
         exit(1)
     logging.info(
@@ -22,54 +42,133 @@ def run(arguments):
         f"  https_proxy={ os.environ.get('https_proxy') }\n"
         f"  no_proxy={ os.environ.get('no_proxy') }"
     )
+    profile = Profile() if arguments.profile else None
+    if profile:
+        add_hook(profile)
     try:
-        parameters = get_parameters(arguments)
-        logging.info(f"Running deployer in mode {arguments.mode} with action {parameters["action"]} on environment {parameters.get("target").get("environmentName")}")
-        logging.debug(f"Parameters := { parameters }")
-        if arguments.mode == Mode.CONFIG_PUSH.value:
-            config_push(parameters)
+        if len(targets) > 1:
+            run_fleet(arguments, targets)
         else:
-            semp(parameters)
+            run_target(arguments, targets[0])
     except Exception as ex:
         logging.error(f"run:Exception occurred! {ex}")
+    finally:
+        log_rate_limiters()
+        if profile:
+            remove_hook(profile)
+            profile.log()
+            profile.write(arguments.profile, arguments.profile_format)
+
+def run_target(arguments, target, ep=None):
+    with phase("get_parameters"):
+        parameters = get_store_parameters(arguments, target) if arguments.from_store else get_parameters(arguments, target, ep)
+    logging.info(f"Running deployer in mode {arguments.mode} with action {parameters["action"]} on environment {parameters.get("target").get("environmentName")}")
+    logging.debug(f"Parameters := { parameters }")
+    if arguments.mode == Mode.CONFIG_PUSH.value:
+        from deployer.config_push import config_push
+        return config_push(parameters) or []
+    from deployer.semp import semp
+    return semp(parameters)
+
+# Fleet mode: several targets in one process. The Event Portal client and its cached lookups are shared by all targets,
+# the targets run concurrently and a failing target does not stop the others.
+def run_fleet(arguments, targets):
+    logging.info(f"Running deployer in mode {arguments.mode} on environments {targets}")
+    config_loader = ConfigLoader()
+    ep = None if arguments.from_store else create_event_portal(config_loader.load_config("eventPortal"))
+    try:
+        if ep and arguments.mode == Mode.SEMP.value:
+            # the previews of all targets are taken from dev, which is resolved once before the targets start
+            MeshIds(ep, config_loader.load_config(Environment.DEV.value)).broker_ids
+        outcomes = map_parallel(lambda target: run_target(arguments, target, ep), targets, len(targets))
+    finally:
+        if ep:
+            ep.close()
+    log_fleet_report(targets, outcomes)
+    return outcomes
+
+def log_fleet_report(targets, outcomes):
+    logging.info(f"Fleet report for {len(targets)} environments:")
+    for target, (results, error) in zip(targets, outcomes):
+        if error:
+            logging.error(f"  {target:<10} failed: {error}")
+            continue
+        succeeded = len([result for result in results if result.status == JobResult.SUCCEEDED])
+        logging.info(f"  {target:<10} {succeeded} of {len(results)} applications succeeded")
+
+def create_event_portal(ep_config):
+    from deployer.event_portal import EventPortal, DEFAULT_PAGE_SIZE
+    from deployer.session import session_options
+    return EventPortal(ep_config.get("baseUrl"), ep_config.get("token"), cache_dir=ep_config.get("cacheDir"), cache_ttl=ep_config.get("cacheTtl"),
+                       page_size=ep_config.get("pageSize", DEFAULT_PAGE_SIZE), **session_options(ep_config))
+
+# The ids of the environment, modeled event mesh and messaging services of a config are requested when first used,
+# so every mode and action makes only the discovery calls it needs
+class MeshIds:
+    def __init__(self, ep, config):
+        self.ep = ep
+        self.config = config
+
+    @cached_property
+    def environment_id(self):
+        return self.ep.get_environment_id(self.config["environmentName"])
+
+    @cached_property
+    def mesh_id(self):
+        mesh_id = self.ep.get_modeled_event_mesh_id(self.environment_id, self.config["meshName"])
+        logging.debug(f"Mesh { self.config["meshName"] } of environment { self.config["environmentName"] } with meshId: { mesh_id }")
+        return mesh_id
+
+    @cached_property
+    def broker_ids(self):
+        broker_ids = self.ep.get_messaging_services_ids(self.mesh_id) if self.mesh_id else None
+        logging.debug(f"brokerIds: { broker_ids }")
+        return broker_ids
+
+    def __repr__(self):
+        return f"MeshIds({ self.config["environmentName"] }/{ self.config["meshName"] })"
 
 # In mode 'configPush' src and target conf are the same.
 # In mode 'semp' use src config to get the deployment preview and use the target config to execute the deployment preview via semp
-def get_parameters(arguments):
+def get_parameters(arguments, target=None, ep=None):
     mode = arguments.mode
     action = arguments.action if arguments.action else Action.DEPLOY.value
     apps = arguments.appl
     config_loader = ConfigLoader()
 
     preview_config = config_loader.load_config(Environment.DEV.value)
-    target_config = config_loader.load_config(arguments.target)
-    ep_config = config_loader.load_config("eventPortal")
-    base_url = ep_config.get("baseUrl")
-    token = ep_config.get("token")
-    ep = EventPortal(base_url, token)
-
-    preview_env_id = ep.get_environment_id(preview_config["environmentName"])
-    preview_mesh_id = ep.get_modeled_event_mesh_id(preview_env_id, preview_config["meshName"])
-#    preview_broker_id = ep.get_messaging_services_ids(preview_mesh_id)[0]
-    preview_config["mesh_id"] = preview_mesh_id
-#    preview_config["broker_id"] = preview_broker_id
-
-    target_env_id = ep.get_environment_id(target_config["environmentName"])
-    target_mem_id = ep.get_modeled_event_mesh_id(target_env_id, target_config["meshName"])
-    target_broker_ids = ep.get_messaging_services_ids(target_mem_id) if target_mem_id else None
-    target_config["mesh_id"] = target_mem_id
-    target_config["broker_ids"] = target_broker_ids
-
-    environment_name = target_config["environmentName"] if mode == Mode.CONFIG_PUSH.value else preview_config["environmentName"]
-    environment_id = ep.get_environment_id(environment_name)
-    logging.debug(f"Environment { environment_name }  with environmentId: { environment_id }")
-
-    mem_name = target_config["meshName"] if mode == Mode.CONFIG_PUSH.value else preview_config["meshName"]
-    mesh_id = ep.get_modeled_event_mesh_id(environment_id, mem_name)
-    logging.debug(f"Mesh { mem_name } with meshId: { mesh_id }")
-
-    broker_ids = ep.get_messaging_services_ids(mesh_id)
-    logging.debug(f"brokerIds: { broker_ids }")
+    target_config = config_loader.load_config(target or arguments.target)
+    ep = ep or create_event_portal(config_loader.load_config("eventPortal"))
+    base_url = ep.base_url
+
+    # configPush deploys the previews of the target brokers, semp takes the previews from dev
+    mesh = MeshIds(ep, target_config if mode == Mode.CONFIG_PUSH.value else preview_config)
+    filter_applications(target_config, apps)
+
+    with phase("get_parameters.versions"):
+        for target_domain in target_config["domains"]:
+            domain_id = ep.get_application_domain_id(target_domain["domainName"])
+            target_domain["domainId"] = domain_id
+            logging.debug(f"applicationDomain: { domain_id }")
+            add_eligible_version_ids(ep, target_domain, target_config["environment"], action, mode)
+    return {
+        "base_url": base_url,
+        "eventPortal": ep,
+        "action": action,
+        "preview": preview_config,
+        "target": target_config,
+        "mesh": mesh,
+        "parallel": arguments.parallel,
+        "prefetch": arguments.prefetch,
+        "policy": arguments.policy,
+        "broker_parallel": arguments.broker_parallel,
+        "deployment_timeout": arguments.deployment_timeout,
+        "force": arguments.force,
+        "resume": arguments.resume
+    }
+
+# The applications of the domain and the versions of its applications are fetched once and looked up by name
+def filter_applications(target_config, apps):
     if apps:
         filter_map = {}
         for item in apps:
@@ -86,43 +185,70 @@ def get_parameters(arguments):
                     domains_to_keep.append(domain)
         target_config["domains"] = domains_to_keep
 
-    for target_domain in target_config["domains"]:
-        domain_id = ep.get_application_domain_id(target_domain["domainName"])
-        target_domain["domainId"] = domain_id
-        logging.debug(f"applicationDomain: { domain_id }")
-        add_eligible_version_ids(ep, domain_id, target_config["environment"], action, mode, target_config)
+# Deploy the previews stored by the save action, without any Event Portal calls.
+# The state of a version is taken from the store, all previews must exist before anything is deployed.
+def get_store_parameters(arguments, target=None):
+    mode = arguments.mode
+    action = arguments.action if arguments.action else Action.DEPLOY.value
+    target_config = ConfigLoader().load_config(target or arguments.target)
+    filter_applications(target_config, arguments.appl)
+    environment = target_config["environment"]
+    missing = []
+    for domain in target_config["domains"]:
+        for application in domain.get("applications", []):
+            state = find_preview(environment, domain["domainName"], application["name"], application["version"])
+            if state is None or state.upper() not in State.__members__:
+                missing.append(f"{ domain["domainName"] }/{ application["name"] }/{ application["version"] }")
+                continue
+            version = {"version": application["version"], "stateId": str(State[state.upper()].value)}
+            if is_version_eligible(environment, application["name"], action, mode, version):
+                application["state"] = state
+                application["preview"] = get_preview(environment, domain["domainName"], application["name"], application["version"], state)
+            else:
+                logging.info(f"App { application["name"] } version { application["version"] } not eligible for env { environment }")
+    if missing:
+        raise Exception({"code": "NOT_EXIST", "message": f"No stored previews in ./store/{ environment } for { missing }"})
     return {
-        "base_url": base_url,
-        "eventPortal": ep,
+        "eventPortal": None,
+        "from_store": True,
         "action": action,
-        "preview": preview_config,
         "target": target_config,
-        "environment_id": environment_id,
-        "mesh_id": mesh_id,
-        "broker_ids": broker_ids
+        "mesh": None,
+        "parallel": arguments.parallel,
+        "prefetch": arguments.prefetch,
+        "policy": arguments.policy,
+        "broker_parallel": arguments.broker_parallel,
+        "force": arguments.force,
+        "resume": arguments.resume
     }
 
-def add_eligible_version_ids(ep, domain_id, env, action, mode, parameters):
+def add_eligible_version_ids(ep, domain, env, action, mode):
+    from deployer.event_portal import EventPortal
     if not isinstance(ep, EventPortal):
         raise TypeError("Expect an EventPortal instance")
 
-    for domain in parameters.get("domains"):
-        for application in domain.get("applications",[]):
-            app_name = application["name"]
-            version_name = application["version"]
-            logging.debug(f"Get eligible versions for application { app_name }")
-            application_id = ep.get_application_id_by_name(domain_id, app_name)
-            application["applicationId"] = application_id
-            application_version = ep.get_application_version_object_by_name(application_id, version_name)
-            logging.debug(f"applicationVersion= { application_version }")
-            if application_version is None:
-                raise Exception({"code": "NOT_EXIST", "message": f"App { app_name } version { version_name } does not exist in environment { env }"})
-            if is_version_eligible(env, app_name, action, mode, application_version):
-                application["versionId"]=application_version["id"]
-                state = State.from_value(application_version["stateId"])
-                application["state"] = state.label
-            else:
-                logging.info(f"App { app_name } version {application_version.get('version')} not eligible for env { env }")
+    domain_id = domain["domainId"]
+    applications = ep.get_application_objects_by_name(domain_id)
+    application_ids = list(dict.fromkeys(applications[app["name"]]["id"] for app in domain.get("applications", []) if app["name"] in applications))
+    versions = ep.get_application_version_objects_by_name(application_ids)
+    for application in domain.get("applications",[]):
+        app_name = application["name"]
+        version_name = application["version"]
+        logging.debug(f"Get eligible versions for application { app_name }")
+        if app_name not in applications:
+            raise Exception({"code": "NOT_EXIST", "message": f"App { app_name } does not exist in domain { domain["domainName"] }"})
+        application_id = applications[app_name]["id"]
+        application["applicationId"] = application_id
+        application_version = versions.get((application_id, version_name))
+        logging.debug(f"applicationVersion= { application_version }")
+        if application_version is None:
+            raise Exception({"code": "NOT_EXIST", "message": f"App { app_name } version { version_name } does not exist in environment { env }"})
+        if is_version_eligible(env, app_name, action, mode, application_version):
+            application["versionId"]=application_version["id"]
+            state = State.from_value(application_version["stateId"])
+            application["state"] = state.label
+        else:
+            logging.info(f"App { app_name } version {application_version.get('version')} not eligible for env { env }")
 
 def is_version_eligible(env, app_name, action, mode, version):
     logging.debug(f"Check if application { app_name } version { version.get("version") } with state { version.get("stateId") } is eligible for the given mode { mode } and action { action } in environment { env }")
@@ -131,10 +257,10 @@ def is_version_eligible(env, app_name, action, mode, version):
     # if env in [acc, prd] and version.state == 2 and action == 'deploy' => True
     # if env in [acc, prd] and version.state in [2, 3, 4] and action == 'undeploy' => True
     # else False
-    if ((env in [Environment.DEV.value, Environment.TST.value] and version.get('stateId') in ['1','2'] and action in [Action.DEPLOY.value, Action.SAVE.value]) or
+    if ((env in [Environment.DEV.value, Environment.TST.value] and version.get('stateId') in ['1','2'] and action in [Action.DEPLOY.value, Action.SAVE.value, Action.PLAN.value]) or
             (env in [Environment.DEV.value, Environment.TST.value] and action in [Action.UNDEPLOY.value, Action.SAVE.value])):
         return True
-    if ((env in [Environment.ACC.value, Environment.PRD.value] and version.get('stateId') == '2' and action in [Action.DEPLOY.value, Action.SAVE.value]) or
+    if ((env in [Environment.ACC.value, Environment.PRD.value] and version.get('stateId') == '2' and action in [Action.DEPLOY.value, Action.SAVE.value, Action.PLAN.value]) or
             (env in [Environment.ACC.value, Environment.PRD.value] and version.get('stateId') in ['2','3','4'] and action in [Action.UNDEPLOY.value, Action.SAVE.value])):
         return True
     return False
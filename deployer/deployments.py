@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+
+from deployer.scheduler import map_parallel
+
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 30.0
+DEFAULT_DEPLOYMENT_TIMEOUT = 600.0
+
+SUCCEEDED_STATUSES = ["success", "succeeded", "successful", "completed", "complete", "deployed"]
+FAILED_STATUSES = ["failed", "failure", "error", "rejected", "cancelled", "canceled"]
+
+class Deployment:
+    PENDING = "pending"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    TIMED_OUT = "timedOut"
+
+    def __init__(self, name, broker_id, deployment_id, status):
+        self.name = name
+        self.broker_id = broker_id
+        self.deployment_id = deployment_id
+        self.status = status
+        self.message = None
+        self.submitted = time.monotonic()
+        self.finished = None if status == Deployment.PENDING else self.submitted
+
+    @property
+    def duration(self):
+        return (self.finished or time.monotonic()) - self.submitted
+
+# Maps the status of an Event Portal deployment to one of the Deployment statuses
+def deployment_status(response):
+    data = response.get("data", response) if isinstance(response, dict) else {}
+    status = str(data.get("status") or data.get("state") or "").lower()
+    if status in SUCCEEDED_STATUSES:
+        return Deployment.SUCCEEDED
+    if status in FAILED_STATUSES:
+        return Deployment.FAILED
+    return Deployment.PENDING
+
+def deployment_message(response):
+    if not isinstance(response, dict):
+        return f"No deployment in the response: {response}"
+    return response.get("message") or response.get("description") or str(response)
+
+def deployment_id(response):
+    data = response.get("data", response) if isinstance(response, dict) else {}
+    return data.get("id")
+
+# Confirms the asynchronous Event Portal deployments of a config push. One thread polls all pending deployments per round,
+# one status request per deployment sent concurrently (the Event Portal has no status lookup of several ids), while new
+# deployments are still being added. The interval starts at min_interval, doubles after every round without a status change
+# up to max_interval and goes back to min_interval as soon as a deployment finishes or is added. Adding a deployment and
+# closing the poller interrupt its sleep.
+class DeploymentPoller:
+    def __init__(self, ep, parallel=1, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL, timeout=DEFAULT_DEPLOYMENT_TIMEOUT):
+        self.ep = ep
+        self.parallel = parallel
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.deployments = []
+        self.lock = threading.Lock()
+        self.closing = threading.Event()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add(self, name, broker_id, response):
+        identifier = deployment_id(response)
+        # a response without an id is the error of a rejected deployment request
+        status = deployment_status(response) if identifier else Deployment.FAILED
+        deployment = Deployment(name, broker_id, identifier, status)
+        if identifier is None:
+            deployment.message = deployment_message(response)
+        with self.lock:
+            self.deployments.append(deployment)
+            if self.thread is None and status == Deployment.PENDING:
+                self.thread = threading.Thread(target=self.poll, daemon=True, name="deployment-poller")
+                self.thread.start()
+        if status == Deployment.PENDING:
+            self.wake.set()
+        return deployment
+
+    def pending(self):
+        with self.lock:
+            return [deployment for deployment in self.deployments if deployment.status == Deployment.PENDING]
+
+    def poll(self):
+        interval = self.min_interval
+        next_round = time.monotonic()
+        while True:
+            if time.monotonic() >= next_round:
+                pending = self.pending()
+                if pending:
+                    changed = self.poll_round(pending)
+                    interval = self.min_interval if changed else min(self.max_interval, interval * 2)
+                next_round = time.monotonic() + interval
+            pending = self.pending()
+            if not pending and self.closing.is_set():
+                return
+            # the round after a timeout expired is not delayed by the interval
+            next_round = min([next_round] + [deployment.submitted + self.timeout for deployment in pending])
+            # an added deployment is polled within min_interval, once the last one is added the pending ones are polled right away
+            if self.wake.wait(max(0.0, next_round - time.monotonic())):
+                self.wake.clear()
+                interval = self.min_interval
+                next_round = time.monotonic() if self.closing.is_set() else min(next_round, time.monotonic() + self.min_interval)
+
+    def poll_round(self, pending):
+        changed = False
+        responses = map_parallel(lambda deployment: self.ep.get_application_deployment(deployment.deployment_id), pending, self.parallel)
+        now = time.monotonic()
+        for deployment, (response, error) in zip(pending, responses):
+            if error:
+                # a failed poll is retried in the next round, the timeout ends it
+                deployment.message = str(error)
+                status = Deployment.PENDING
+            else:
+                status = deployment_status(response)
+            if status == Deployment.PENDING and now - deployment.submitted >= self.timeout:
+                status = Deployment.TIMED_OUT
+            if status != Deployment.PENDING:
+                deployment.status = status
+                deployment.finished = now
+                changed = True
+        return changed
+
+    # Waits until all deployments finished or timed out and returns them
+    def wait(self):
+        self.closing.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join()
+        with self.lock:
+            return list(self.deployments)
+
+def log_deployments(title, deployments):
+    logging.info(f"{title}:")
+    logging.info(f"  {'deployment':<40} {'broker':<30} {'id':<40} {'status':<10} {'seconds':>8}")
+    for deployment in deployments:
+        message = f" ({deployment.message})" if deployment.message and deployment.status != Deployment.SUCCEEDED else ""
+        logging.info(f"  {deployment.name:<40} {deployment.broker_id:<30} {str(deployment.deployment_id):<40} {deployment.status:<10} {deployment.duration:8.1f}{message}")
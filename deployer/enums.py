@@ -10,6 +10,7 @@ class Action(Enum):
     DEPLOY = 'deploy'
     UNDEPLOY = 'undeploy'
     SAVE = 'save'
+    PLAN = 'plan'
 
 class State(IntEnum):
     DRAFT = 1
@@ -28,3 +29,7 @@ class State(IntEnum):
 class Mode(Enum):
     CONFIG_PUSH = 'configPush'
     SEMP = 'semp'
+
+class Policy(Enum):
+    FAIL_FAST = 'failFast'
+    BEST_EFFORT = 'bestEffort'
@@ -1,36 +1,59 @@
-from requests import request
 from requests import exceptions
 from deployer.errors import *
-from functools import reduce
+from deployer.session import create_session, get_timeout, DEFAULT_POOL_SIZE, DEFAULT_RETRIES, DEFAULT_BACKOFF_FACTOR
+from deployer.cache import ResponseCache
+from deployer.metrics import observe
+from deployer.rate_limit import get_rate_limiter
+from functools import reduce, lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 import os
 import logging
-from jsonpath_ng.ext import parse
+import threading
+import time
+
+DEFAULT_PAGE_SIZE = 100
+
+# Parsing a JSONPath expression is far more expensive than evaluating it, so every expression is parsed once
+@lru_cache(maxsize=256)
+def compile_path_expr(path_expr):
+    # jsonpath_ng is slow to import, it is loaded with the first expression
+    from jsonpath_ng.ext import parse
+    return parse(path_expr)
 
 def get_path_expr(data, path_expr):
-    jsonpath_expr = parse(path_expr)
+    jsonpath_expr = compile_path_expr(path_expr)
     return [match.value for match in jsonpath_expr.find(data)]
 
 class EventPortal:
 
-    def __init__(self, base_url, solace_cloud_token):
+    def __init__(self, base_url, solace_cloud_token, pool_size=DEFAULT_POOL_SIZE, timeout=None,
+                 retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, max_in_flight=None, cache_dir=None,
+                 cache_ttl=None, page_size=DEFAULT_PAGE_SIZE, rate_limit=None):
         if solace_cloud_token is None and os.environ.get('SOLACE_CLOUD_TOKEN') is None or base_url is None:
             raise EventPortalException(10,'You must define the base_url and Solace Cloud token')
         token = solace_cloud_token if solace_cloud_token else os.environ.get('SOLACE_CLOUD_TOKEN')
         self.base_url = base_url
         self.headers = {"authorization": f"Bearer {token}"}
+        self.timeout = get_timeout(timeout)
+        self.session = create_session(pool_size, retries, backoff_factor, get_rate_limiter(base_url, rate_limit))
+        self.session.headers.update(self.headers)
+        self.in_flight = threading.BoundedSemaphore(max_in_flight if max_in_flight else pool_size)
+        self.cache = ResponseCache(cache_dir, cache_ttl)
+        self.indexes = {}
+        self.index_lock = threading.Lock()
+        self.page_size = page_size
+        self.prefetcher = ThreadPoolExecutor(max_workers=max(1, pool_size // 2), thread_name_prefix="portal-prefetch")
+
+    def close(self):
+        self.prefetcher.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
 
     ## Design API calls
     # Token Permissions: [ event_designer:access and application_domain:get:* ]
     def get_application_domain_object(self,application_domain_name):
-        try:
-            response = self.design_api("GET", "applicationDomains", params={"name": application_domain_name})
-            application_domains = response.get("data")
-            for domain in application_domains:
-                if domain.get('name') == application_domain_name:
-                    return domain
-        except Exception as ex:
-            raise ex
+        application_domains = self.paged(self.design_api, "applicationDomains", params={"name": application_domain_name})
+        return next((domain for domain in application_domains if domain.get('name') == application_domain_name), None)
 
     def get_application_domain_id(self, application_domain_name):
         application_domain = self.get_application_domain_object(application_domain_name)
@@ -38,23 +61,27 @@ class EventPortal:
 
     # Token Permissions: [ event_designer:access and application:get:* ]
     def get_application_objects(self,application_domain_id):
-        try:
-            response = self.design_api("GET", "applications", params={"applicationDomainId": application_domain_id})
-            applications = response.get("data")
-            return applications
-        except Exception as ex:
-            raise ex
+        return list(self.iter_application_objects(application_domain_id))
 
+    def iter_application_objects(self, application_domain_id):
+        return self.paged(self.design_api, "applications", params={"applicationDomainId": application_domain_id})
+
+    # Stops reading pages at the first match, unless all applications of the domain are already indexed
     def get_application_object_by_name(self, application_domain_id, application_name ):
-        applications = self.get_application_objects(application_domain_id)
-        for application in applications:
-            if application.get("name") == application_name:
-                return application
+        with self.index_lock:
+            index = self.indexes.get(("applications", application_domain_id))
+        if index is not None:
+            return index.get(application_name)
+        applications = self.iter_application_objects(application_domain_id)
+        return next((application for application in applications if application.get("name") == application_name), None)
+
+    def get_application_objects_by_name(self, application_domain_id):
+        return self.index(("applications", application_domain_id),
+                          lambda: {application.get("name"): application for application in self.get_application_objects(application_domain_id)})
 
     def get_application_ids(self,application_domain_id):
         applications = self.get_application_objects(application_domain_id)
-        jsonpath_expr = parse("$..id")
-        return [match.value for match in jsonpath_expr.find(applications)]
+        return get_path_expr(applications, "$..id")
 
     def get_application_id_by_name(self,application_domain_id, application_name):
         application = self.get_application_object_by_name(application_domain_id, application_name)
@@ -62,28 +89,31 @@ class EventPortal:
 
     # Token Permissions: [ event_designer:access and application:get:* ]
     def get_application_version_objects(self,application_id):
-        try:
-            response = self.design_api("GET", "applicationVersions", params={"applicationIds": application_id})
-            versions = response.get("data")
-            return versions
-        except Exception as ex:
-            raise ex
+        return list(self.iter_application_version_objects(application_id))
+
+    # application_ids is a single id or a comma separated list of ids
+    def iter_application_version_objects(self, application_ids):
+        return self.paged(self.design_api, "applicationVersions", params={"applicationIds": application_ids})
+
+    # All versions of the given applications in a few calls, indexed by (applicationId, version)
+    def get_application_version_objects_by_name(self, application_ids, chunk_size=20):
+        versions = {}
+        for start in range(0, len(application_ids), chunk_size):
+            for version in self.iter_application_version_objects(",".join(application_ids[start:start + chunk_size])):
+                versions[(version.get("applicationId"), version.get("version"))] = version
+        return versions
 
     def get_application_version_ids(self,application_id):
         versions = self.get_application_objects(application_id)
-        jsonpath_expr = parse("$..id")
-        return [match.value for match in jsonpath_expr.find(versions)]
+        return get_path_expr(versions, "$..id")
 
     def get_application_version_object_by_name(self,application_id, version_name):
-        versions = self.get_application_version_objects(application_id)
-        for version in versions:
-            if version.get("version") == version_name:
-                return version
+        versions = self.iter_application_version_objects(application_id)
+        return next((version for version in versions if version.get("version") == version_name), None)
 
     def get_application_version_object_by_name_json(self,application_id, version_name):
         versions = self.get_application_version_objects(application_id)
-        jsonpath_expr = parse(f'$..[?(@.name == "{ version_name }"]')
-        return [match.value for match in jsonpath_expr.find(versions)]
+        return get_path_expr(versions, f'$..[?(@.name == "{ version_name }"]')
 
     def get_application_version_id_by_name(self,application_id, version_name):
         version = self.get_application_version_object_by_name(application_id, version_name)
@@ -92,14 +122,8 @@ class EventPortal:
     ## Runtime API calls
     # Token Permissions: [ event_designer:access and ep_environment:get:* ]
     def get_environment_object(self, environment_name):
-        try:
-            response = self.runtime_api("GET", "environments")
-            data = response.get("data")
-            for env in data:
-                if env.get('name') == environment_name:
-                    return env
-        except Exception as ex:
-            raise ex
+        environments = self.paged(self.runtime_api, "environments")
+        return next((env for env in environments if env.get('name') == environment_name), None)
 
     def get_environment_id(self, environment_name):
         env = self.get_environment_object(environment_name)
@@ -107,14 +131,8 @@ class EventPortal:
 
     # Token Permissions: [ event_designer:access and modeled_event_mesh:get:* ]
     def get_modeled_event_mesh_object(self, environment_id, mesh_name):
-        try:
-            response = self.runtime_api("GET", "eventMeshes", params={"environmentId": environment_id})
-            data = response.get("data")
-            for mesh in data:
-                if mesh.get('name') == mesh_name:
-                    return mesh
-        except Exception as ex:
-            raise ex
+        meshes = self.paged(self.runtime_api, "eventMeshes", params={"environmentId": environment_id})
+        return next((mesh for mesh in meshes if mesh.get('name') == mesh_name), None)
 
     def get_modeled_event_mesh_id(self, environment_id, mesh_name):
         mesh = self.get_modeled_event_mesh_object(environment_id, mesh_name)
@@ -122,17 +140,11 @@ class EventPortal:
 
     # Token Permissions: [ event_designer:access and modeled_event_broker:get:* ]
     def get_messaging_services_objects(self, mesh_id):
-        try:
-            response = self.runtime_api("GET", "messagingServices", params={"eventMeshId": mesh_id})
-            services = response.get("data")
-            return services
-        except Exception as ex:
-            raise ex
+        return list(self.paged(self.runtime_api, "messagingServices", params={"eventMeshId": mesh_id}))
 
     def get_messaging_services_ids(self, mesh_id):
         services = self.get_messaging_services_objects(mesh_id)
-        jsonpath_expr = parse("$..messagingServiceId")
-        return [match.value for match in jsonpath_expr.find(services)]
+        return get_path_expr(services, "$..messagingServiceId")
 
     # Token Permissions: [ mission_control:access and (services:get or services:get:self or services:view or services:view:self) ]
     def preview_application_deployment(self, version_id, action, messaging_service_id):
@@ -161,51 +173,74 @@ class EventPortal:
         except Exception as ex:
             raise ex
 
+    # The status of a deployment changes, it is never answered from the cache
+    def get_application_deployment(self, deployment_id):
+        return self.request("GET", f"architecture/runtimeManagement/applicationDeployments/{deployment_id}")
+
     ## Mission Control API calls
     # Token Permissions: [ mission_control:access or services:get or services:get:self or services:view or services:view:self ]
     def get_event_broker_objects(self, environment_id):
-        try:
-            response = self.missioncontrol_api("GET", "eventBrokerServices", params={"customAttributes": f"environmentId=={environment_id}"})
-            brokers = response.get("data")
-            return brokers
-        except Exception as ex:
-            raise ex
+        return list(self.iter_event_broker_objects(environment_id))
+
+    def iter_event_broker_objects(self, environment_id):
+        return self.paged(self.missioncontrol_api, "eventBrokerServices", params={"customAttributes": f"environmentId=={environment_id}"})
 
     def get_broker_ids(self, environment_id):
         brokers = self.get_event_broker_objects(environment_id)
-        jsonpath_expr = parse("$..id")
-        return [match.value for match in jsonpath_expr.find(brokers)]
+        return get_path_expr(brokers, "$..id")
 
     def get_broker_id_by_name(self, environment_id, broker_name):
-        brokers = self.get_event_broker_objects(environment_id)
-        for broker in brokers:
-            if broker.get("name") == broker_name:
-                return broker.get("id")
+        broker = self.get_broker_by_name(environment_id, broker_name)
+        return broker.get("id") if broker else None
 
     def get_broker_by_name(self, environment_id, broker_name):
-        brokers = self.get_event_broker_objects(environment_id)
-        for broker in brokers:
-            if broker.get("name") == broker_name:
-                return broker
+        brokers = self.iter_event_broker_objects(environment_id)
+        return next((broker for broker in brokers if broker.get("name") == broker_name), None)
 
     # Token Permissions: [ mission_control:access or services:get or services:get:self or services:view or services:view:self ]
     def get_client_profile_objects(self, service_id):
-        try:
-            response = self.missioncontrol_api("GET", f"eventBrokerServices/{service_id}/clientProfiles")
-            profiles = response.get("data")
-            return profiles
-        except Exception as ex:
-            raise ex
+        return list(self.paged(self.missioncontrol_api, f"eventBrokerServices/{service_id}/clientProfiles"))
 
     def get_client_profile_names(self, service_id):
         profiles = self.get_client_profile_objects(service_id)
-        jsonpath_expr = parse("$..name")
-        return [match.value for match in jsonpath_expr.find(profiles)]
+        return get_path_expr(profiles, "$..name")
 
     def profile_exists(self, service_id, preview_profile_names):
         profile_names = self.get_client_profile_names(service_id)
         return reduce(lambda acc, name: acc and any(map(lambda target: name == target, preview_profile_names)), profile_names, True)
 
+    def index(self, key, build):
+        with self.index_lock:
+            if key in self.indexes:
+                return self.indexes[key]
+        index = build()
+        with self.index_lock:
+            self.indexes[key] = index
+        return index
+
+    # Yields the objects of all pages of a list endpoint. The next page is only requested once the consumer resumes after
+    # the first object of the current page and is fetched while the rest of that page is consumed, so closing the generator
+    # early (e.g. after a name lookup found its match) never fires a request for a page nobody reads.
+    def paged(self, api, endpoint, params=None, page_size=None):
+        params = dict(params or {})
+        params["pageSize"] = page_size if page_size else self.page_size
+        fetch = lambda page_number: api("GET", endpoint, params={**params, "pageNumber": page_number})
+        future = self.prefetcher.submit(fetch, 1)
+        try:
+            while future is not None:
+                response = future.result()
+                next_page = response.get("meta", {}).get("pagination", {}).get("nextPage")
+                future = None
+                for item in response.get("data") or []:
+                    yield item
+                    if next_page and future is None:
+                        future = self.prefetcher.submit(fetch, next_page)
+                if next_page and future is None:
+                    future = self.prefetcher.submit(fetch, next_page)
+        finally:
+            if future is not None:
+                future.cancel()
+
     ## Internal api calls
     def design_api(self, method, endpoint, **kwargs):
         return self.api(method, f"architecture/{endpoint}", **kwargs)
@@ -216,13 +251,30 @@ class EventPortal:
     def missioncontrol_api(self, method, endpoint, **kwargs):
         return self.api(method, f"missionControl/{endpoint}", **kwargs)
 
+    # read-only calls are answered from the cache, keyed by endpoint and query parameters.
+    # Concurrent calls for the same key (fleet mode) wait for the first one instead of all calling the portal.
     def api(self, method, endpoint, **kwargs):
+        key = ResponseCache.key(endpoint, kwargs.get("params")) if method == "GET" and endpoint else None
+        if key is None:
+            return self.request(method, endpoint, None, **kwargs)
+        with self.cache.key_lock(key):
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            return self.request(method, endpoint, key, **kwargs)
+
+    def request(self, method, endpoint, key=None, **kwargs):
         try:
             if method is None or endpoint is None:
                 raise Exception('You must pass a method and endpoint')
             url = f"{self.base_url}/{endpoint}"
-            response = request(method, url, headers=self.headers, **kwargs)
+            with self.in_flight:
+                start = time.perf_counter()
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            observe("portal", method, endpoint, response, time.perf_counter() - start)
             response.raise_for_status()
+            if key:
+                self.cache.put(key, response.json())
             return response.json()
         except exceptions.HTTPError as exc:
             code = exc.response.status_code
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from deployer.store import PreviewStore
+
+DEFAULT_FINGERPRINT_FILE = "./store/deployments.json"
+
+fingerprint_files = {}
+fingerprint_files_lock = threading.Lock()
+
+# Hash of what is written to the broker for an application: the requested objects of the preview and the user of the target config
+def deployment_fingerprint(preview, user=None):
+    requested = preview.get("data", {}).get("requested", []) if preview else []
+    return hashlib.sha256(PreviewStore.serialize({"requested": requested, "user": user})).hexdigest()
+
+# Fingerprint of the last successful deploy of an application per broker and message VPN.
+# Only the deployed version is kept per application, so going back to an earlier version is deployed again.
+class DeploymentFingerprints:
+    def __init__(self, file_path=DEFAULT_FINGERPRINT_FILE):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.entries = self.load()
+
+    @staticmethod
+    def key(broker, app_name):
+        return f"{ broker.url }|{ broker.msg_vpn_name }|{ app_name }"
+
+    def load(self):
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            logging.warning(f"Ignoring corrupt deployment fingerprints in { self.file_path }")
+            return {}
+
+    def matches(self, broker, app_name, version_name, fingerprint):
+        with self.lock:
+            entry = self.entries.get(self.key(broker, app_name))
+        return entry is not None and entry.get("version") == version_name and entry.get("fingerprint") == fingerprint
+
+    def record(self, broker, app_name, version_name, fingerprint):
+        with self.lock:
+            self.entries[self.key(broker, app_name)] = {"version": version_name, "fingerprint": fingerprint, "timestamp": time.time()}
+            self.save()
+
+    def forget(self, broker, app_name):
+        with self.lock:
+            if self.entries.pop(self.key(broker, app_name), None) is not None:
+                self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        # write and rename, so an interrupted run never leaves a partial file
+        temp_path = f"{ self.file_path }.{ os.getpid() }.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.file_path)
+
+# One instance per file, so concurrent runs in a process (fleet mode) do not overwrite each other's fingerprints
+def load_fingerprints(file_path=DEFAULT_FINGERPRINT_FILE):
+    file_path = os.path.abspath(file_path)
+    with fingerprint_files_lock:
+        if file_path not in fingerprint_files:
+            fingerprint_files[file_path] = DeploymentFingerprints(file_path)
+        return fingerprint_files[file_path]
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import threading
+
+from deployer.fingerprint import DeploymentFingerprints
+
+DEFAULT_JOURNAL_DIR = "./store"
+SYNC_INTERVAL = 0.5 # seconds between the fsyncs of the journal
+
+# Name of the step that marks an application as completely handled on a broker
+APPLICATION_STEP = "*"
+
+def journal_path(environment_name, directory=DEFAULT_JOURNAL_DIR):
+    return os.path.join(directory, f"journal-{ environment_name }.jsonl")
+
+# Checkpoint journal of a deploy or undeploy run: a JSON lines file with an entry per broker object that was written,
+# per application that completed on a broker and per preview that was requested (its content is kept in the preview store).
+# Entries are appended to the file right away and synced to disk every SYNC_INTERVAL seconds, a crash loses at most
+# the last interval, whose steps are repeated on resume. A resumed run skips the steps of the journal that have the same
+# fingerprint, so a changed preview or user is deployed again. The journal is only kept after a run that stopped or failed
+# partway through, it is removed after a run in which all applications succeeded or nothing was written.
+class Journal:
+    def __init__(self, file_path, store, resume=False, sync_interval=SYNC_INTERVAL):
+        self.file_path = file_path
+        self.store = store
+        self.steps = set()
+        self.previews = {}
+        if resume:
+            self.load()
+        elif os.path.exists(file_path):
+            logging.info(f"Starting a new journal, the journal of the previous run in { file_path } is discarded")
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        self.file = open(file_path, "a" if resume else "w", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.entries = len(self.steps) + len(self.previews)
+        self.closed = threading.Event()
+        self.syncer = threading.Thread(target=self.sync_loop, args=(sync_interval,), daemon=True, name="journal-sync")
+        self.syncer.start()
+
+    def load(self):
+        if not os.path.exists(self.file_path):
+            logging.info(f"No journal in { self.file_path }, nothing to resume")
+            return
+        with open(self.file_path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line of a crashed run can be incomplete
+                    continue
+                if "preview" in entry:
+                    self.previews[(entry["preview"], entry["broker"])] = entry["hash"]
+                else:
+                    self.steps.add((entry["broker"], entry["application"], entry["action"], entry["fingerprint"], entry["step"]))
+        logging.info(f"Resuming from { self.file_path }: { len(self.steps) } completed steps and { len(self.previews) } previews")
+
+    def append(self, entry):
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.dirty = True
+            self.entries += 1
+
+    def sync_loop(self, interval):
+        while not self.closed.wait(interval):
+            self.sync()
+
+    def sync(self):
+        with self.lock:
+            if not self.dirty or self.file.closed:
+                return
+            self.file.flush()
+            self.dirty = False
+            fileno = self.file.fileno()
+        # the fsync runs outside the lock, so the writers are not blocked by the disk
+        os.fsync(fileno)
+
+    def get_preview(self, version_id, broker_id):
+        digest = self.previews.get((version_id, broker_id))
+        if digest is None:
+            return None
+        try:
+            return self.store.get_blob(digest)
+        except Exception as ex:
+            logging.warning(f"Preview { digest } of the journal can not be read, it is requested again: { ex }")
+            return None
+
+    def put_preview(self, version_id, broker_id, preview):
+        digest, _ = self.store.put_blob(preview)
+        self.previews[(version_id, broker_id)] = digest
+        self.append({"preview": version_id, "broker": broker_id, "hash": digest})
+
+    def checkpoint(self, broker, app_name, action, fingerprint):
+        return Checkpoint(self, DeploymentFingerprints.key(broker, app_name), app_name, action, fingerprint)
+
+    def close(self, completed=False):
+        self.closed.set()
+        self.syncer.join()
+        self.sync()
+        with self.lock:
+            self.file.close()
+        # a journal without entries has nothing to resume
+        if completed or not self.entries:
+            os.remove(self.file_path)
+        else:
+            logging.info(f"Journal kept in { self.file_path }, rerun with --resume to continue where this run stopped")
+
+# The steps of one application on one broker
+class Checkpoint:
+    def __init__(self, journal, broker_key, app_name, action, fingerprint):
+        self.journal = journal
+        self.broker_key = broker_key
+        self.app_name = app_name
+        self.action = action
+        self.fingerprint = fingerprint
+
+    def done(self, step=APPLICATION_STEP):
+        return (self.broker_key, self.app_name, self.action, self.fingerprint, step) in self.journal.steps
+
+    def record(self, step=APPLICATION_STEP):
+        self.journal.append({"broker": self.broker_key, "application": self.app_name, "action": self.action,
+                             "fingerprint": self.fingerprint, "step": step})
+
+    # Replaces the tasks completed in the journal by no-ops, so their dependents still run, and records the others when they succeed
+    def wrap(self, tasks):
+        for task in tasks:
+            if self.done(task.name):
+                logging.info(f"Step {task.name} of application {self.app_name} was completed by a previous run, skipped")
+                task.function = lambda: None
+            else:
+                task.function = self.recorded(task.name, task.function)
+        return tasks
+
+    def recorded(self, step, function):
+        def run():
+            function()
+            self.record(step)
+        return run
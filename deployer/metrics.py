@@ -0,0 +1,188 @@
+import json
+import logging
+import math
+import threading
+import time
+
+from contextlib import contextmanager
+
+# Hooks are called for every HTTP call of Broker and EventPortal and for every timed phase of a run.
+# Without hooks (the default) the instrumentation only costs a perf_counter call.
+hooks = []
+
+def add_hook(hook):
+    hooks.append(hook)
+
+def remove_hook(hook):
+    hooks.remove(hook)
+
+def observe(api, method, endpoint, response, latency):
+    if not hooks:
+        return
+    retries = getattr(response, "retries", None)
+    if retries is None:
+        # requests keeps the urllib3 Retry of the last attempt, its history holds one entry per retried attempt
+        raw_retries = getattr(getattr(response, "raw", None), "retries", None)
+        retries = len(raw_retries.history) if raw_retries is not None else 0
+    call = Call(api, method, template_endpoint(endpoint), response.status_code, latency, len(response.content or b""), retries)
+    for hook in hooks:
+        hook.call(call)
+
+@contextmanager
+def phase(name, application=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        for hook in hooks:
+            hook.phase(name, application, duration)
+
+# SEMP object names and Event Portal ids are replaced by placeholders, so calls can be grouped per endpoint:
+# msgVpns/{vpn}/queues/{name}/subscriptions and runtimeManagement/applicationDeployments/{id}
+def template_endpoint(endpoint):
+    parts = endpoint.split("?")[0].split("/")
+    if parts[0] == "msgVpns":
+        return "/".join(part if index % 2 == 0 else ("{vpn}" if index == 1 else "{name}") for index, part in enumerate(parts))
+    templated = []
+    for index, part in enumerate(parts):
+        previous = templated[-1] if templated else ""
+        is_id = index > 1 and previous.endswith("s") and not previous.startswith("{")
+        templated.append("{id}" if is_id else part)
+    return "/".join(templated)
+
+# The object type of a SEMP call is its last collection, for example subscriptions for msgVpns/{vpn}/queues/{name}/subscriptions/{name}
+def object_type(endpoint):
+    parts = [part for part in endpoint.split("/") if not part.startswith("{")]
+    return parts[-1] if parts else endpoint
+
+class Call:
+    def __init__(self, api, method, endpoint, status_code, latency, size, retries):
+        self.api = api
+        self.method = method
+        self.endpoint = endpoint
+        self.status_code = status_code
+        self.latency = latency
+        self.size = size
+        self.retries = retries
+
+# Collects the calls and phases of a run and reports them as a summary, JSON or OpenMetrics text
+class Profile:
+    def __init__(self):
+        self.calls = []
+        self.phases = []
+        self.lock = threading.Lock()
+
+    def call(self, call):
+        with self.lock:
+            self.calls.append(call)
+
+    def phase(self, name, application, duration):
+        with self.lock:
+            self.phases.append((name, application, duration))
+
+    def endpoints(self):
+        groups = {}
+        with self.lock:
+            for call in self.calls:
+                groups.setdefault((call.api, call.method, call.endpoint), []).append(call)
+        summary = []
+        for (api, method, endpoint), calls in sorted(groups.items()):
+            latencies = sorted(call.latency for call in calls)
+            summary.append({
+                "api": api,
+                "method": method,
+                "endpoint": endpoint,
+                "count": len(calls),
+                "errors": len([call for call in calls if call.status_code >= 400]),
+                "retries": sum(call.retries for call in calls),
+                "bytes": sum(call.size for call in calls),
+                "seconds": sum(latencies),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95)
+            })
+        return summary
+
+    def object_types(self):
+        counts = {}
+        with self.lock:
+            for call in self.calls:
+                if call.api == "semp":
+                    key = f"{call.method} {object_type(call.endpoint)}"
+                    counts[key] = counts.get(key, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def phase_totals(self):
+        totals = {}
+        with self.lock:
+            for name, _, duration in self.phases:
+                count, seconds = totals.get(name, (0, 0.0))
+                totals[name] = (count + 1, seconds + duration)
+        return {name: {"count": count, "seconds": seconds} for name, (count, seconds) in totals.items()}
+
+    def slowest_applications(self, limit=10):
+        durations = {}
+        with self.lock:
+            for name, application, duration in self.phases:
+                if application and name == "application":
+                    durations[application] = durations.get(application, 0.0) + duration
+        return [{"application": application, "seconds": seconds} for application, seconds in sorted(durations.items(), key=lambda item: -item[1])[:limit]]
+
+    def summary(self):
+        return {
+            "phases": self.phase_totals(),
+            "endpoints": self.endpoints(),
+            "objectTypes": self.object_types(),
+            "slowestApplications": self.slowest_applications()
+        }
+
+    def log(self):
+        summary = self.summary()
+        logging.info("Run profile:")
+        for name, totals in summary["phases"].items():
+            logging.info(f"  phase {name:<30} {totals['count']:>6}x {totals['seconds']:9.2f}s")
+        for endpoint in sorted(summary["endpoints"], key=lambda endpoint: -endpoint["seconds"])[:20]:
+            logging.info(f"  {endpoint['method']:<6} {endpoint['endpoint']:<70} {endpoint['count']:>6}x p50 {endpoint['p50'] * 1000:8.1f}ms p95 {endpoint['p95'] * 1000:8.1f}ms")
+        for application in summary["slowestApplications"]:
+            logging.info(f"  application {application['application']:<40} {application['seconds']:9.2f}s")
+
+    def write(self, file_path, format="json"):
+        content = self.openmetrics() if format == "openmetrics" else json.dumps(self.summary(), indent=2)
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write(content)
+        logging.info(f"Run profile written to {file_path}")
+
+    def openmetrics(self):
+        lines = [
+            "# TYPE deployer_request_duration_seconds summary",
+            "# UNIT deployer_request_duration_seconds seconds"
+        ]
+        endpoints = self.endpoints()
+        for endpoint in endpoints:
+            labels = f'api="{endpoint["api"]}",method="{endpoint["method"]}",endpoint="{endpoint["endpoint"]}"'
+            lines.append(f'deployer_request_duration_seconds{{{labels},quantile="0.5"}} {endpoint["p50"]}')
+            lines.append(f'deployer_request_duration_seconds{{{labels},quantile="0.95"}} {endpoint["p95"]}')
+            lines.append(f"deployer_request_duration_seconds_sum{{{labels}}} {endpoint['seconds']}")
+            lines.append(f"deployer_request_duration_seconds_count{{{labels}}} {endpoint['count']}")
+        for name, key in [("deployer_request_errors", "errors"), ("deployer_request_retries", "retries"), ("deployer_response_bytes", "bytes")]:
+            lines.append(f"# TYPE {name} counter")
+            for endpoint in endpoints:
+                labels = f'api="{endpoint["api"]}",method="{endpoint["method"]}",endpoint="{endpoint["endpoint"]}"'
+                lines.append(f"{name}_total{{{labels}}} {endpoint[key]}")
+        lines.append("# TYPE deployer_phase_duration_seconds summary")
+        lines.append("# UNIT deployer_phase_duration_seconds seconds")
+        for name, totals in self.phase_totals().items():
+            lines.append(f'deployer_phase_duration_seconds_sum{{phase="{name}"}} {totals["seconds"]}')
+            lines.append(f'deployer_phase_duration_seconds_count{{phase="{name}"}} {totals["count"]}')
+        lines.append("# TYPE deployer_application_duration_seconds gauge")
+        lines.append("# UNIT deployer_application_duration_seconds seconds")
+        for application in self.slowest_applications(limit=None):
+            lines.append(f'deployer_application_duration_seconds{{application="{application["application"]}"}} {application["seconds"]}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+# Nearest rank percentile of a sorted list
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
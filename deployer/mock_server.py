@@ -0,0 +1,327 @@
+import json
+import random
+import threading
+import time
+
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+# Attribute that identifies the objects of every SEMP v2 collection used by Broker
+SEMP_KEYS = {
+    "msgVpns": "msgVpnName",
+    "clientProfiles": "clientProfileName",
+    "aclProfiles": "aclProfileName",
+    "clientConnectExceptions": "clientConnectExceptionAddress",
+    "publishTopicExceptions": "publishTopicException",
+    "subscribeTopicExceptions": "subscribeTopicException",
+    "clientUsernames": "clientUsername",
+    "authorizationGroups": "authorizationGroupName",
+    "queues": "queueName",
+    "subscriptions": "subscriptionTopic",
+    "restDeliveryPoints": "restDeliveryPointName",
+    "restConsumers": "restConsumerName",
+    "queueBindings": "queueBindingName",
+    "requestHeaders": "headerName",
+    "protectedRequestHeaders": "headerName"
+}
+
+# Topic exceptions are addressed as <syntax>,<topic>
+SYNTAX_PREFIXED = ["publishTopicExceptions", "subscribeTopicExceptions"]
+
+SEMP_PATH = "/SEMP/v2/config/"
+PORTAL_PATH = "/api/v2/"
+
+# In-process stand-in for the SEMP v2 config API of a broker and the Event Portal / Mission Control API, for local runs
+# and benchmarks without Solace Cloud access. Every request can be delayed by latency seconds and fail with a 503
+# with probability error_rate. With a rate_limit, requests above that number per second are rejected with a 429 and a Retry-After.
+# The Event Portal has one domain with the given number of applications, each with one released version whose preview
+# holds an ACL profile, a client username and a queue with topics subscriptions. Deployments are pending for deployment_delay seconds.
+# A SEMP create in one of the rejected collections (e.g. "queues") fails with a 400 INVALID_PARAMETER.
+# A SEMP page of more than max_page_size objects fails with a 549 SEMP_RESPONSE_BUFFER_ALLOCATION_FAILED.
+class MockSolace:
+    def __init__(self, applications=10, domain_name="MockDomain", topics=3, latency=0.0, error_rate=0.0, seed=0, rate_limit=None, deployment_delay=0.0,
+                 max_page_size=None, rejected=(), environments=("Dev", "Test", "Acceptance", "Production"), mesh_name="mesh", version="0.1.0"):
+        self.domain_name = domain_name
+        self.topics = topics
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.rate_limit = rate_limit
+        self.deployment_delay = deployment_delay
+        self.max_page_size = max_page_size
+        self.rejected = set(rejected)
+        self.window = (0, 0) # second and number of requests in that second
+        self.throttled = 0
+        self.environments = [{"id": f"env-{index}", "name": name} for index, name in enumerate(environments)]
+        self.mesh_name = mesh_name
+        self.version = version
+        self.applications = [{"id": f"app-{index}", "name": f"app{index}", "applicationDomainId": "domain-0"} for index in range(applications)]
+        self.versions = [{"id": f"version-{index}", "applicationId": application["id"], "version": version, "stateId": "2"}
+                         for index, application in enumerate(self.applications)]
+        self.collections = {}
+        self.deployments = {}
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), MockHandler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        threading.Thread(target=self.server.serve_forever, daemon=True, name="mock-solace").start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{ host }:{ port }"
+
+    @property
+    def semp_url(self):
+        return f"{ self.base_url }{ SEMP_PATH.rstrip("/") }"
+
+    @property
+    def portal_url(self):
+        return f"{ self.base_url }{ PORTAL_PATH.rstrip("/") }"
+
+    def requests(self, api=None):
+        with self.lock:
+            return sum(count for (counted_api, _), count in self.counts.items() if api is None or counted_api == api)
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts.clear()
+            self.throttled = 0
+
+    def throttle(self):
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            second = int(time.monotonic())
+            count = self.window[1] + 1 if self.window[0] == second else 1
+            self.window = (second, count)
+            if count > self.rate_limit:
+                self.throttled += 1
+                return True
+            return False
+
+    def count(self, api, method):
+        with self.lock:
+            self.counts[(api, method)] += 1
+
+    def inject_error(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            return self.error_rate and self.random.random() < self.error_rate
+
+    # A deployment is pending for deployment_delay seconds
+    def deployment_state(self, deployment):
+        status = "success" if time.monotonic() - deployment["created"] >= self.deployment_delay else "pending"
+        return {key: value for key, value in deployment.items() if key != "created"} | {"status": status}
+
+    def user_name(self, application):
+        return f"{ application["name"] }-user"
+
+    def preview(self, version_id):
+        application = next(application for application, version in zip(self.applications, self.versions) if version["id"] == version_id)
+        name = application["name"]
+        topics = range(self.topics)
+        return {"data": {"requested": [
+            {"type": "solaceAcl", "value": {
+                "aclProfile": {"aclProfileName": f"{ name }-acl", "clientConnectDefaultAction": "allow",
+                               "publishTopicDefaultAction": "disallow", "subscribeTopicDefaultAction": "disallow"},
+                "publishTopicExceptions": [f"{ name }/pub/{ topic }" for topic in topics],
+                "subscribeTopicExceptions": [f"{ name }/sub/{ topic }" for topic in topics]}},
+            {"type": "solaceClientUsername", "value": {"clientUsername": self.user_name(application), "enabled": True}},
+            {"type": "solaceQueue", "value": {
+                "queueConfiguration": {"queueName": f"{ name }-queue", "accessType": "exclusive", "ingressEnabled": True, "egressEnabled": True},
+                "subscriptions": [f"{ name }/queue/{ topic }" for topic in topics]}}
+        ], "existing": []}}
+
+    ## SEMP v2
+    def semp(self, method, path, query, body):
+        parts = [unquote(part) for part in path.split("/") if part]
+        if not parts or parts[0] != "msgVpns":
+            return 400, semp_error(method, path, 11, "INVALID_PARAMETER", "Unsupported endpoint")
+        with self.lock:
+            if len(parts) > 1:
+                self.ensure_vpn(parts[1])
+            if len(parts) % 2 == 1:
+                return self.semp_collection(method, path, tuple(parts), query, body)
+            return self.semp_object(method, path, tuple(parts), query, body)
+
+    def ensure_vpn(self, vpn_name):
+        vpns = self.collections.setdefault(("msgVpns",), {})
+        if vpn_name not in vpns:
+            vpns[vpn_name] = {"msgVpnName": vpn_name}
+            self.collections[("msgVpns", vpn_name, "clientProfiles")] = {"default": {"clientProfileName": "default", "msgVpnName": vpn_name}}
+
+    def semp_collection(self, method, path, parts, query, body):
+        parent = parts[:-1]
+        if len(parent) >= 2 and parent[-1] not in self.collections.get(parent[:-1], {}):
+            return 400, semp_error(method, path, 6, "NOT_FOUND", f"Could not find match for {'/'.join(parent)}")
+        items = self.collections.setdefault(parts, {})
+        if method == "GET":
+            count = int(query.get("count", ["10"])[0])
+            cursor = int(query.get("cursor", ["0"])[0] or 0)
+            data = list(items.values())
+            if self.max_page_size and min(count, len(data) - cursor) > self.max_page_size:
+                return 400, semp_error(method, path, 549, "SEMP_RESPONSE_BUFFER_ALLOCATION_FAILED", "Response too large, use paging")
+            selected = [select(item, query) for item in data[cursor:cursor + count]]
+            meta = semp_meta(method, path)
+            if cursor + count < len(data):
+                meta["paging"] = {"cursorQuery": str(cursor + count), "nextPageUri": f"{ path }?count={ count }&cursor={ cursor + count }"}
+            return 200, {"data": selected, "meta": meta}
+        if method == "POST":
+            key = body.get(SEMP_KEYS.get(parts[-1], ""))
+            if key is None:
+                return 400, semp_error(method, path, 228, "MISSING_PARAMETER", f"Missing {SEMP_KEYS.get(parts[-1])}")
+            if parts[-1] in self.rejected:
+                return 400, semp_error(method, path, 11, "INVALID_PARAMETER", f"Creating {key} is rejected")
+            if key in items:
+                return 400, semp_error(method, path, 10, "ALREADY_EXISTS", f"Object {key} already exists")
+            items[key] = dict(body)
+            return 200, {"data": items[key], "meta": semp_meta(method, path)}
+        return 405, semp_error(method, path, 14, "NOT_SUPPORTED", f"{method} is not supported on a collection")
+
+    def semp_object(self, method, path, parts, query, body):
+        collection, key = parts[:-1], parts[-1]
+        if collection[-1] in SYNTAX_PREFIXED and "," in key:
+            key = key.split(",", 1)[1]
+        items = self.collections.get(collection, {})
+        if key not in items:
+            return 400, semp_error(method, path, 6, "NOT_FOUND", f"Could not find match for {key}")
+        if method == "GET":
+            return 200, {"data": select(items[key], query), "meta": semp_meta(method, path)}
+        if method in ["PATCH", "PUT"]:
+            items[key] = dict(body) if method == "PUT" else {**items[key], **body}
+            return 200, {"data": items[key], "meta": semp_meta(method, path)}
+        if method == "DELETE":
+            del items[key]
+            prefix = collection + (parts[-1],)
+            for child in [child for child in self.collections if child[:len(prefix)] == prefix]:
+                del self.collections[child]
+            return 200, {"meta": semp_meta(method, path)}
+        return 405, semp_error(method, path, 14, "NOT_SUPPORTED", f"{method} is not supported on an object")
+
+    ## Event Portal and Mission Control
+    def portal(self, method, path, query, body):
+        parameter = lambda name: query.get(name, [None])[0]
+        if method == "GET":
+            match path.split("/"):
+                case ["architecture", "environments"]:
+                    return 200, page(self.environments, query)
+                case ["architecture", "eventMeshes"]:
+                    environment_id = parameter("environmentId")
+                    return 200, page([{"id": f"mesh-{ environment_id }", "name": self.mesh_name, "environmentId": environment_id}], query)
+                case ["architecture", "messagingServices"]:
+                    mesh_id = parameter("eventMeshId")
+                    return 200, page([{"id": f"service-{ mesh_id }", "messagingServiceId": f"broker-{ mesh_id }", "eventMeshId": mesh_id}], query)
+                case ["architecture", "applicationDomains"]:
+                    domains = [{"id": "domain-0", "name": self.domain_name}]
+                    return 200, page([domain for domain in domains if parameter("name") in [None, domain["name"]]], query)
+                case ["architecture", "applications"]:
+                    return 200, page([application for application in self.applications if application["applicationDomainId"] == parameter("applicationDomainId")], query)
+                case ["architecture", "applicationVersions"]:
+                    application_ids = set((parameter("applicationIds") or "").split(","))
+                    return 200, page([version for version in self.versions if version["applicationId"] in application_ids], query)
+                case ["architecture", "runtimeManagement", "applicationDeployments", deployment_id]:
+                    with self.lock:
+                        deployment = self.deployments.get(deployment_id)
+                    if deployment is None:
+                        return 404, {"message": f"Deployment {deployment_id} not found"}
+                    return 200, {"data": self.deployment_state(deployment)}
+                case ["missionControl", "eventBrokerServices"]:
+                    return 200, page([{"id": "broker-0", "name": "mock-broker"}], query)
+                case ["missionControl", "eventBrokerServices", _, "clientProfiles"]:
+                    return 200, page([{"name": "default"}], query)
+        if method == "POST":
+            match path.split("/"):
+                case ["architecture", "runtimeManagement", "applicationDeploymentPreviews"]:
+                    if body.get("applicationVersionId") not in [version["id"] for version in self.versions]:
+                        return 404, {"message": f"Application version {body.get('applicationVersionId')} not found"}
+                    return 200, self.preview(body["applicationVersionId"])
+                case ["architecture", "runtimeManagement", "applicationDeployments"]:
+                    with self.lock:
+                        deployment_id = f"deployment-{ len(self.deployments) }"
+                        self.deployments[deployment_id] = {"id": deployment_id, "created": time.monotonic(), **body}
+                        return 200, {"data": self.deployment_state(self.deployments[deployment_id])}
+        return 404, {"message": f"Unknown endpoint {method} {path}"}
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, with Nagle every keep-alive response would wait for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_request(self):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        query = parse_qs(url.query)
+        if url.path.startswith(SEMP_PATH):
+            api, handler, path = "semp", mock.semp, url.path[len(SEMP_PATH):]
+        elif url.path.startswith(PORTAL_PATH):
+            api, handler, path = "portal", mock.portal, url.path[len(PORTAL_PATH):]
+        else:
+            return self.send(404, {"message": f"Unknown path {url.path}"})
+        mock.count(api, self.command)
+        if mock.throttle():
+            return self.send(429, {"message": "Too many requests"}, {"Retry-After": "1"})
+        if mock.inject_error():
+            return self.send(503, {"message": "Injected error"})
+        code, message = handler(self.command, path, query, body)
+        self.send(code, message)
+
+    def send(self, code, message, headers=None):
+        content = json.dumps(message).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = handle_request
+
+def semp_meta(method, path, code=200):
+    return {"request": {"method": method, "uri": path}, "responseCode": code}
+
+def semp_error(method, path, code, status, description):
+    meta = semp_meta(method, path, 400)
+    meta["error"] = {"code": code, "status": status, "description": description}
+    return {"meta": meta}
+
+def select(item, query):
+    if "select" not in query:
+        return item
+    fields = query["select"][0].split(",")
+    return {key: value for key, value in item.items() if key in fields}
+
+def page(items, query):
+    size = int(query.get("pageSize", ["20"])[0])
+    number = int(query.get("pageNumber", ["1"])[0])
+    total = max(1, -(-len(items) // size))
+    return {
+        "data": items[(number - 1) * size:number * size],
+        "meta": {"pagination": {"pageNumber": number, "count": len(items), "pageSize": size,
+                                "nextPage": number + 1 if number < total else None, "totalPages": total}}
+    }
@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+
+EMPTY = MappingProxyType({})
+
+def frozen(attributes):
+    return MappingProxyType(dict(attributes)) if attributes else EMPTY
+
+# Immutable model of the objects of a deployment preview. A preview is parsed once and its objects are shared by all brokers
+# and threads: payload() returns a new dict of the SEMP attributes with the broker specific overrides (msgVpnName, owner, ...),
+# so nothing is written back into the model.
+@dataclass(frozen=True, slots=True)
+class SempObject:
+    name: str = None
+    attributes: MappingProxyType = EMPTY
+
+    def payload(self, **overrides):
+        return {**self.attributes, **overrides}
+
+@dataclass(frozen=True, slots=True)
+class AclProfile(SempObject):
+    client_connect_exceptions: tuple = ()
+    publish_topic_exceptions: tuple = ()
+    subscribe_topic_exceptions: tuple = ()
+
+    @classmethod
+    def from_preview(cls, value):
+        profile = value.get("aclProfile") or {}
+        return cls(profile.get("aclProfileName"), frozen(profile), tuple(value.get("clientConnectExceptions") or ()),
+                   tuple(value.get("publishTopicExceptions") or ()), tuple(value.get("subscribeTopicExceptions") or ()))
+
+@dataclass(frozen=True, slots=True)
+class ClientUsername(SempObject):
+    @classmethod
+    def from_preview(cls, value):
+        return cls(value.get("clientUsername"), frozen(value))
+
+@dataclass(frozen=True, slots=True)
+class AuthorizationGroup(SempObject):
+    @classmethod
+    def from_preview(cls, value):
+        return cls(value.get("authorizationGroupName"), frozen(value))
+
+@dataclass(frozen=True, slots=True)
+class Queue(SempObject):
+    subscriptions: tuple = ()
+
+    @classmethod
+    def from_preview(cls, value):
+        configuration = value.get("queueConfiguration") or {}
+        return cls(configuration.get("queueName"), frozen(configuration), tuple(value.get("subscriptions") or ()))
+
+@dataclass(frozen=True, slots=True)
+class RestConsumer(SempObject):
+    @classmethod
+    def from_preview(cls, value):
+        configuration = value.get("restConsumerConfiguration") or {}
+        return cls(configuration.get("restConsumerName"), frozen(configuration))
+
+@dataclass(frozen=True, slots=True)
+class Rdp(SempObject):
+    consumers: tuple = ()
+
+    @classmethod
+    def from_preview(cls, value):
+        configuration = value.get("restDeliveryPointConfiguration") or {}
+        return cls(configuration.get("restDeliveryPointName"), frozen(configuration),
+                   tuple(RestConsumer.from_preview(consumer) for consumer in value.get("restConsumers") or ()))
+
+@dataclass(frozen=True, slots=True)
+class QueueBinding(SempObject):
+    rdp_name: str = None
+    request_headers: tuple = ()
+    protected_request_headers: tuple = ()
+
+    @classmethod
+    def from_preview(cls, value):
+        configuration = value.get("queueBindingConfiguration") or {}
+        return cls(configuration.get("queueBindingName"), frozen(configuration), configuration.get("restDeliveryPointName"),
+                   tuple(frozen(header) for header in value.get("requestHeaders") or ()),
+                   tuple(frozen(header) for header in value.get("protectedRequestHeaders") or ()))
@@ -0,0 +1,83 @@
+import logging
+import threading
+
+class Change:
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+    UNCHANGED = "unchanged"
+
+    SYMBOLS = {
+        CREATE: "+",
+        UPDATE: "~",
+        DELETE: "-",
+        UNCHANGED: "="
+    }
+
+    def __init__(self, operation, endpoint, attributes=None):
+        self.operation = operation
+        self.endpoint = endpoint
+        self.attributes = attributes
+
+    def __str__(self):
+        attributes = f" { self.attributes }" if self.attributes else ""
+        return f"{ Change.SYMBOLS[self.operation] } { self.endpoint }{ attributes }"
+
+class Plan:
+    OPERATIONS = {
+        "POST": Change.CREATE,
+        "PATCH": Change.UPDATE,
+        "PUT": Change.UPDATE,
+        "DELETE": Change.DELETE
+    }
+
+    def __init__(self, broker_name, app_name):
+        self.broker_name = broker_name
+        self.app_name = app_name
+        self.changes = []
+        self.lock = threading.Lock()
+
+    def add(self, method, endpoint, payload=None):
+        with self.lock:
+            self.changes.append(Change(Plan.OPERATIONS.get(method, method), endpoint, payload))
+
+    def unchanged(self, endpoint):
+        with self.lock:
+            self.changes.append(Change(Change.UNCHANGED, endpoint))
+
+    def counts(self):
+        counts = {operation: 0 for operation in Change.SYMBOLS}
+        for change in self.changes:
+            counts[change.operation] += 1
+        return counts
+
+    def summary(self):
+        counts = self.counts()
+        return ", ".join(f"{ count } { operation }" for operation, count in counts.items())
+
+    def log(self, verbose=False):
+        logging.info(f"Plan for application { self.app_name } on broker { self.broker_name }: { self.summary() }")
+        if verbose:
+            for change in self.changes:
+                logging.info(f"  { change }")
+
+# Attributes SEMP accepts but never returns in a GET, they can not be compared
+WRITE_ONLY_ATTRIBUTES = {
+    "password",
+    "authenticationAwsSecretAccessKey",
+    "authenticationClientCertContent",
+    "authenticationClientCertPassword",
+    "authenticationHttpBasicPassword",
+    "authenticationHttpHeaderValue",
+    "authenticationOAuthClientSecret",
+    "authenticationOAuthJwtSecretKey"
+}
+
+# The attributes that differ from the broker, a requested write-only attribute is always written
+def diff(current, requested):
+    return {key: value for key, value in requested.items()
+            if key in WRITE_ONLY_ATTRIBUTES or (key in current and current[key] != value)}
+
+# The attributes that can be read back, for the select of a GET
+def readable(fields):
+    return [field for field in fields if field not in WRITE_ONLY_ATTRIBUTES]
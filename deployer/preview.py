@@ -0,0 +1,66 @@
+from deployer.model import AclProfile, ClientUsername, AuthorizationGroup, Queue, Rdp, QueueBinding
+
+# Object types of an application deployment preview and the PreviewObjects attribute they are collected in
+SOLACE_TYPES = {
+    "solaceAcl": "acl_profiles",
+    "solaceClientUsername": "client_usernames",
+    "solaceClientCertificateUsername": "client_certificate_usernames",
+    "solaceAuthorizationGroup": "authorization_groups",
+    "solaceQueue": "queues",
+    "solaceRestDeliveryPoint": "rdps",
+    "solaceRestDeliveryPointQueueBinding": "rdp_queue_bindings"
+}
+
+# The model class a preview value of each type is parsed into
+MODEL_TYPES = {
+    "solaceAcl": AclProfile,
+    "solaceClientUsername": ClientUsername,
+    "solaceClientCertificateUsername": ClientUsername,
+    "solaceAuthorizationGroup": AuthorizationGroup,
+    "solaceQueue": Queue,
+    "solaceRestDeliveryPoint": Rdp,
+    "solaceRestDeliveryPointQueueBinding": QueueBinding
+}
+
+CLIENT_TYPES = [
+    "solaceClientUsername",
+    "solaceClientCertificateUsername",
+    "solaceAuthorizationGroup"
+]
+
+class PreviewObjects:
+    __slots__ = ("acl_profiles", "client_usernames", "client_certificate_usernames", "authorization_groups", "queues", "rdps",
+                 "rdp_queue_bindings", "client_type")
+
+    def __init__(self):
+        self.acl_profiles = []
+        self.client_usernames = []
+        self.client_certificate_usernames = []
+        self.authorization_groups = []
+        self.queues = []
+        self.rdps = []
+        self.rdp_queue_bindings = []
+        self.client_type = None
+
+    def of_type(self, solace_type):
+        return getattr(self, SOLACE_TYPES[solace_type])
+
+# Parses the values of a list of preview items into the model and buckets them by their type in a single pass
+def classify(items):
+    objects = PreviewObjects()
+    for item in items or []:
+        item_type = item.get("type")
+        if item_type in SOLACE_TYPES:
+            objects.of_type(item_type).append(MODEL_TYPES[item_type].from_preview(item.get("value") or {}))
+        if item_type in CLIENT_TYPES and objects.client_type is None:
+            objects.client_type = item_type
+    return objects
+
+def classify_preview(preview):
+    data = preview.get("data", {}) if preview else {}
+    return classify(data.get("requested")), classify(data.get("existing"))
+
+# The requested objects of a preview, they are used for deploy and undeploy
+def requested_objects(preview):
+    data = preview.get("data", {}) if preview else {}
+    return classify(data.get("requested"))
@@ -0,0 +1,128 @@
+import logging
+import random
+import threading
+import time
+
+from collections import deque
+from urllib.parse import urlsplit
+
+MIN_RATE = 1.0 # requests per second
+RATE_DECREASE = 0.5 # factor applied to the rate on a throttled response
+RATE_INCREASE = 1.0 # requests per second added per second without throttled responses
+DEFAULT_BURST = 10
+
+# Status codes that mean the server wants fewer requests
+THROTTLE_STATUS_CODES = [429, 503]
+
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+# Client side token bucket per host that adapts to the server: a 429 or 503 halves the rate and a Retry-After pauses
+# all requests to the host, the rate then grows back slowly while no responses are throttled.
+# Without a configured rate the host is not limited until its first throttled response,
+# the rate is then set to half of the rate measured over the last second.
+class RateLimiter:
+    def __init__(self, host, rate=None, burst=DEFAULT_BURST):
+        self.host = host
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+        self.paused_until = 0.0
+        self.updated = time.monotonic()
+        self.last_decrease = 0.0
+        self.recent = deque()
+        self.requests = 0
+        self.throttles = 0
+        self.throttled_seconds = 0.0
+
+    # Reserves a token and returns the seconds to wait before sending, so it can be used with time.sleep and asyncio.sleep
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.requests += 1
+            wait = max(0.0, self.paused_until - now)
+            if self.rate is None:
+                self.recent.append(now)
+                while self.recent and self.recent[0] < now - 1.0:
+                    self.recent.popleft()
+            else:
+                interval = 1.0 / self.rate
+                next_time = max(self.next_time, now + wait)
+                wait = max(wait, next_time - (self.burst - 1) * interval - now)
+                self.next_time = next_time + interval
+            self.throttled_seconds += wait
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttled(self, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            self.throttles += 1
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            # the concurrent requests that were already sent are throttled as well, they lower the rate only once
+            if now - self.last_decrease < 1.0:
+                return
+            current = self.rate if self.rate is not None else len(self.recent)
+            self.rate = max(MIN_RATE, current * RATE_DECREASE)
+            self.next_time = max(self.next_time, now)
+            self.last_decrease = now
+            self.updated = now
+            logging.warning(f"Requests to {self.host} are throttled, lowering the rate to {self.rate:.1f} requests per second")
+
+    def succeeded(self):
+        if self.rate is None or self.rate == self.max_rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            rate = self.rate + RATE_INCREASE * (now - self.updated)
+            self.rate = min(self.max_rate, rate) if self.max_rate else rate
+            self.updated = now
+
+    def log(self):
+        rate = f"{self.rate:.1f} requests per second" if self.rate else "unlimited"
+        logging.info(f"Rate limiter {self.host}: {self.requests} requests, {self.throttles} throttled responses, "
+                     f"{self.throttled_seconds:.2f}s waited, rate {rate}")
+
+# One limiter per host, shared by all clients of the host
+def get_rate_limiter(url, rate=None, burst=None):
+    host = urlsplit(url).netloc or url
+    with rate_limiters_lock:
+        limiter = rate_limiters.get(host)
+        if limiter is None:
+            limiter = RateLimiter(host, rate, burst or DEFAULT_BURST)
+            rate_limiters[host] = limiter
+        return limiter
+
+def log_rate_limiters():
+    with rate_limiters_lock:
+        limiters = list(rate_limiters.values())
+    for limiter in limiters:
+        if limiter.throttles or limiter.throttled_seconds:
+            limiter.log()
+
+# Retry-After is a number of seconds or an HTTP date
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Exponential backoff with full jitter, so the retries of concurrent requests do not hit the server at the same moment.
+# The Retry-After of the server is the minimum.
+def backoff(attempt, backoff_factor, retry_after=None):
+    delay = random.uniform(0, backoff_factor * (2 ** attempt))
+    return max(delay, retry_after or 0.0)
@@ -0,0 +1,196 @@
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+class Job:
+    def __init__(self, name, task, keys=None):
+        self.name = name
+        self.task = task
+        self.keys = set(keys) if keys else set()
+
+class JobResult:
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    def __init__(self, name, status, duration=0.0, error=None):
+        self.name = name
+        self.status = status
+        self.duration = duration
+        self.error = error
+
+# Keys of the broker objects an application creates or deletes, from the requested objects of its preview.
+# Applications sharing a key must not run concurrently.
+def shared_object_keys(objects, user=None):
+    keys = set()
+    if user and user.get("name"):
+        keys.add(("client", user.get("name")))
+    if not objects:
+        return keys
+    for acl_profile in objects.acl_profiles:
+        keys.add(("aclProfile", acl_profile.name))
+    for client in objects.client_usernames + objects.client_certificate_usernames + objects.authorization_groups:
+        keys.add(("client", client.name))
+    for queue in objects.queues:
+        keys.add(("queue", queue.name))
+    for rdp in objects.rdps:
+        keys.add(("rdp", rdp.name))
+    return {key for key in keys if key[1] is not None}
+
+# Jobs sharing at least one key end up in the same group, a group keeps the submission order of its jobs
+def group_jobs(jobs):
+    parent = list(range(len(jobs)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    owners = {}
+    for index, job in enumerate(jobs):
+        for key in job.keys:
+            if key in owners:
+                parent[find(index)] = find(owners[key])
+            else:
+                owners[key] = index
+    groups = {}
+    for index, job in enumerate(jobs):
+        groups.setdefault(find(index), []).append(job)
+    return list(groups.values())
+
+def run_jobs(jobs, parallel=1):
+    groups = group_jobs(jobs)
+    logging.debug(f"Scheduling {len(jobs)} jobs in {len(groups)} independent groups with parallelism {parallel}")
+    results = {}
+
+    def run_group(group):
+        for job in group:
+            results[id(job)] = run_job(job)
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel or 1), thread_name_prefix="job") as executor:
+        list(executor.map(run_group, groups))
+    return [results[id(job)] for job in jobs]
+
+# Producer/consumer variant of run_jobs for jobs that need a slow lookup first (a preview): prefetch workers call
+# fetch(item) in the order of items while up to parallel jobs run. create_job(item, value, error) turns a fetched item into its Job.
+# A job starts when no earlier unfinished job shares one of its keys, so jobs sharing a key keep the order of items.
+# At most window items are fetched and not yet finished, which bounds the memory held by fetched values.
+def run_pipeline(items, fetch, create_job, parallel=1, prefetch=None, window=None):
+    parallel = max(1, parallel or 1)
+    prefetch = max(1, prefetch or parallel)
+    window = max(parallel + prefetch, window or 2 * (parallel + prefetch))
+    jobs = [None] * len(items)
+    results = [None] * len(items)
+    finished = set()
+    started = set()
+    first = 0 # the first unfinished item
+    next_fetch = 0
+    fetches = {}
+    running = {}
+
+    def fetch_job(item):
+        try:
+            value, error = fetch(item), None
+        except Exception as ex:
+            value, error = None, ex
+        return create_job(item, value, error)
+
+    with ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="prefetch") as fetcher, \
+            ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="job") as executor:
+        while len(finished) < len(items):
+            while next_fetch < len(items) and next_fetch - len(finished) < window:
+                fetches[fetcher.submit(fetch_job, items[next_fetch])] = next_fetch
+                next_fetch += 1
+            while first in finished:
+                first += 1
+            blocked = set()
+            for index in range(first, next_fetch):
+                if index in finished:
+                    continue
+                job = jobs[index]
+                if job is None:
+                    # the keys of a job that is still being fetched are unknown, later jobs could share them
+                    break
+                if index not in started and len(running) < parallel and not job.keys & blocked:
+                    started.add(index)
+                    running[executor.submit(run_job, job)] = index
+                blocked |= job.keys
+            done, _ = wait(list(fetches) + list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetches:
+                    jobs[fetches.pop(future)] = future.result()
+                else:
+                    index = running.pop(future)
+                    results[index] = future.result()
+                    finished.add(index)
+                    jobs[index] = None
+    return results
+
+def run_job(job):
+    start = time.perf_counter()
+    try:
+        job.task()
+        return JobResult(job.name, JobResult.SUCCEEDED, time.perf_counter() - start)
+    except Exception as ex:
+        logging.error(f"{job.name}::{type(ex).__name__}::{ex}")
+        return JobResult(job.name, JobResult.FAILED, time.perf_counter() - start, ex)
+
+class Task:
+    def __init__(self, name, function, depends_on=None):
+        self.name = name
+        self.function = function
+        self.depends_on = set(depends_on) if depends_on else set()
+
+# Runs a dependency graph of tasks, a task starts as soon as all tasks it depends on are done.
+# After the first failure no new tasks are started, the running ones are awaited and the failure is raised.
+def run_graph(tasks, max_workers=1):
+    tasks = {task.name: task for task in tasks}
+    for task in tasks.values():
+        unknown = task.depends_on - tasks.keys()
+        if unknown:
+            raise ValueError(f"Task {task.name} depends on unknown tasks {sorted(unknown)}")
+    waiting = dict(tasks)
+    done = set()
+    error = None
+    with ThreadPoolExecutor(max_workers=max(1, max_workers or 1), thread_name_prefix="task") as executor:
+        running = {}
+        while waiting or running:
+            if error is None:
+                for name in [name for name, task in waiting.items() if task.depends_on <= done]:
+                    running[executor.submit(waiting.pop(name).function)] = name
+            if not running:
+                if error is None:
+                    raise ValueError(f"Tasks {sorted(waiting)} have cyclic dependencies")
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    error = error or future.exception()
+                else:
+                    done.add(name)
+    if error is not None:
+        raise error
+    return done
+
+# Calls function for every item concurrently, returns a (value, exception) tuple per item in the order of items.
+# With an executor the calls run on its threads instead of a new pool of parallel threads.
+def map_parallel(function, items, parallel=1, executor=None):
+    def call(item):
+        try:
+            return function(item), None
+        except Exception as ex:
+            return None, ex
+
+    if executor is not None:
+        return list(executor.map(call, items))
+    with ThreadPoolExecutor(max_workers=max(1, parallel or 1), thread_name_prefix="map") as executor:
+        return list(executor.map(call, items))
+
+def log_summary(title, results):
+    succeeded = len([result for result in results if result.status == JobResult.SUCCEEDED])
+    logging.info(f"{title}: {succeeded} of {len(results)} succeeded")
+    for result in results:
+        error = f" ({result.error})" if result.error else ""
+        logging.info(f"  {result.name:<50} {result.status:<10} {result.duration:8.2f}s{error}")
@@ -1,64 +1,126 @@
 import logging
+import time
 
-from deployer.errors import EventPortalException
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from deployer.errors import BrokerException
 from deployer.event_portal import EventPortal
-from deployer.event_portal import get_path_expr
 from deployer.broker import Broker
-from deployer.utils import store_preview
-from deployer.enums import Action
+from deployer.session import session_options
+from deployer.scheduler import Job, JobResult, Task, run_pipeline, run_graph, shared_object_keys, log_summary
+from deployer.utils import store_preview, preview_store
+from deployer.enums import Action, Policy
+from deployer.plan import Plan
+from deployer.preview import requested_objects
+from deployer.model import ClientUsername, AuthorizationGroup, frozen
+from deployer.state import DEFAULT_TTL
+from deployer.fingerprint import load_fingerprints, deployment_fingerprint
+from deployer.metrics import phase
+from deployer.journal import Journal, journal_path
 
 def semp(parameters):
     logging.debug(f"Running semp with parameters { parameters }")
     ep = parameters["eventPortal"]
-    if not isinstance(ep, EventPortal):
+    from_store = parameters.get("from_store", False)
+    if not from_store and not isinstance(ep, EventPortal):
         raise TypeError("Expect an EventPortal instance")
-    # get the preview from src
-    broker_id = parameters.get("broker_ids")[0]
     action = parameters["action"]
     target = parameters["target"]
     environment_name = target.get("environment")
-    broker_configs = target["brokers"]
-    for domain in parameters.get("target").get("domains"):
-        domain_name = domain["domainName"]
-        applications = domain["applications"]
-        for application in [app for app in applications if app["versionId"]]:
-            application_name = application["name"]
-            version_name = application["version"]
-            version_id = application["versionId"]
-            state = application["state"]
-            logging.info(f"{action.capitalize()} application: [{ application_name }] with version [{ version_name }], id [{ version_id }] and state [{ state }] in domain [{domain_name}]")
-            try:
-                preview = ep.preview_application_deployment(version_id, Action.DEPLOY.value, broker_id)
-                logging.debug(f"preview = {preview}")
-                if action in [Action.SAVE.value]:
-                    store_preview(preview, environment_name, domain_name, application_name, version_name, state)
-                if action in [Action.DEPLOY.value, Action.UNDEPLOY.value]:
-                    execute(application, action, broker_configs, preview, application_name)
-            except EventPortalException as ex:
-                logging.error(f"semp_deploy::EventPortalException::{ex}")
-            except Exception as ex:
-                logging.error(f"semp_deploy::Exception::{ex}")
-
-def get_client_type(data):
-    client_types= [
-        "solaceClientUsername",
-        "solaceClientCertificateUsername",
-        "solaceAuthorizationGroup"
-    ]
-    client =  [item for  item in data if item['type'] in client_types]
-    return client[0]['type'] if client else None
+    parallel = parameters.get("parallel") or 1
+    applications = []
+    for domain in target.get("domains"):
+        for application in [app for app in domain["applications"] if app.get("versionId") or app.get("preview")]:
+            applications.append((domain["domainName"], application))
+    writes = action in [Action.DEPLOY.value, Action.UNDEPLOY.value]
+    journal = Journal(journal_path(environment_name), preview_store, parameters.get("resume", False)) if writes and applications else None
+    results = None
+    try:
+        if from_store:
+            fetch = lambda item: item[1]["preview"]
+        else:
+            # get the preview from src
+            broker_id = parameters["mesh"].broker_ids[0] if applications else None
+            fetch = lambda item: get_preview(ep, journal, item[1]["versionId"], broker_id)
+        brokers = create_brokers(target["brokers"])
+        fingerprints = load_fingerprints() if writes else None
+
+        def create_job(item, preview, error):
+            domain_name, application = item
+            # the preview is parsed once, for the scheduling keys and for all brokers
+            objects = requested_objects(preview)
+            task = partial(semp_application, parameters, brokers, fingerprints, journal, domain_name, application, preview, objects, error)
+            return Job(f"{domain_name}/{application['name']}", task, shared_object_keys(objects, application.get("user")))
+
+        try:
+            # The previews of the next applications are requested while the broker work of the current ones runs
+            with phase("semp.applications"):
+                results = run_pipeline(applications, fetch, create_job, parallel, parameters.get("prefetch"))
+            log_summary(f"{action.capitalize()} on environment {environment_name}", results)
+            return results
+        finally:
+            for broker in brokers:
+                broker.close()
+    finally:
+        if journal:
+            # results is None when the run stopped before all applications were handled
+            journal.close(completed=results is not None and all(result.status == JobResult.SUCCEEDED for result in results))
+
+# A resumed run takes the previews it already requested from the journal
+def get_preview(ep, journal, version_id, broker_id):
+    preview = journal.get_preview(version_id, broker_id) if journal else None
+    if preview is None:
+        with phase("preview"):
+            preview = ep.preview_application_deployment(version_id, Action.DEPLOY.value, broker_id)
+        if journal:
+            journal.put_preview(version_id, broker_id, preview)
+    return preview
+
+def semp_application(parameters, brokers, fingerprints, journal, domain_name, application, preview, objects, error):
+    with phase("application", f"{domain_name}/{application['name']}"):
+        handle_application(parameters, brokers, fingerprints, journal, domain_name, application, preview, objects, error)
+
+def handle_application(parameters, brokers, fingerprints, journal, domain_name, application, preview, objects, error):
+    action = parameters["action"]
+    environment_name = parameters["target"].get("environment")
+    application_name = application["name"]
+    version_name = application["version"]
+    version_id = application.get("versionId", "store")
+    state = application["state"]
+    logging.info(f"{action.capitalize()} application: [{ application_name }] with version [{ version_name }], id [{ version_id }] and state [{ state }] in domain [{domain_name}]")
+    if error:
+        raise error
+    logging.debug(f"preview = {preview}")
+    if action in [Action.SAVE.value]:
+        store_preview(preview, environment_name, domain_name, application_name, version_name, state)
+    if action in [Action.DEPLOY.value, Action.UNDEPLOY.value, Action.PLAN.value]:
+        execute(application, action, brokers, preview, application_name, parameters.get("policy"), parameters.get("broker_parallel"),
+                fingerprints, parameters.get("force", False), journal, objects)
+
+# Brokers are created once per run, so their connection pools are reused by all applications
+def create_brokers(broker_cfgs):
+    brokers = []
+    for cfg in broker_cfgs:
+        broker_name = cfg["name"]
+        base_url = cfg["url"]
+        msg_vpn_name = cfg["msgVpnName"]
+        user = cfg["user"]
+        pwd = cfg["password"]
+        snapshot_ttl = cfg.get("snapshotTtl", DEFAULT_TTL)
+        brokers.append(Broker(broker_name, base_url, user, pwd, msg_vpn_name, snapshot_ttl=snapshot_ttl, **session_options(cfg)))
+    return brokers
 
 def deploy_client_type(broker, type, user, acl_profile, app_name):
-    payload = {
+    attributes = frozen({
         "enabled": True
-    }
+    })
     match type:
         case "solaceClientUsername":
-            broker.create_client_username(payload, acl_profile, app_name, user)
+            broker.create_client_username(ClientUsername(attributes=attributes), acl_profile, app_name, user)
         case "solaceClientCertificateUsername":
-            broker.create_client_username(payload, acl_profile, app_name, user)
+            broker.create_client_username(ClientUsername(attributes=attributes), acl_profile, app_name, user)
         case "solaceAuthorizationGroup":
-            broker.create_authorization_group(payload, acl_profile, app_name,user)
+            broker.create_authorization_group(AuthorizationGroup(attributes=attributes), acl_profile, app_name,user)
         case _:
             logging.error(f"Unknown target_client_type: {type}")
 
@@ -73,62 +135,184 @@ def undeploy_client_type(broker, type, user, app_name):
         case _:
             logging.error(f"Unknown target_client_type: {type}")
 
-def execute(config, action, broker_cfgs, preview, app_name):
-    logging.debug(f"Deploying { config } to brokers { broker_cfgs }")
+def execute(config, action, brokers, preview, app_name, policy=Policy.FAIL_FAST.value, max_workers=None, fingerprints=None, force=False, journal=None,
+            objects=None):
+    logging.debug(f"Deploying { config } to brokers { [broker.name for broker in brokers] }")
     client = config.get("user")
     target_client_type = client.get("type") if client else None
-    selector = 'requested'# if action == 'deploy' else 'existing'
-    source_client_type = get_client_type(preview['data'][selector])
+    if objects is None:
+        objects = requested_objects(preview)
+    source_client_type = objects.client_type
     logging.debug(f"SourceClientType={source_client_type}\nTargetClientType={target_client_type}")
-    solace_client_usernames = get_path_expr(preview, f"$..{selector}[?(@.type=='solaceClientUsername')].value")
-    solace_client_certificate_usernames = get_path_expr(preview, f"$..{selector}[?( @.type=='solaceClientCertificateUsername')].value")
-    solace_authorization_groups =  get_path_expr(preview, f"$..{selector}[?(@.type=='solaceAuthorizationGroup')].value")
-    solace_acl_profiles = get_path_expr(preview, f"$..{selector}[?(@.type=='solaceAcl')].value")
-    solace_queues = get_path_expr(preview, f"$..{selector}[?(@.type=='solaceQueue')].value")
-    solace_rdps = get_path_expr(preview, f"$..{selector}[?(@.type=='solaceRestDeliveryPoint')].value")
-    solace_rdp_queue_bindings = get_path_expr(preview, f"$..{selector}[?(@.type=='solaceRestDeliveryPointQueueBinding')].value")
-    for cfg in broker_cfgs:
-        broker_name = cfg["name"]
-        base_url = cfg["url"]
-        msg_vpn_name = cfg["msgVpnName"]
-        user = cfg["user"]
-        pwd = cfg["password"]
-        broker = Broker(broker_name, base_url, user, pwd, msg_vpn_name)
-        if action == Action.DEPLOY.value:
-            if solace_acl_profiles:
-                broker.create_acl_profile( solace_acl_profiles[0], app_name) # always just 1 profile
-            if source_client_type == target_client_type:
-                if solace_client_usernames:
-                    broker.create_client_username(solace_client_usernames[0], solace_acl_profiles[0].get("aclProfile"), app_name, config.get("user"))# possible multi?
-                if solace_client_certificate_usernames:
-                    broker.create_client_username(solace_client_certificate_usernames[0], solace_acl_profiles[0].get("aclProfile"), app_name, config.get("user"))# possible multi?
-                if solace_authorization_groups:
-                    broker.create_authorization_group(solace_authorization_groups[0], solace_acl_profiles[0].get("aclProfile"), app_name, config.get("user"))
-            else:
-                logging.debug(f"Switching from {source_client_type} to {target_client_type}")
-                deploy_client_type(broker, target_client_type, config.get("user"),solace_acl_profiles[0].get("aclProfile"), app_name)
-            if solace_queues:
-                broker.create_queues(solace_queues, config.get("user"))
-            if solace_rdps:
-                broker.create_rdps(solace_rdps)
-            if solace_rdp_queue_bindings:
-                broker.create_rdp_queue_bindings(solace_rdp_queue_bindings)
-        else:
-            if solace_rdp_queue_bindings:
-                broker.delete_rdp_queue_bindings(solace_rdp_queue_bindings)
-            if solace_rdps:
-                broker.delete_rdps(solace_rdps)
-            if solace_queues:
-                broker.delete_queues(solace_queues)
-            if source_client_type == target_client_type:
-                if solace_client_usernames:
-                    broker.delete_client_username(solace_client_usernames[0], app_name, config.get("user"))
-                if solace_client_certificate_usernames:
-                    broker.delete_client_username(solace_client_certificate_usernames[0], app_name, config.get("user"))
-                if solace_authorization_groups:
-                    broker.delete_authorization_group(solace_authorization_groups[0], app_name)
-            else:
-                undeploy_client_type(broker, target_client_type, config.get("user"), app_name)
-            if solace_acl_profiles:
-                broker.delete_acl_profile(solace_acl_profiles[0], app_name)
+    version_name = config.get("version")
+    fingerprint = deployment_fingerprint(preview, client) if fingerprints is not None and action == Action.DEPLOY.value else None
+    skipped = []
+    if fingerprint and not force:
+        skipped = [broker for broker in brokers if fingerprints.matches(broker, app_name, version_name, fingerprint)]
+        for broker in skipped:
+            logging.info(f"Application {app_name} version {version_name} is unchanged on broker {broker.name} since its last deploy, skipped (use --force to deploy anyway)")
+    checkpoints = {}
+    if journal:
+        journal_fingerprint = deployment_fingerprint(preview, client)
+        checkpoints = {broker.name: journal.checkpoint(broker, app_name, action, journal_fingerprint) for broker in brokers}
+        completed = [broker for broker in brokers if broker not in skipped and checkpoints[broker.name].done()]
+        for broker in completed:
+            logging.info(f"{action.capitalize()} of application {app_name} on broker {broker.name} was completed by a previous run, skipped")
+        skipped += completed
+
+    def task(broker):
+        checkpoint = checkpoints.get(broker.name)
+        # the objects are immutable, all brokers share them
+        with phase("execute"):
+            execute_on_broker(broker, config, action, objects, source_client_type, target_client_type, app_name, checkpoint)
+        if fingerprint:
+            fingerprints.record(broker, app_name, version_name, fingerprint)
+        elif fingerprints is not None and action == Action.UNDEPLOY.value:
+            fingerprints.forget(broker, app_name)
+        if checkpoint:
+            checkpoint.record()
+
+    executed = {result.broker: result for result in fan_out([broker for broker in brokers if broker not in skipped], task, policy, max_workers)}
+    results = [executed.get(broker.name) or BrokerResult(broker.name, BrokerResult.SKIPPED) for broker in brokers]
+    log_broker_results(app_name, action, results)
+    failed = [result for result in results if result.status == BrokerResult.FAILED]
+    if failed:
+        raise BrokerException(23, "BROKER::ExecutionFailed", f"{action} of {app_name} failed on brokers {[result.broker for result in failed]}")
+    return results
+
+class BrokerResult:
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    SKIPPED = "skipped"
+
+    def __init__(self, broker, status, duration=0.0, error=None):
+        self.broker = broker
+        self.status = status
+        self.duration = duration
+        self.error = error
+
+def fan_out(brokers, task, policy=Policy.FAIL_FAST.value, max_workers=None):
+    max_workers = max_workers if max_workers else len(brokers)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="broker") as executor:
+        futures = {executor.submit(timed, task, broker): broker for broker in brokers}
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            broker = futures[future]
+            duration, error = future.result()
+            if error is None:
+                results[broker.name] = BrokerResult(broker.name, BrokerResult.SUCCEEDED, duration)
+                continue
+            results[broker.name] = BrokerResult(broker.name, BrokerResult.FAILED, duration, error)
+            if policy == Policy.FAIL_FAST.value:
+                logging.error(f"Execution on broker {broker.name} failed, cancelling the remaining brokers")
+                for pending in futures:
+                    pending.cancel()
+    for future, broker in futures.items():
+        if future.cancelled():
+            results[broker.name] = BrokerResult(broker.name, BrokerResult.CANCELLED)
+    return [results[broker.name] for broker in brokers]
+
+def timed(task, broker):
+    start = time.perf_counter()
+    try:
+        task(broker)
+        return time.perf_counter() - start, None
+    except Exception as ex:
+        logging.error(f"Execution on broker {broker.name} failed: {ex}")
+        return time.perf_counter() - start, ex
+
+def log_broker_results(app_name, action, results):
+    logging.info(f"Result of {action} for application {app_name}:")
+    for result in results:
+        error = f" ({result.error})" if result.error else ""
+        logging.info(f"  {result.broker:<30} {result.status:<10} {result.duration:8.2f}s{error}")
+
+# The plan action runs the deploy as a dry run: the broker state is read but only the needed writes are recorded
+def execute_on_broker(broker, config, action, objects, source_client_type, target_client_type, app_name, checkpoint=None):
+    plan = Plan(broker.name, app_name)
+    dry_run = action == Action.PLAN.value
+    broker = broker.planned(plan, dry_run)
+    apply(broker, config, Action.DEPLOY.value if dry_run else action, objects, source_client_type, target_client_type, app_name, checkpoint)
+    plan.log(verbose=dry_run)
+    return plan
+
+# The objects are written as a dependency graph, independent objects (all queues, all RDPs) are written concurrently
+def apply(broker, config, action, objects, source_client_type, target_client_type, app_name, checkpoint=None):
+    if action == Action.DEPLOY.value:
+        tasks = deploy_tasks(broker, config.get("user"), objects, source_client_type, target_client_type, app_name)
+    else:
+        tasks = undeploy_tasks(broker, config.get("user"), objects, source_client_type, target_client_type, app_name)
+    if checkpoint:
+        tasks = checkpoint.wrap(tasks)
+    run_graph(tasks, broker.max_in_flight)
+
+# Client usernames and authorization groups need their ACL profile, queues their owner and queue bindings their RDP and queue
+def deploy_tasks(broker, user, objects, source_client_type, target_client_type, app_name):
+    tasks = []
+    acl_profile = objects.acl_profiles[0] if objects.acl_profiles else None
+    if objects.acl_profiles:
+        tasks.append(Task("aclProfile", partial(broker.create_acl_profile, objects.acl_profiles[0], app_name))) # always just 1 profile
+    acl = [task.name for task in tasks]
+    if source_client_type == target_client_type:
+        if objects.client_usernames:
+            tasks.append(Task("clientUsername", partial(broker.create_client_username, objects.client_usernames[0], acl_profile, app_name, user), acl)) # possible multi?
+        if objects.client_certificate_usernames:
+            tasks.append(Task("clientCertificateUsername", partial(broker.create_client_username, objects.client_certificate_usernames[0], acl_profile, app_name, user), acl)) # possible multi?
+        if objects.authorization_groups:
+            tasks.append(Task("authorizationGroup", partial(broker.create_authorization_group, objects.authorization_groups[0], acl_profile, app_name, user), acl))
+    else:
+        logging.debug(f"Switching from {source_client_type} to {target_client_type}")
+        tasks.append(Task("client", partial(deploy_client_type, broker, target_client_type, user, acl_profile, app_name), acl))
+    clients = [task.name for task in tasks if task.name not in acl]
+    for queue in objects.queues:
+        tasks.append(Task(queue_task(queue), partial(broker.create_queue, queue, user), clients))
+    for rdp in objects.rdps:
+        tasks.append(Task(rdp_task(rdp), partial(broker.create_rdp, rdp)))
+    names = {task.name for task in tasks}
+    for queue_binding in objects.rdp_queue_bindings:
+        depends_on = [name for name in binding_dependencies(queue_binding) if name in names]
+        tasks.append(Task(binding_task(queue_binding), partial(broker.create_rdp_queue_binding, queue_binding), depends_on))
+    return tasks
+
+# The reverse of deploy_tasks: objects are deleted after everything that refers to them
+def undeploy_tasks(broker, user, objects, source_client_type, target_client_type, app_name):
+    tasks = [Task(binding_task(queue_binding), partial(broker.delete_rdp_queue_binding, queue_binding)) for queue_binding in objects.rdp_queue_bindings]
+    dependents = {}
+    for queue_binding in objects.rdp_queue_bindings:
+        for name in binding_dependencies(queue_binding):
+            dependents.setdefault(name, []).append(binding_task(queue_binding))
+    for rdp in objects.rdps:
+        tasks.append(Task(rdp_task(rdp), partial(broker.delete_rdp, rdp), dependents.get(rdp_task(rdp))))
+    for queue in objects.queues:
+        tasks.append(Task(queue_task(queue), partial(broker.delete_queue, queue), dependents.get(queue_task(queue))))
+    queues = [queue_task(queue) for queue in objects.queues]
+    clients = []
+    if source_client_type == target_client_type:
+        if objects.client_usernames:
+            clients.append(Task("clientUsername", partial(broker.delete_client_username, objects.client_usernames[0], app_name, user), queues))
+        if objects.client_certificate_usernames:
+            clients.append(Task("clientCertificateUsername", partial(broker.delete_client_username, objects.client_certificate_usernames[0], app_name, user), queues))
+        if objects.authorization_groups:
+            clients.append(Task("authorizationGroup", partial(broker.delete_authorization_group, objects.authorization_groups[0], app_name), queues))
+    else:
+        clients.append(Task("client", partial(undeploy_client_type, broker, target_client_type, user, app_name), queues))
+    tasks.extend(clients)
+    if objects.acl_profiles:
+        tasks.append(Task("aclProfile", partial(broker.delete_acl_profile, objects.acl_profiles[0], app_name), [client.name for client in clients]))
+    return tasks
+
+def queue_task(queue):
+    return f"queue:{ queue.name }"
+
+def rdp_task(rdp):
+    return f"rdp:{ rdp.name }"
+
+def binding_task(queue_binding):
+    return f"queueBinding:{ queue_binding.rdp_name }/{ queue_binding.name }"
 
+# A queue binding is named after the queue it binds
+def binding_dependencies(queue_binding):
+    return [f"rdp:{ queue_binding.rdp_name }", f"queue:{ queue_binding.name }"]
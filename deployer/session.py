@@ -0,0 +1,85 @@
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from deployer.rate_limit import THROTTLE_STATUS_CODES, parse_retry_after, backoff
+
+import time
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (10, 60)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+
+# Only idempotent methods are retried, a failed POST could already have been applied.
+# A 429 is rejected before the request is handled, so it is retried for all methods.
+RETRY_METHODS = ["GET", "PUT", "PATCH", "DELETE"]
+RETRY_STATUS_CODES = [429, 502, 503, 504]
+
+def should_retry(method, status_code, attempt, retries):
+    if attempt >= retries or status_code not in RETRY_STATUS_CODES:
+        return False
+    return method in RETRY_METHODS or status_code == 429
+
+# Retries on the status codes of RETRY_STATUS_CODES with jittered backoff and sends every attempt through the rate limiter
+# of the host, which is told about throttled responses. Connection errors are retried by the urllib3 Retry.
+class RetryAdapter(HTTPAdapter):
+    def __init__(self, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, rate_limiter=None, **kwargs):
+        super().__init__(**kwargs)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = rate_limiter
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            response = super().send(request, **kwargs)
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if self.rate_limiter:
+                if response.status_code in THROTTLE_STATUS_CODES:
+                    self.rate_limiter.throttled(retry_after)
+                else:
+                    self.rate_limiter.succeeded()
+            if not should_retry(request.method, response.status_code, attempt, self.retries):
+                connection_retries = getattr(response.raw, "retries", None)
+                response.retries = attempt + (len(connection_retries.history) if connection_retries else 0)
+                return response
+            response.close()
+            time.sleep(backoff(attempt, self.backoff_factor, retry_after))
+            attempt += 1
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, rate_limiter=None):
+    # the urllib3 Retry only handles connection errors, retrying a status as well would multiply the attempts of the RetryAdapter
+    retry = Retry(
+        total=retries,
+        status=0,
+        status_forcelist=[],
+        respect_retry_after_header=False,
+        backoff_factor=backoff_factor,
+        allowed_methods=RETRY_METHODS,
+        raise_on_status=False
+    )
+    adapter = RetryAdapter(retries, backoff_factor, rate_limiter, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_timeout(timeout):
+    # a single number is used for both the connect and read timeout, a list as [connect, read]
+    if timeout is None:
+        return DEFAULT_TIMEOUT
+    return tuple(timeout) if isinstance(timeout, list) else timeout
+
+# Maps the optional connection settings of a broker or eventPortal config file entry to keyword arguments
+def session_options(config):
+    options = {
+        "pool_size": config.get("poolSize"),
+        "timeout": config.get("timeout"),
+        "retries": config.get("retries"),
+        "backoff_factor": config.get("backoffFactor"),
+        "max_in_flight": config.get("maxInFlight"),
+        "rate_limit": config.get("rateLimit")
+    }
+    return {key: value for key, value in options.items() if value is not None}
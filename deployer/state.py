@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+
+DEFAULT_TTL = 300
+
+# Top level collections of a message VPN that are read in bulk, with the attribute that identifies an object
+COLLECTIONS = {
+    "clientProfiles": "clientProfileName",
+    "aclProfiles": "aclProfileName",
+    "clientUsernames": "clientUsername",
+    "authorizationGroups": "authorizationGroupName",
+    "queues": "queueName",
+    "restDeliveryPoints": "restDeliveryPointName"
+}
+
+# Snapshot of the message VPN of a broker, shared by all applications deployed in a run.
+# Every collection is read once with paged GETs, kept up to date with the writes of the broker and reloaded after ttl seconds.
+class VpnState:
+    def __init__(self, broker, ttl=DEFAULT_TTL):
+        self.broker = broker
+        self.ttl = ttl
+        self.collections = {}
+        self.fields = {}
+        self.loaded_at = {}
+        self.lock = threading.Lock()
+        self.load_locks = {collection: threading.Lock() for collection in COLLECTIONS}
+
+    @staticmethod
+    def collection_of(url):
+        # only urls of the form msgVpns/{msgVpnName}/{collection} are answered from the state
+        parts = url.split("/")
+        if len(parts) == 3 and parts[0] == "msgVpns" and parts[2] in COLLECTIONS:
+            return parts[2]
+        return None
+
+    def load(self, collection, fields=None):
+        key = COLLECTIONS[collection]
+        fields = set(fields) | {key} if fields else None
+        with self.lock:
+            loaded_fields = self.fields.get(collection)
+        if fields and loaded_fields is not None and collection in self.collections:
+            fields |= loaded_fields
+        select = ",".join(sorted(fields)) if fields else None
+        logging.debug(f"Load {collection} of messageVPN {self.broker.msg_vpn_name} on broker {self.broker.name} select={select}")
+        url = f"msgVpns/{ self.broker.msg_vpn_name }/{collection}"
+        items = {item[key]: item for item in self.broker.get_collection(url, select=select)}
+        with self.lock:
+            self.collections[collection] = items
+            self.fields[collection] = fields
+            self.loaded_at[collection] = time.monotonic()
+
+    def loaded(self, collection, fields=None):
+        with self.lock:
+            if collection not in self.collections:
+                return False
+            if self.ttl is not None and time.monotonic() - self.loaded_at[collection] > self.ttl:
+                return False
+            loaded_fields = self.fields.get(collection)
+            return loaded_fields is None or not fields or set(fields) <= loaded_fields
+
+    def get(self, collection, name, fields=None):
+        if not self.loaded(collection, fields):
+            # concurrent applications wait for a single load of the collection
+            with self.load_locks[collection]:
+                if not self.loaded(collection, fields):
+                    self.load(collection, fields)
+        with self.lock:
+            item = self.collections.get(collection, {}).get(name)
+            return dict(item) if item is not None else None
+
+    def exists(self, collection, name):
+        return self.get(collection, name, {COLLECTIONS[collection]}) is not None
+
+    def put(self, collection, name, attributes):
+        with self.lock:
+            if collection in self.collections:
+                self.collections[collection].setdefault(name, {}).update(attributes)
+
+    def remove(self, collection, name):
+        with self.lock:
+            if collection in self.collections:
+                self.collections[collection].pop(name, None)
+
+    def invalidate(self, collection=None):
+        with self.lock:
+            if collection:
+                self.collections.pop(collection, None)
+            else:
+                self.collections.clear()
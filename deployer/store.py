@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from pathlib import Path
+
+DEFAULT_STORE_DIR = "./store"
+
+# Content addressed store of deployment previews.
+# A preview is serialized compactly, gzipped and written once under the sha256 of its content, so identical previews
+# of several versions or environments share one blob. The index is a JSON lines file with one entry per stored
+# (environment, domain, application, version, state); it is appended to and the last entry of a key wins.
+class PreviewStore:
+    def __init__(self, directory=DEFAULT_STORE_DIR):
+        self.directory = Path(directory)
+        self.index_path = self.directory / "index.jsonl"
+        self.entries = None
+        self.index_mtime = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def serialize(preview):
+        return json.dumps(preview, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def key(environment_name, domain_name, application_name, version_name, state):
+        return environment_name, domain_name, application_name, version_name, state
+
+    def blob_path(self, digest):
+        return self.directory / "blobs" / digest[:2] / f"{ digest }.json.gz"
+
+    # Only the legacy layout of older versions of the deployer, read when a preview is not in the index
+    def legacy_path(self, environment_name, domain_name, application_name, version_name, state):
+        return self.directory / environment_name / domain_name / application_name / version_name / f"preview-{ state }.json"
+
+    def load_index(self):
+        try:
+            mtime = self.index_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        with self.lock:
+            if self.entries is not None and mtime == self.index_mtime:
+                return self.entries
+            entries = {}
+            if mtime is not None:
+                with self.index_path.open("r", encoding="utf-8") as file:
+                    for line in file:
+                        if not line.strip():
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            logging.warning(f"Skip corrupt line in preview index { self.index_path }")
+                            continue
+                        entries[self.key(entry["environment"], entry["domain"], entry["application"], entry["version"], entry["state"])] = entry
+            self.entries = entries
+            self.index_mtime = mtime
+            return entries
+
+    def lookup(self, environment_name, domain_name, application_name, version_name, state):
+        return self.load_index().get(self.key(environment_name, domain_name, application_name, version_name, state))
+
+    def exists(self, environment_name, domain_name, application_name, version_name, state):
+        if self.lookup(environment_name, domain_name, application_name, version_name, state):
+            return True
+        return self.legacy_path(environment_name, domain_name, application_name, version_name, state).is_file()
+
+    def get(self, environment_name, domain_name, application_name, version_name, state):
+        entry = self.lookup(environment_name, domain_name, application_name, version_name, state)
+        if entry:
+            return self.get_blob(entry["hash"])
+        file_path = self.legacy_path(environment_name, domain_name, application_name, version_name, state)
+        if file_path.is_file():
+            with file_path.open("r", encoding="utf-8") as file:
+                return json.load(file)
+        raise Exception(f"Preview {environment_name}/{domain_name}/{application_name}/{version_name}/{state} does not exist in {self.directory}")
+
+    # Returns the state of the most recently stored preview of a version, None when no preview is stored
+    def latest_state(self, environment_name, domain_name, application_name, version_name):
+        entries = [entry for key, entry in self.load_index().items() if key[:4] == (environment_name, domain_name, application_name, version_name)]
+        if entries:
+            return max(entries, key=lambda entry: entry["timestamp"])["state"]
+        directory = self.directory / environment_name / domain_name / application_name / version_name
+        files = sorted(directory.glob("preview-*.json"), key=lambda file: file.stat().st_mtime) if directory.is_dir() else []
+        return files[-1].stem.removeprefix("preview-") if files else None
+
+    def get_blob(self, digest):
+        blob_path = self.blob_path(digest)
+        with gzip.open(blob_path, "rb") as file:
+            data = file.read()
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise Exception(f"Blob {blob_path} does not match its hash")
+        return json.loads(data)
+
+    # Writes the preview as a blob without an index entry and returns its hash and size
+    def put_blob(self, preview):
+        data = self.serialize(preview)
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self.blob_path(digest)
+        if not blob_path.exists():
+            os.makedirs(blob_path.parent, exist_ok=True)
+            # write and rename, so a concurrent job never reads a partial blob
+            temp_path = blob_path.with_name(f"{ blob_path.name }.{ os.getpid() }.{ threading.get_ident() }.tmp")
+            with gzip.open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, blob_path)
+        return digest, len(data)
+
+    def put(self, preview, environment_name, domain_name, application_name, version_name, state):
+        digest, size = self.put_blob(preview)
+        entry = {
+            "environment": environment_name,
+            "domain": domain_name,
+            "application": application_name,
+            "version": version_name,
+            "state": state,
+            "hash": digest,
+            "size": size,
+            "timestamp": time.time()
+        }
+        self.load_index()
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with self.index_path.open("a", encoding="utf-8") as file:
+                file.write(json.dumps(entry) + "\n")
+            self.entries[self.key(environment_name, domain_name, application_name, version_name, state)] = entry
+            self.index_mtime = self.index_path.stat().st_mtime_ns
+        return digest
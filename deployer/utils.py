@@ -5,7 +5,7 @@ import logging
 import json
 
 from datetime import date
-from pathlib import Path
+from deployer.store import PreviewStore
 
 class ConfigLoader:
     def __init__(self, config_dir='config'):
@@ -23,24 +23,44 @@ class ConfigLoader:
         except json.JSONDecodeError:
             raise Exception(f"Error parsing the configuration file { config_file }!")
 
-def parse_arguments():
+def parse_arguments(args=None):
     parser = argparse.ArgumentParser(description="Process some parameters")
     parser.add_argument("--mode", type=str, help="deployment mode, one of [configPush, semp", default=None)
-    parser.add_argument("--target", type=str, help="target environment to execute the action on [one of tst,acc,prd]", default=None)
+    parser.add_argument("--target", type=str, help="target environment to execute the action on [one of tst,acc,prd], a comma separated list runs the environments concurrently", default=None)
     parser.add_argument("--appl", type=json.loads, required=False, help='JSON string of domainnames and their applications to handle. Example: \'[{{"domain1":["appl1","appl2"]}}]\'', default=None)
-    parser.add_argument("--action", type=str, help="Action, one of [deploy, undeploy]", default="deploy")
+    parser.add_argument("--action", type=str, help="Action, one of [deploy, undeploy, save, plan]", default="deploy")
     parser.add_argument("--log", type=str, help="Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)", default="INFO")
     parser.add_argument("--proxy", type=str, help="Enable usage of proxy ()true, false", default="false")
-    return parser.parse_args()
+    parser.add_argument("--force", action="store_true", help="Deploy applications that are unchanged since their last deploy")
+    parser.add_argument("--from-store", action="store_true", help="Deploy the previews stored by the save action instead of requesting them from the Event Portal")
+    parser.add_argument("--resume", action="store_true", help="Continue the deploy or undeploy of a previous run that did not complete, from its journal")
+    parser.add_argument("--parallel", type=int, help="Number of applications to handle concurrently", default=1)
+    parser.add_argument("--prefetch", type=int, help="Number of previews to request concurrently ahead of the applications being deployed, defaults to --parallel", default=None)
+    parser.add_argument("--broker-parallel", type=int, help="Number of brokers to execute on concurrently, defaults to all brokers", default=None)
+    parser.add_argument("--deployment-timeout", type=float, help="Seconds to wait for an Event Portal deployment to finish", default=None)
+    parser.add_argument("--policy", type=str, help="Policy when execution on a broker fails, one of [failFast, bestEffort]", default="failFast")
+    parser.add_argument("--profile", type=str, help="Write a profile of the HTTP calls and phases of the run to this file", default=None)
+    parser.add_argument("--profile-format", type=str, help="Format of the profile, one of [json, openmetrics]", default="json")
+    return parser.parse_args(args)
 
 def show_help(app_name='deploy'):
-    logging.info(f"{app_name} --mode=[deploymode] --target=[environment] [--appl=[applicationName]] [--action=[action]] [--log=[level]]")
+    logging.info(f"{app_name} --mode=[deploymode] --target=[environment] [--appl=[applicationName]] [--action=[action]] [--log=[level]] [--from-store] [--force] [--resume] [--parallel=[n]] [--prefetch=[n]] [--broker-parallel=[n]] [--deployment-timeout=[seconds]] [--policy=[policy]] [--profile=[file]] [--profile-format=[format]]")
     logging.info(f"     --mode: deployment mode, one of [configPush, semp] (required)")
-    logging.info(f"     --target: target environment to execute the action on [one of tst,acc,prd]")
+    logging.info(f"     --target: target environment to execute the action on [one of tst,acc,prd], or a comma separated list like tst,acc")
     logging.info(f'     --appl: JSON string of domainnames and their applications to handle. Example: \'[{{"domain1":["appl1","appl2"]}}]\'')
-    logging.info(f"     --action: Action, one of [deploy, undeploy] (optional, default 'deploy'")
+    logging.info(f"     --action: Action, one of [deploy, undeploy, save, plan] (optional, default 'deploy'")
     logging.info(f"     --log: Set the logging level [DEBUG, INFO, WARNING, ERROR, CRITICAL] (optional, default 'INFO'")
     logging.info(f"     --proxy: Enable usage of proxy [true, false] (optional, default 'false'")
+    logging.info(f"     --force: Deploy applications that are unchanged since their last deploy (optional, mode semp only)")
+    logging.info(f"     --from-store: Deploy the previews stored by the save action, without Event Portal calls (optional, mode semp only)")
+    logging.info(f"     --resume: Skip the steps completed by a previous run that did not complete, as recorded in its journal (optional, mode semp only)")
+    logging.info(f"     --parallel: Number of applications to handle concurrently (optional, default 1)")
+    logging.info(f"     --prefetch: Number of previews to request concurrently ahead of the applications being deployed (optional, mode semp only, default --parallel)")
+    logging.info(f"     --broker-parallel: Number of brokers to execute on concurrently (optional, default all brokers)")
+    logging.info(f"     --deployment-timeout: Seconds to wait for an Event Portal deployment to finish (optional, mode configPush only, default 600)")
+    logging.info(f"     --policy: Policy when execution on a broker fails, one of [failFast, bestEffort] (optional, default 'failFast'")
+    logging.info(f"     --profile: Write the latency per endpoint, call counts per object type and slowest applications of the run to this file (optional)")
+    logging.info(f"     --profile-format: Format of the profile, one of [json, openmetrics] (optional, default 'json'")
     exit(1)
 
 def setup_logging(log_level):
@@ -68,24 +88,20 @@ def load_config(file_path):
         logging.error(f"Error: Invalid JSON format in file '{file_path}'.")
         sys.exit(1)
 
+preview_store = PreviewStore()
+
 def preview_exists(environment_name, domain_name, application_name, version_name, state):
-    file_path = Path(f"./store/{environment_name}/{domain_name}/{application_name}/{version_name}/preview-{state}.json")
-    return file_path.exists()
+    return preview_store.exists(environment_name, domain_name, application_name, version_name, state)
 
 def get_preview(environment_name, domain_name, application_name, version_name, state):
-    file_path = Path(f"./store/{environment_name}/{domain_name}/{application_name}/{version_name}/preview-{state}.json")
-    if file_path.exists() and file_path.is_file():
-        with file_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
-    else:
-        raise Exception(f"File {file_path} does not exist or is not a file")
+    return preview_store.get(environment_name, domain_name, application_name, version_name, state)
+
+# Returns the state of the stored preview of an application version, the latest stored one when there are several states
+def find_preview(environment_name, domain_name, application_name, version_name):
+    return preview_store.latest_state(environment_name, domain_name, application_name, version_name)
 
 def store_preview(preview, environment_name, domain_name, application_name, version_name, state):
-    logging.info(f"Store preview for { environment_name }/{ domain_name }/{ application_name }/{ version_name }/preview-{ state }.json")
-    file_path = f"./store/{ environment_name }/{ domain_name }/{ application_name }/{ version_name }/preview-{ state }.json"
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w') as file:
-        json.dump(preview, file, indent=2)
+    logging.info(f"Store preview for { environment_name }/{ domain_name }/{ application_name }/{ version_name }/{ state }")
+    preview_store.put(preview, environment_name, domain_name, application_name, version_name, state)
 
 
@@ -0,0 +1,16 @@
+import pytest
+
+from deployer.benchmark import write_configs
+from deployer.mock_server import MockSolace
+
+@pytest.fixture
+def mock():
+    with MockSolace(3) as mock:
+        yield mock
+
+# A working directory with the config files of the mock, the store (previews, fingerprints, journal) is written below it
+@pytest.fixture
+def workdir(tmp_path, monkeypatch, mock):
+    write_configs(tmp_path, mock, len(mock.applications))
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,181 @@
+import asyncio
+import threading
+
+import pytest
+
+from deployer.broker import Broker
+from deployer.errors import BrokerException
+from deployer.mock_server import MockSolace
+from deployer.scheduler import Task, run_graph
+
+QUEUES = "msgVpns/vpn/queues"
+SUBSCRIPTIONS = "msgVpns/vpn/queues/q/subscriptions"
+
+def broker_of(mock):
+    return Broker("mock", mock.semp_url, "admin", "admin", "vpn", backoff_factor=0.01)
+
+def add_subscriptions(broker, count):
+    broker.api("POST", QUEUES, json={"queueName": "q"})
+    for index in range(count):
+        broker.api("POST", SUBSCRIPTIONS, json={"subscriptionTopic": f"t/{index}"})
+
+def test_get_collection_halves_a_page_too_large_for_the_broker():
+    with MockSolace(1, max_page_size=30) as mock:
+        broker = broker_of(mock)
+        add_subscriptions(broker, 250)
+        mock.reset_counts()
+        assert broker.get_queue_subscription_topics("q") == [f"t/{index}" for index in range(250)]
+        # 100 and 50 objects are too large, the 250 subscriptions are read in pages of 25
+        assert mock.counts[("semp", "GET")] == 2 + 10
+
+def test_get_collection_raises_when_a_later_page_fails():
+    with MockSolace(1) as mock:
+        broker = broker_of(mock)
+        add_subscriptions(broker, 30)
+        pages = broker.get_collection(SUBSCRIPTIONS, count=10)
+        next(pages)
+        broker.api("DELETE", f"{QUEUES}/q")
+        with pytest.raises(BrokerException, match="PagingError"):
+            list(pages)
+
+def test_get_collection_of_a_missing_object_is_empty():
+    with MockSolace(1) as mock:
+        assert broker_of(mock).get_queue_subscription_topics("missing") == []
+
+def test_get_collection_raises_when_the_first_page_fails():
+    with MockSolace(1) as mock:
+        # the mock rejects endpoints outside msgVpns with INVALID_PARAMETER
+        with pytest.raises(BrokerException, match="PagingError"):
+            list(broker_of(mock).get_collection("about/api"))
+
+def test_async_get_collection_raises_when_the_first_page_fails():
+    pytest.importorskip("aiohttp")
+    from deployer.async_broker import AsyncBroker
+
+    async def read(url):
+        broker = AsyncBroker("mock", url, "admin", "admin", "vpn")
+        try:
+            return [item async for item in broker.get_collection("about/api")]
+        finally:
+            await broker.close()
+
+    with MockSolace(1) as mock:
+        with pytest.raises(BrokerException, match="PagingError"):
+            asyncio.run(read(mock.semp_url))
+
+def test_async_get_collection_halves_a_page_too_large_for_the_broker():
+    pytest.importorskip("aiohttp")
+    from deployer.async_broker import AsyncBroker
+
+    async def topics(url):
+        broker = AsyncBroker("mock", url, "admin", "admin", "vpn")
+        try:
+            return await broker.get_queue_subscription_topics("q")
+        finally:
+            await broker.close()
+
+    with MockSolace(1, max_page_size=30) as mock:
+        add_subscriptions(broker_of(mock), 100)
+        assert asyncio.run(topics(mock.semp_url)) == [f"t/{index}" for index in range(100)]
+
+def test_rejected_create_raises():
+    with MockSolace(1, rejected=["queues"]) as mock:
+        with pytest.raises(BrokerException, match="WriteFailed"):
+            broker_of(mock).upsert("queue", QUEUES, "q", {"queueName": "q", "msgVpnName": "vpn"})
+
+def test_create_of_an_existing_object_succeeds():
+    with MockSolace(1) as mock:
+        broker = broker_of(mock)
+        broker.api("POST", QUEUES, json={"queueName": "q"})
+        broker.check_response(broker.api("POST", QUEUES, json={"queueName": "q"}), "queue", "q")
+        broker.check_response(broker.api("DELETE", f"{QUEUES}/missing"), "queue", "missing")
+
+def test_reconcile_writes_all_items_before_failing_the_list():
+    with MockSolace(1, rejected=["subscriptions"]) as mock:
+        broker = broker_of(mock)
+        broker.api("POST", QUEUES, json={"queueName": "q"})
+        mock.reset_counts()
+        with pytest.raises(BrokerException, match="3 subscriptions of q failed"):
+            broker.process_queue_subscription_topics("q", ["a", "b", "c"])
+        assert mock.counts[("semp", "POST")] == 3
+
+def test_reconcile_fails_a_partially_rejected_list_after_writing_the_rest():
+    with MockSolace(1) as mock:
+        broker = broker_of(mock)
+        add_subscriptions(broker, 0)
+
+        def create(topic):
+            if topic == "t/rejected":
+                raise BrokerException(24, "BROKER::WriteFailed", f"Creation of subscriptionTopic {topic} failed")
+            return broker.create_queue_subscription_topic("q", topic)
+
+        with pytest.raises(BrokerException) as raised:
+            broker.reconcile("subscriptions", "q", [], ["t/0", "t/rejected", "t/1", "t/2"], create, None)
+        assert raised.value.code == 24
+        assert "1 subscriptions of q failed" in raised.value.detail and "t/rejected" in raised.value.detail
+        assert sorted(broker.get_queue_subscription_topics("q")) == ["t/0", "t/1", "t/2"]
+
+def test_upsert_only_patches_changed_and_write_only_attributes():
+    with MockSolace(1) as mock:
+        broker = broker_of(mock)
+        payload = {"clientUsername": "user", "msgVpnName": "vpn", "enabled": True, "password": "secret"}
+        broker.upsert("clientUsername", "msgVpns/vpn/clientUsernames", "user", payload)
+        broker.state.collections.clear()
+        mock.reset_counts()
+        broker.upsert("clientUsername", "msgVpns/vpn/clientUsernames", "user", payload)
+        assert mock.counts[("semp", "PATCH")] == 1
+        assert mock.collections[("msgVpns", "vpn", "clientUsernames")]["user"]["password"] == "secret"
+
+def test_upsert_patches_an_object_created_after_the_state_was_read():
+    with MockSolace(1) as mock:
+        broker = broker_of(mock)
+        payload = {"queueName": "q", "msgVpnName": "vpn", "accessType": "exclusive"}
+        assert broker.get_current(QUEUES, "q", payload.keys()) is None
+        broker.api("POST", QUEUES, json={"queueName": "q", "accessType": "non-exclusive"})
+        broker.upsert("queue", QUEUES, "q", payload)
+        assert mock.collections[("msgVpns", "vpn", "queues")]["q"]["accessType"] == "exclusive"
+        assert broker.get_current(QUEUES, "q", ["accessType"])["accessType"] == "exclusive"
+
+def test_remove_deletes_an_object_created_after_the_state_was_read():
+    with MockSolace(1) as mock:
+        broker = broker_of(mock)
+        assert broker.get_current(QUEUES, "q") is None
+        broker.api("POST", QUEUES, json={"queueName": "q"})
+        broker.remove("queue", QUEUES, "q")
+        assert "q" not in mock.collections[("msgVpns", "vpn", "queues")]
+
+def test_async_upsert_patches_an_object_created_concurrently():
+    pytest.importorskip("aiohttp")
+    from deployer.async_broker import AsyncBroker
+
+    async def upsert(url):
+        broker = AsyncBroker("mock", url, "admin", "admin", "vpn")
+        try:
+            read = broker.get_current
+            misses = [None]
+
+            # the first read misses the queue, as if it was created right after
+            async def get_current(url, name, fields=None):
+                return misses.pop() if misses else await read(url, name, fields)
+
+            broker.get_current = get_current
+            await broker.upsert("queue", QUEUES, "q", {"queueName": "q", "msgVpnName": "vpn", "accessType": "exclusive"})
+        finally:
+            await broker.close()
+
+    with MockSolace(1) as mock:
+        broker_of(mock).api("POST", QUEUES, json={"queueName": "q", "accessType": "non-exclusive"})
+        asyncio.run(upsert(mock.semp_url))
+        assert mock.collections[("msgVpns", "vpn", "queues")]["q"]["accessType"] == "exclusive"
+
+def test_concurrent_lists_share_the_write_threads_of_the_broker():
+    with MockSolace(1) as mock:
+        broker = Broker("mock", mock.semp_url, "admin", "admin", "vpn", max_in_flight=2)
+        threads = set()
+
+        def create(item):
+            threads.add(threading.current_thread().name)
+
+        run_graph([Task(f"queue{index}", lambda: broker.reconcile("subscriptions", "q", [], range(10), create, None)) for index in range(4)], max_workers=4)
+        broker.close()
+        assert len(threads) <= 2 and all(thread.startswith("mock-write") for thread in threads)
@@ -0,0 +1,85 @@
+import json
+import os
+import time
+
+from deployer import deploy
+from deployer.deployments import Deployment, DeploymentPoller
+from deployer.event_portal import EventPortal
+from deployer.mock_server import MockSolace
+from deployer.scheduler import JobResult
+from deployer.utils import parse_arguments
+
+JOURNAL = os.path.join("store", "journal-tst.jsonl")
+FINGERPRINTS = os.path.join("store", "deployments.json")
+
+def run(*options):
+    arguments = parse_arguments(["--mode=semp", "--target=tst", "--parallel=2", "--log=WARNING", *options])
+    return deploy.run_target(arguments, "tst")
+
+def fingerprints():
+    if not os.path.exists(FINGERPRINTS):
+        return {}
+    with open(FINGERPRINTS, encoding="utf-8") as file:
+        return json.load(file)
+
+def test_deploy_records_fingerprints_and_removes_the_journal(workdir, mock):
+    results = run()
+    assert [result.status for result in results] == [JobResult.SUCCEEDED] * 3
+    assert len(fingerprints()) == 3
+    assert not os.path.exists(JOURNAL)
+
+def test_rejected_write_fails_the_application_without_fingerprint(workdir, mock):
+    mock.rejected.add("queues")
+    results = run()
+    assert [result.status for result in results] == [JobResult.FAILED] * 3
+    assert fingerprints() == {}
+    assert os.path.exists(JOURNAL)
+
+    mock.rejected.clear()
+    mock.reset_counts()
+    results = run("--resume")
+    assert [result.status for result in results] == [JobResult.SUCCEEDED] * 3
+    assert len(fingerprints()) == 3
+    assert not os.path.exists(JOURNAL)
+    assert set(mock.collections[("msgVpns", "benchmark", "queues")]) == {f"app{index}-queue" for index in range(3)}
+
+def test_redeploy_is_skipped_by_the_fingerprints(workdir, mock):
+    run()
+    mock.reset_counts()
+    results = run()
+    assert [result.status for result in results] == [JobResult.SUCCEEDED] * 3
+    assert mock.counts[("semp", "POST")] == mock.counts[("semp", "PATCH")] == 0
+
+def test_deployment_without_id_is_failed():
+    with MockSolace(1) as mock:
+        ep = EventPortal(mock.portal_url, "token")
+        poller = DeploymentPoller(ep, min_interval=0.01)
+        rejected = poller.add("app0", "broker-0", {"message": "Application version is not deployable"})
+        accepted = poller.add("app0", "broker-1", ep.create_application_deployment("version-0", "deploy", "broker-1"))
+        deployments = poller.wait()
+        ep.close()
+    assert deployments == [rejected, accepted]
+    assert rejected.status == Deployment.FAILED
+    assert rejected.message == "Application version is not deployable"
+    assert accepted.status == Deployment.SUCCEEDED
+
+def test_pending_deployment_times_out():
+    with MockSolace(1, deployment_delay=60) as mock:
+        ep = EventPortal(mock.portal_url, "token")
+        poller = DeploymentPoller(ep, min_interval=0.01, max_interval=0.05, timeout=0.2)
+        deployment = poller.add("app0", "broker-0", ep.create_application_deployment("version-0", "deploy", "broker-0"))
+        poller.wait()
+        ep.close()
+    assert deployment.status == Deployment.TIMED_OUT
+
+def test_wait_does_not_sleep_out_the_poll_interval():
+    with MockSolace(1, deployment_delay=0.2) as mock:
+        ep = EventPortal(mock.portal_url, "token")
+        poller = DeploymentPoller(ep, min_interval=5, max_interval=30)
+        deployment = poller.add("app0", "broker-0", ep.create_application_deployment("version-0", "deploy", "broker-0"))
+        time.sleep(0.5)
+        start = time.monotonic()
+        poller.wait()
+        ep.close()
+    assert deployment.status == Deployment.SUCCEEDED
+    assert time.monotonic() - start < 2
@@ -0,0 +1,24 @@
+import time
+
+from deployer.event_portal import EventPortal
+from deployer.mock_server import MockSolace
+
+def applications(ep):
+    return ep.paged(ep.design_api, "applications", params={"applicationDomainId": "domain-0"}, page_size=2)
+
+def test_paged_reads_all_pages():
+    with MockSolace(5) as mock:
+        ep = EventPortal(mock.portal_url, "token")
+        assert [application["name"] for application in applications(ep)] == [f"app{index}" for index in range(5)]
+        assert mock.requests("portal") == 3
+        ep.close()
+
+def test_paged_does_not_request_pages_after_an_early_exit():
+    with MockSolace(5) as mock:
+        ep = EventPortal(mock.portal_url, "token")
+        items = applications(ep)
+        assert next(items)["name"] == "app0"
+        time.sleep(0.2)
+        items.close()
+        assert mock.requests("portal") == 1
+        ep.close()
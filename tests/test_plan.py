@@ -0,0 +1,25 @@
+from deployer.plan import Plan, Change, diff, readable
+
+def test_diff_returns_changed_attributes_only():
+    current = {"queueName": "q", "maxMsgSpoolUsage": 100, "egressEnabled": True}
+    requested = {"queueName": "q", "maxMsgSpoolUsage": 200, "egressEnabled": True}
+    assert diff(current, requested) == {"maxMsgSpoolUsage": 200}
+
+def test_diff_ignores_attributes_the_broker_does_not_return():
+    assert diff({"queueName": "q"}, {"queueName": "q", "owner": "app"}) == {}
+
+def test_diff_always_writes_write_only_attributes():
+    current = {"clientUsername": "user", "enabled": True}
+    requested = {"clientUsername": "user", "enabled": True, "password": "secret"}
+    assert diff(current, requested) == {"password": "secret"}
+
+def test_readable_leaves_out_write_only_attributes():
+    assert readable(["clientUsername", "password", "authenticationHttpHeaderValue", "enabled"]) == ["clientUsername", "enabled"]
+
+def test_plan_counts_changes_per_operation():
+    plan = Plan("broker", "app")
+    plan.add("POST", "msgVpns/vpn/queues", {"queueName": "q"})
+    plan.add("PATCH", "msgVpns/vpn/queues/q", {"egressEnabled": True})
+    plan.add("DELETE", "msgVpns/vpn/queues/old")
+    plan.unchanged("msgVpns/vpn/aclProfiles/acl")
+    assert plan.counts() == {Change.CREATE: 1, Change.UPDATE: 1, Change.DELETE: 1, Change.UNCHANGED: 1}
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from deployer.scheduler import Job, JobResult, Task, run_jobs, run_pipeline, run_graph, map_parallel
+
+def fail(message):
+    raise RuntimeError(message)
+
+def test_run_jobs_reports_failed_jobs_and_runs_the_others():
+    done = []
+    jobs = [Job("a", lambda: done.append("a")), Job("b", lambda: fail("b failed")), Job("c", lambda: done.append("c"))]
+    results = run_jobs(jobs, parallel=2)
+    assert [result.status for result in results] == [JobResult.SUCCEEDED, JobResult.FAILED, JobResult.SUCCEEDED]
+    assert str(results[1].error) == "b failed"
+    assert sorted(done) == ["a", "c"]
+
+def test_run_jobs_serializes_jobs_sharing_a_key():
+    running = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def task(name):
+        with lock:
+            overlaps.extend(running)
+            running.add(name)
+        time.sleep(0.02)
+        with lock:
+            running.discard(name)
+
+    jobs = [Job(f"job{index}", lambda index=index: task(index), {("queue", "shared")}) for index in range(4)]
+    results = run_jobs(jobs, parallel=4)
+    assert all(result.status == JobResult.SUCCEEDED for result in results)
+    assert overlaps == []
+
+def test_run_pipeline_turns_fetch_errors_into_failed_jobs():
+    def fetch(item):
+        if item == 1:
+            raise RuntimeError("preview not found")
+        return item * 10
+
+    def create_job(item, value, error):
+        return Job(f"item{item}", (lambda: fail(str(error))) if error else (lambda: value))
+
+    results = run_pipeline([0, 1, 2], fetch, create_job, parallel=2)
+    assert [result.name for result in results] == ["item0", "item1", "item2"]
+    assert [result.status for result in results] == [JobResult.SUCCEEDED, JobResult.FAILED, JobResult.SUCCEEDED]
+    assert str(results[1].error) == "preview not found"
+
+def test_run_pipeline_keeps_the_order_of_jobs_sharing_a_key():
+    order = []
+    create_job = lambda item, value, error: Job(f"item{item}", lambda: order.append(item), {("client", "shared")})
+    run_pipeline(list(range(6)), lambda item: time.sleep(0.01 * (6 - item)), create_job, parallel=3, prefetch=3)
+    assert order == list(range(6))
+
+def test_run_graph_runs_dependencies_first():
+    order = []
+    tasks = [Task("bindings", lambda: order.append("bindings"), ["queue", "rdp"]),
+             Task("queue", lambda: order.append("queue")),
+             Task("rdp", lambda: order.append("rdp"))]
+    assert run_graph(tasks, max_workers=2) == {"queue", "rdp", "bindings"}
+    assert order[-1] == "bindings"
+
+def test_run_graph_raises_the_first_failure_and_skips_dependents():
+    ran = []
+    tasks = [Task("queue", lambda: fail("queue rejected")), Task("subscriptions", lambda: ran.append("subscriptions"), ["queue"])]
+    with pytest.raises(RuntimeError, match="queue rejected"):
+        run_graph(tasks, max_workers=2)
+    assert ran == []
+
+def test_run_graph_rejects_cycles_and_unknown_tasks():
+    with pytest.raises(ValueError, match="cyclic"):
+        run_graph([Task("a", lambda: None, ["b"]), Task("b", lambda: None, ["a"])])
+    with pytest.raises(ValueError, match="unknown"):
+        run_graph([Task("a", lambda: None, ["missing"])])
+
+def test_map_parallel_returns_value_or_exception_per_item():
+    results = map_parallel(lambda item: 10 // item, [1, 0, 5], parallel=3)
+    assert results[0] == (10, None) and results[2] == (2, None)
+    assert results[1][0] is None and isinstance(results[1][1], ZeroDivisionError)
@@ -0,0 +1,28 @@
+from deployer.mock_server import MockSolace
+from deployer.rate_limit import RateLimiter
+from deployer.session import create_session
+
+def test_failed_status_is_retried_by_the_retry_adapter_only():
+    with MockSolace(1, error_rate=1.0) as mock:
+        response = create_session(retries=2, backoff_factor=0.01).get(f"{mock.semp_url}/msgVpns")
+        assert response.status_code == 503
+        assert response.retries == 2
+        assert mock.requests() == 3
+
+def test_post_is_not_retried_after_a_server_error():
+    with MockSolace(1, error_rate=1.0) as mock:
+        response = create_session(retries=2, backoff_factor=0.01).post(f"{mock.semp_url}/msgVpns/vpn/queues", json={"queueName": "q"})
+        assert response.status_code == 503
+        assert mock.requests() == 1
+
+def test_throttled_requests_are_retried_and_lower_the_rate():
+    with MockSolace(1, rate_limit=3) as mock:
+        limiter = RateLimiter("mock")
+        session = create_session(retries=3, backoff_factor=0.01, rate_limiter=limiter)
+        responses = [session.get(f"{mock.semp_url}/msgVpns") for _ in range(8)]
+        assert [response.status_code for response in responses] == [200] * 8
+        assert mock.throttled > 0
+        # every 429 reached the rate limiter and was retried once, urllib3 did not retry them on its own
+        assert limiter.throttles == mock.throttled
+        assert mock.requests() == 8 + sum(response.retries for response in responses)
+        assert limiter.rate is not None
@@ -0,0 +1,99 @@
+import gzip
+
+import pytest
+
+from deployer.journal import Journal
+from deployer.scheduler import Task, run_graph
+from deployer.store import PreviewStore
+
+PREVIEW = {"data": {"requested": [{"type": "solaceQueue", "value": {"queueConfiguration": {"queueName": "q"}}}]}}
+
+class Broker:
+    url = "http://broker"
+    msg_vpn_name = "vpn"
+
+def test_preview_store_returns_the_stored_preview(tmp_path):
+    store = PreviewStore(tmp_path)
+    store.put(PREVIEW, "tst", "domain", "app", "0.1.0", "released")
+    assert store.exists("tst", "domain", "app", "0.1.0", "released")
+    assert not store.exists("tst", "domain", "app", "0.1.0", "draft")
+    assert PreviewStore(tmp_path).get("tst", "domain", "app", "0.1.0", "released") == PREVIEW
+    assert store.latest_state("tst", "domain", "app", "0.1.0") == "released"
+
+def test_preview_store_raises_for_a_missing_preview(tmp_path):
+    with pytest.raises(Exception, match="does not exist"):
+        PreviewStore(tmp_path).get("tst", "domain", "app", "0.1.0", "released")
+
+def test_preview_store_rejects_a_corrupt_blob(tmp_path):
+    store = PreviewStore(tmp_path)
+    digest = store.put(PREVIEW, "tst", "domain", "app", "0.1.0", "released")
+    with gzip.open(store.blob_path(digest), "wb") as file:
+        file.write(b'{"data": {}}')
+    with pytest.raises(Exception, match="does not match its hash"):
+        store.get("tst", "domain", "app", "0.1.0", "released")
+
+def test_preview_store_skips_corrupt_index_lines(tmp_path):
+    store = PreviewStore(tmp_path)
+    store.put(PREVIEW, "tst", "domain", "app", "0.1.0", "released")
+    with store.index_path.open("a", encoding="utf-8") as file:
+        file.write('{"environment": "tst", "dom\n')
+    assert PreviewStore(tmp_path).get("tst", "domain", "app", "0.1.0", "released") == PREVIEW
+
+def run_steps(journal, fingerprint, ran, failing=None):
+    def step(name):
+        if name == failing:
+            raise RuntimeError(f"{name} failed")
+        ran.append(name)
+
+    checkpoint = journal.checkpoint(Broker(), "app", "deploy", fingerprint)
+    tasks = [Task("acl", lambda: step("acl")), Task("queue", lambda: step("queue"), ["acl"]), Task("bindings", lambda: step("bindings"), ["queue"])]
+    run_graph(checkpoint.wrap(tasks))
+    checkpoint.record()
+
+def test_journal_resume_skips_the_completed_steps(tmp_path):
+    path = tmp_path / "journal-tst.jsonl"
+    store = PreviewStore(tmp_path)
+    journal = Journal(path, store)
+    journal.put_preview("version-0", "broker-0", PREVIEW)
+    with pytest.raises(RuntimeError):
+        run_steps(journal, "fingerprint", [], failing="bindings")
+    journal.close(completed=False)
+    assert path.exists()
+
+    resumed = Journal(path, store, resume=True)
+    assert resumed.get_preview("version-0", "broker-0") == PREVIEW
+    ran = []
+    run_steps(resumed, "fingerprint", ran)
+    assert ran == ["bindings"]
+    resumed.close(completed=False)
+    reloaded = Journal(path, store, resume=True)
+    assert reloaded.checkpoint(Broker(), "app", "deploy", "fingerprint").done()
+    reloaded.close(completed=True)
+    assert not path.exists()
+
+def test_journal_resume_repeats_the_steps_of_a_changed_preview(tmp_path):
+    path = tmp_path / "journal-tst.jsonl"
+    journal = Journal(path, PreviewStore(tmp_path))
+    run_steps(journal, "old", [])
+    journal.close()
+    ran = []
+    resumed = Journal(path, PreviewStore(tmp_path), resume=True)
+    run_steps(resumed, "new", ran)
+    resumed.close()
+    assert ran == ["acl", "queue", "bindings"]
+
+def test_journal_ignores_an_incomplete_last_line(tmp_path):
+    path = tmp_path / "journal-tst.jsonl"
+    journal = Journal(path, PreviewStore(tmp_path))
+    run_steps(journal, "fingerprint", [])
+    journal.close()
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"broker": "http://broker|vpn", "appl')
+    resumed = Journal(path, PreviewStore(tmp_path), resume=True)
+    assert resumed.checkpoint(Broker(), "app", "deploy", "fingerprint").done("queue")
+    resumed.close()
+
+def test_journal_without_entries_is_removed(tmp_path):
+    path = tmp_path / "journal-tst.jsonl"
+    Journal(path, PreviewStore(tmp_path)).close(completed=False)
+    assert not path.exists()